@@ -0,0 +1,304 @@
+"""Map-reduce AI analysis of scraped prices.
+
+One prompt with every product stops fitting the model's context window after a
+few thousand products. AnalysisPipeline splits the products by store into
+chunks that fit a token budget and asks the model to summarise each chunk (the
+map step, run concurrently and throttled to a tokens-per-minute budget), then
+streams the final analysis over those summaries (the reduce step) back to the
+caller as it is generated. Small datasets skip the map step and go out as a
+single streamed prompt, as before.
+
+Every response is cached on disk under a hash of the model name and the exact
+prompt, so re-analysing unchanged data, or data where only some chunks
+changed, costs nothing for the unchanged parts.
+
+StubModel answers locally without an API key, for trying the pipeline offline:
+
+    python ai_analysis.py results.jsonl --model local-stub
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from price_records import normalize
+
+# Try to import optional libraries
+try:
+    import google.generativeai as genai
+    HAS_GEMINI = True
+except ImportError:
+    HAS_GEMINI = False
+
+CACHE_DIR = 'ai_cache'
+STUB_MODEL = 'local-stub'
+# Prompt tokens sent per minute at most unless told otherwise (0 = no limit); keeps a
+# big dataset's map step inside Gemini's per-minute quota and the spend predictable
+TOKENS_PER_MINUTE = 250000
+PROMPT_VERSION = 1  # bump when the prompts change, so cached answers to the old ones are not reused
+
+TASK = """**Your Task:**
+Provide a concise but insightful analysis covering these points:
+1. **Cross-Store Price Comparison:** Are there significant price differences for similar products between Woolworths and Coles? Which store appears to be cheaper overall for this product category?
+2. **Best Value:** Based on unit price (e.g., price per sheet/load), which specific products offer the best value for money, regardless of the store?
+3. **Promotional Strategy:** Compare the promotional activities between the two stores. Is one more aggressive with discounts?
+4. **Market Opportunities:** Identify any gaps in the market. For example, are there product sizes or types available at one store but not the other?
+5. **Strategic Recommendations:** Provide one key recommendation for a brand selling in both stores. How should they tailor their pricing or promotional strategy for each retailer?
+Structure your response with clear headings. Be professional and data-driven."""
+
+ANALYST = "You are a market analyst for a consumer goods company."
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for budgeting"""
+    return len(text) // 4 + 1
+
+def format_record(record):
+    lines = [f"Store: {record.store}", f"  Product: {record.name}", f"  Current Price: ${record.price_text}"]
+    if record.was_text != "Not applicable":
+        lines.append(f"  Was Price: ${record.was_text}")
+        lines.append(f"  Promotion: {record.promotion}")
+    lines.append(f"  Unit Price: {record.cup_price}")
+    return "\n".join(lines)
+
+def single_prompt(blocks):
+    data = "\n\n".join(blocks)
+    return (f"{ANALYST} Analyze the following competitive pricing data for detergent sheets from both Woolworths and Coles in Australia.\n"
+            f"**Data:**\nProduct Pricing Data from Woolworths and Coles:\n{'-' * 50}\n{data}\n{TASK}")
+
+def map_prompt(store, part, parts, blocks):
+    return (f"{ANALYST} Below is part {part} of {parts} of the {store} products in a Woolworths vs Coles price comparison.\n"
+            "Summarise it for a later cross-store analysis: the price and unit-price range, the best-value products "
+            "with their unit prices, every promotion with its discount, and the pack sizes and product types on offer. "
+            "Keep product names and numbers exact; be brief.\n\n" + "\n\n".join(blocks))
+
+def reduce_prompt(summaries):
+    data = "\n\n".join(f"### {label}\n{text}" for label, text in summaries)
+    return (f"{ANALYST} The competitive pricing data for detergent sheets from Woolworths and Coles in Australia was too large "
+            f"to send at once, so it has been summarised per store below.\n**Data summaries:**\n{data}\n{TASK}")
+
+class GeminiModel:
+    """google-generativeai model with the generate/stream interface the pipeline uses"""
+
+    def __init__(self, api_key, model_name):
+        if not HAS_GEMINI:
+            raise RuntimeError("google-generativeai is not installed (pip install google-generativeai)")
+        genai.configure(api_key=api_key)
+        self.name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        return self._model.generate_content(prompt).text
+
+    def stream(self, prompt):
+        for chunk in self._model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+class StubModel:
+    """Offline stand-in that answers instantly with a digest of the prompt"""
+
+    name = STUB_MODEL
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        stores = {line.split(':', 1)[1].strip() for line in prompt.splitlines() if line.startswith('Store:')}
+        return (f"[stub] {estimate_tokens(prompt)} prompt tokens, {prompt.count('Product:')} products"
+                f"{' from ' + ', '.join(sorted(stores)) if stores else ''}, {prompt.count('###')} summaries.")
+
+    def stream(self, prompt):
+        for word in self.generate(prompt).split(' '):
+            time.sleep(self.delay / 10)
+            yield word + ' '
+
+def create_model(api_key, model_name):
+    return StubModel() if model_name == STUB_MODEL else GeminiModel(api_key, model_name)
+
+class AnalysisCache:
+    """Content-addressed response cache: one file per hash of (model, prompt)"""
+
+    def __init__(self, path=CACHE_DIR):
+        self.path = path
+
+    @staticmethod
+    def key(model_name, prompt):
+        return hashlib.sha256(f"{PROMPT_VERSION}\0{model_name}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + '.txt')
+
+    def get(self, key):
+        try:
+            with open(self._file(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, text):
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+class TokenBudget:
+    """Sliding one-minute window of prompt tokens; acquire() waits until a prompt fits"""
+
+    def __init__(self, tokens_per_minute=TOKENS_PER_MINUTE, window=60.0):
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._spent = []  # (time, tokens)
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens):
+        if not self.tokens_per_minute:
+            return
+        # A prompt bigger than the whole budget still goes out, alone in its window
+        tokens = min(tokens, self.tokens_per_minute)
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._spent = [(t, n) for t, n in self._spent if now - t < self.window]
+                used = sum(n for _, n in self._spent)
+                if used + tokens <= self.tokens_per_minute:
+                    self._spent.append((now, tokens))
+                    return
+                self._cond.wait(self.window - (now - self._spent[0][0]))
+
+def chunk_records(records, chunk_tokens):
+    """[(store, [formatted product blocks])] with each chunk under chunk_tokens, split by store"""
+    by_store = {}
+    for record in records:
+        by_store.setdefault(record.store, []).append(format_record(record))
+    chunks = []
+    for store, blocks in sorted(by_store.items()):
+        current, size = [], 0
+        for block in blocks:
+            tokens = estimate_tokens(block)
+            if current and size + tokens > chunk_tokens:
+                chunks.append((store, current))
+                current, size = [], 0
+            current.append(block)
+            size += tokens
+        if current:
+            chunks.append((store, current))
+    return chunks
+
+class AnalysisPipeline:
+    """Chunked, concurrent, cached analysis of PriceRecords with a streamed final answer"""
+
+    def __init__(self, model, cache=None, chunk_tokens=12000, single_tokens=24000, concurrency=4,
+                 tokens_per_minute=TOKENS_PER_MINUTE, log=print, debug=False):
+        self.model = model
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens    # products per map prompt
+        self.single_tokens = single_tokens  # datasets under this go out as one prompt
+        self.concurrency = concurrency
+        self.budget = TokenBudget(tokens_per_minute)
+        self.log = log
+        self.debug = debug
+
+    def run(self, records, on_text, on_status=None):
+        """Analyse records; on_text(piece) receives the answer as it streams, on_status(message) progress. Returns the answer."""
+        on_status = on_status or (lambda message: None)
+        blocks = [format_record(record) for record in records]
+        if sum(estimate_tokens(block) for block in blocks) <= self.single_tokens:
+            return self._stream(single_prompt(blocks), on_text)
+        chunks = chunk_records(records, self.chunk_tokens)
+        counts = {}
+        for store, _ in chunks:
+            counts[store] = counts.get(store, 0) + 1
+        jobs, seen = [], {}
+        for store, chunk in chunks:
+            seen[store] = seen.get(store, 0) + 1
+            label = f"{store} ({seen[store]}/{counts[store]})" if counts[store] > 1 else store
+            jobs.append((label, map_prompt(store, seen[store], counts[store], chunk)))
+        done = [0]
+        lock = threading.Lock()
+        on_status(f"Summarising {len(records)} products in {len(jobs)} chunks...")
+
+        def summarise(job):
+            label, prompt = job
+            text = self._generate(prompt)
+            with lock:
+                done[0] += 1
+                on_status(f"Summarised {done[0]}/{len(jobs)} chunks...")
+            return label, text
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            summaries = list(pool.map(summarise, jobs))
+        on_status("Writing the analysis...")
+        return self._stream(reduce_prompt(summaries), on_text)
+
+    def _generate(self, prompt):
+        key = self.cache.key(self.model.name, prompt) if self.cache else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return cached
+        self.budget.acquire(estimate_tokens(prompt))
+        if self.debug:
+            self.log("--- DEBUG: AI PROMPT ---\n" + prompt + "\n--- END AI PROMPT ---")
+        text = self.model.generate(prompt)
+        if key:
+            self.cache.put(key, text)
+        return text
+
+    def _stream(self, prompt, on_text):
+        key = self.cache.key(self.model.name, prompt) if self.cache else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            self.log("AI analysis served from the cache")
+            on_text(cached)
+            return cached
+        self.budget.acquire(estimate_tokens(prompt))
+        if self.debug:
+            self.log("--- DEBUG: AI PROMPT ---\n" + prompt + "\n--- END AI PROMPT ---")
+        pieces = []
+        for piece in self.model.stream(prompt):
+            pieces.append(piece)
+            on_text(piece)
+        text = ''.join(pieces)
+        if key:
+            self.cache.put(key, text)
+        return text
+
+def read_results(path):
+    """PriceRecords from a JSONL file written by scraper_cli.py"""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                if 'error' not in data:
+                    records.append(normalize(data))
+    return records
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse scraped prices (JSONL from scraper_cli.py) with Gemini or the offline stub")
+    parser.add_argument('results', help="JSONL results file")
+    parser.add_argument('--model', default=STUB_MODEL, help=f"Gemini model name, or {STUB_MODEL} (default) to run offline")
+    parser.add_argument('--api-key', default=os.environ.get('GEMINI_API_KEY'), help="Gemini API key (default: $GEMINI_API_KEY)")
+    parser.add_argument('--chunk-tokens', type=int, default=12000, help="approximate tokens of products per summary prompt")
+    parser.add_argument('--concurrency', type=int, default=4, help="summary prompts in flight at once")
+    parser.add_argument('--tokens-per-minute', type=int, default=TOKENS_PER_MINUTE,
+                        help=f"prompt tokens to send per minute at most (default: {TOKENS_PER_MINUTE}; 0 for no limit)")
+    parser.add_argument('--no-cache', action='store_true', help="ignore and don't update the response cache")
+    args = parser.parse_args(argv)
+    log = lambda message: print(message, file=sys.stderr, flush=True)
+    pipeline = AnalysisPipeline(create_model(args.api_key, args.model), None if args.no_cache else AnalysisCache(),
+                                chunk_tokens=args.chunk_tokens, single_tokens=args.chunk_tokens * 2,
+                                concurrency=args.concurrency, tokens_per_minute=args.tokens_per_minute, log=log)
+    pipeline.run(read_results(args.results), on_text=lambda piece: print(piece, end='', flush=True), on_status=log)
+    print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
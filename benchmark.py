@@ -0,0 +1,262 @@
+"""Offline scraper benchmark against the local fixture pages.
+
+Serves fixtures/ from a FixtureServer and routes the Woolworths and Coles
+hostnames to it inside the browser, then runs the real page scrapers over the
+fixture products and writes one JSON report:
+
+    python benchmark.py --repeat 10 -o bench.json
+    python benchmark.py --repeat 10 --compare bench.json
+
+The report has pages/sec, p50/p95 per-page latency (overall and per store),
+the scraper's per-phase metrics (goto, CAPTCHA wait, field extraction, ...),
+the time each field's selector takes inside the page, and the time spent in
+politeness waits. --compare prints the change against an earlier report and
+exits non-zero if throughput or tail latency regressed past --tolerance.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+from fixture_server import FixtureServer, FIXTURES_DIR
+from scraper_core import Scraper, STORE_DELAYS, WOOLWORTHS_FIELDS, COLES_FIELDS, detect_store
+
+RETAILER_HOSTS = ('www.woolworths.com.au', 'www.coles.com.au')
+
+FIELD_SPECS = {'Woolworths': WOOLWORTHS_FIELDS, 'Coles': COLES_FIELDS}
+
+# Time each field's lookup on its own, inside the page, after the timed scrape
+FIELD_TIMING_JS = """spec => {
+    const root = spec.root ? document.querySelector(spec.root) : document;
+    const out = {};
+    for (const [name, selector] of Object.entries(spec.fields)) {
+        const start = performance.now();
+        const el = root && root.querySelector(selector);
+        if (el) el.innerText;
+        out[name] = performance.now() - start;
+    }
+    return out;
+}"""
+
+def fixture_urls(root=FIXTURES_DIR):
+    """Retailer product URLs for every fixture page"""
+    urls = []
+    for store, template in (('woolworths', 'https://www.woolworths.com.au/shop/productdetails/{}/fixture'),
+                            ('coles', 'https://www.coles.com.au/product/fixture-{}')):
+        folder = os.path.join(root, store)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            product_id, ext = os.path.splitext(filename)
+            if ext == '.html' and product_id.isdigit():
+                urls.append(template.format(product_id))
+    return urls
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def latency_summary(histogram):
+    """Exact summary of a metrics histogram that kept its samples"""
+    seconds = histogram.samples if histogram else []
+    return {
+        'count': len(seconds),
+        'p50': percentile(seconds, 50),
+        'p95': percentile(seconds, 95),
+        'mean': sum(seconds) / len(seconds) if seconds else None,
+        'max': max(seconds) if seconds else None,
+    }
+
+class FixtureRouter:
+    """Context route that answers retailer requests from the fixture server and aborts everything else"""
+
+    def __init__(self, base_url, hosts=RETAILER_HOSTS):
+        self.base_url = base_url
+        self.hosts = hosts
+
+    def attach(self, context):
+        context.route('**/*', self._handle)
+
+    def _handle(self, route):
+        parsed = urlparse(route.request.url)
+        if parsed.hostname not in self.hosts:
+            route.abort()  # stay offline
+            return
+        local = self.base_url + parsed.path + ('?' + parsed.query if parsed.query else '')
+        route.fulfill(response=route.fetch(url=local))
+
+class BenchmarkScraper(Scraper):
+    """Scraper whose browsers only ever talk to the fixture server"""
+
+    keep_metric_samples = True
+
+    def __init__(self, router, field_timing=True, **options):
+        self.router = router
+        self.field_timing = field_timing
+        self.field_times = {}
+        super().__init__(**options)
+
+    def open_browser_session(self, p, worker_id):
+        browser, context, page = super().open_browser_session(p, worker_id)
+        # Registered last, so it sees requests before the resource blocker
+        self.router.attach(context)
+        return browser, context, page
+
+    def save_browser_state(self, context):
+        pass  # don't overwrite the real session with fixture cookies
+
+    def scrape_url(self, page, url):
+        data = super().scrape_url(page, url)
+        store = detect_store(url)
+        if self.field_timing and 'error' not in data and store in FIELD_SPECS:
+            timings = page.evaluate(FIELD_TIMING_JS, FIELD_SPECS[store])
+            for name, ms in timings.items():
+                self.field_times.setdefault(store, {}).setdefault(name, []).append(ms)
+        return data
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def run_benchmark(args, log):
+    with FixtureServer(root=args.fixtures) as server:
+        urls = [url for url in fixture_urls(args.fixtures) if detect_store(url) in args.stores] * args.repeat
+        if not urls:
+            raise SystemExit(f"No fixture pages for {', '.join(args.stores)} in {args.fixtures}")
+        delays = {store: (low * args.delay_scale, high * args.delay_scale) for store, (low, high) in STORE_DELAYS.items()}
+        scraper = BenchmarkScraper(
+            FixtureRouter(server.base_url),
+            field_timing=not args.no_field_timing,
+            log=log,
+            headless=not args.headed,
+            block_resources=True,
+            fast_path=args.fast_path,
+            host_map={host: server.base_url for host in RETAILER_HOSTS},
+            pool_size=args.pages,
+            store_limits={'Woolworths': args.pages, 'Coles': args.pages},
+            delays=delays,
+        )
+        try:
+            if args.warm:
+                log("Warming up the browser...")
+                scraper.run(urls[:1])
+                scraper.field_times = {}
+            log(f"Benchmarking {len(urls)} pages...")
+            started = time.monotonic()
+            results = scraper.run(urls)
+            wall = time.monotonic() - started
+        finally:
+            scraper.shutdown()
+
+    errors = [d for d in results if d is None or 'error' in d]
+    metrics = scraper.metrics
+    stores = sorted({store for (phase, store) in metrics.histograms if phase == 'total'})
+    by_path = {}
+    for (name, _, via), count in metrics.counters.items():
+        if name == 'pages':
+            by_path[via] = by_path.get(via, 0) + count
+    phases = {}
+    for phase in sorted({phase for phase, _ in metrics.histograms}):
+        summary = latency_summary(metrics.histogram(phase))
+        summary['total'] = sum(metrics.histogram(phase).samples)
+        phases[phase] = summary
+    starts = scraper.service.starts
+    return {
+        'benchmark': 1,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'config': {'repeat': args.repeat, 'pages': args.pages, 'stores': args.stores, 'fast_path': args.fast_path,
+                   'delay_scale': args.delay_scale, 'headless': not args.headed, 'warm': args.warm},
+        'pages': len(results),
+        'errors': len(errors),
+        'error_samples': [d.get('error') if d else 'no result' for d in errors[:5]],
+        'wall_seconds': wall,
+        'pages_per_sec': len(results) / wall if wall else None,
+        'latency': latency_summary(metrics.histogram('total')),
+        'by_store': {store: latency_summary(metrics.histogram('total', store)) for store in stores},
+        'by_path': by_path,
+        'phases': phases,
+        'sleep_seconds': scraper.rate_limiter.slept,
+        'browser_starts': {'warm': len(starts[True]), 'cold': len(starts[False]),
+                           'warm_seconds': sum(starts[True]) / len(starts[True]) if starts[True] else None,
+                           'cold_seconds': sum(starts[False]) / len(starts[False]) if starts[False] else None},
+        'field_ms': {store: {name: {'mean': sum(ms) / len(ms), 'p95': percentile(ms, 95)} for name, ms in fields.items()}
+                     for store, fields in sorted(scraper.field_times.items())},
+    }
+
+# (report path, label, True if bigger is better)
+COMPARED = (
+    (('pages_per_sec',), 'pages/sec', True),
+    (('latency', 'p50'), 'p50 latency (s)', False),
+    (('latency', 'p95'), 'p95 latency (s)', False),
+    (('sleep_seconds',), 'sleep (s)', False),
+)
+
+def compare(old, new, tolerance):
+    """Print old vs new for the headline numbers; returns the list of regressions"""
+    regressions = []
+    print(f"{'metric':<18}{'before':>12}{'after':>12}{'change':>10}", file=sys.stderr)
+    for path, label, higher_is_better in COMPARED:
+        before, after = old, new
+        for key in path:
+            before = (before or {}).get(key)
+            after = (after or {}).get(key)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        print(f"{label:<18}{before:>12.3f}{after:>12.3f}{change:>+10.1%}", file=sys.stderr)
+        worse = -change if higher_is_better else change
+        if worse > tolerance and label != 'sleep (s)':
+            regressions.append(label)
+    return regressions
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper offline against the fixture pages")
+    parser.add_argument('--repeat', type=int, default=5, help="times to scrape each fixture page (default 5)")
+    parser.add_argument('--pages', type=int, default=1, help="browser pages to scrape with in parallel")
+    parser.add_argument('--store', action='append', choices=('woolworths', 'coles'), help="only benchmark this store (repeatable)")
+    parser.add_argument('--fast-path', action='store_true', help="let the HTTP fast path answer before the browser")
+    parser.add_argument('--delay-scale', type=float, default=0.1, help="fraction of the real politeness delays to wait (default 0.1)")
+    parser.add_argument('--no-warm', dest='warm', action='store_false', help="include the cold browser start in the timings")
+    parser.add_argument('--no-field-timing', action='store_true', help="skip the per-field selector timings")
+    parser.add_argument('--headed', action='store_true', help="show the browser window")
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help="fixture directory to serve")
+    parser.add_argument('-o', '--output', help="write the JSON report here as well as to stdout")
+    parser.add_argument('--compare', metavar='REPORT', help="earlier JSON report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed relative regression for --compare (default 0.10)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show the scraper log")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.stores = [{'woolworths': 'Woolworths', 'coles': 'Coles'}[s] for s in args.store] if args.store else ['Woolworths', 'Coles']
+    log = (lambda message: print(message, file=sys.stderr, flush=True)) if args.verbose else (lambda message: None)
+    report = run_benchmark(args, log)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+        regressions = compare(old, report, args.tolerance)
+        if regressions:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Run-over-run change detection, so downstream systems only see the prices that moved.
+
+Each product's normalised price tuple (price, was price, promotion label) is
+fingerprinted and kept in a JSON snapshot keyed by product_key(). As results
+arrive, ChangeDetector.observe() compares one fingerprint against the previous
+run's with a dict lookup, so a run costs O(n) however large the catalogue, and
+only products whose fingerprint differs are looked at further and reported as
+a Change: price up or down, promotion started, ended or changed, unavailable
+(no price any more) or back (priced again). A product that was on a listing
+page the run scraped but no longer appears on it is reported unavailable when
+the run finishes. Products not in the snapshot yet are recorded silently, so
+the first run just sets the baseline.
+
+Changes go out to pluggable sinks when a run finishes; anything with a
+send(changes) method will do. JsonlSink appends them to a file and
+WebhookSink POSTs them as JSON, for example to a local endpoint:
+
+    python scraper_cli.py urls.txt --changes-only --webhook http://localhost:8080/prices
+"""
+import hashlib
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from price_records import normalize
+from scraper_core import product_key
+
+SNAPSHOT_FILE = 'price_snapshot.json'
+
+CHANGE_LABELS = {
+    'price_down': 'Price down', 'price_up': 'Price up',
+    'promo_started': 'Promotion started', 'promo_ended': 'Promotion ended', 'promo_changed': 'Promotion changed',
+    'unavailable': 'Unavailable', 'back': 'Available again',
+}
+CHANGE_KINDS = tuple(CHANGE_LABELS)
+
+Change = namedtuple('Change', 'kind key store name url old_price new_price old_promotion new_promotion')
+
+def fingerprint(price, was_price, promotion):
+    """Short stable hash of a normalised price tuple"""
+    return hashlib.blake2b(repr((price, was_price, promotion)).encode('utf-8'), digest_size=8).hexdigest()
+
+def classify_change(old, record):
+    """Kind of change from a snapshot entry to a PriceRecord whose fingerprint differs"""
+    if old['price'] is not None and record.price is None:
+        return 'unavailable'
+    if old['price'] is None and record.price is not None:
+        return 'back'
+    if not old['promotion'] and record.promotion:
+        return 'promo_started'
+    if old['promotion'] and not record.promotion:
+        return 'promo_ended'
+    if record.price is not None and record.price != old['price']:
+        return 'price_up' if record.price > old['price'] else 'price_down'
+    return 'promo_changed'
+
+def describe(change):
+    """One-line description, e.g. "Price down $4.00 -> $3.50" """
+    label = CHANGE_LABELS[change.kind]
+    if change.kind in ('price_down', 'price_up'):
+        return f"{label} ${change.old_price:.2f} -> ${change.new_price:.2f}"
+    if change.kind in ('promo_started', 'promo_changed'):
+        return f"{label}: {change.new_promotion}"
+    if change.kind == 'back':
+        return f"{label} at ${change.new_price:.2f}"
+    return label
+
+def change_dict(change):
+    """JSON-ready dict of a Change, with its description"""
+    data = change._asdict()
+    data['description'] = describe(change)
+    return data
+
+def unavailable_record(change):
+    """PriceRecord standing in for a product that dropped off its listing, for tables and exports"""
+    return normalize({'store': change.store, 'name': change.name, 'url': change.url, 'price': "Not found",
+                      'was_price': "Not applicable", 'cup_price': "", 'promo_badge': ""})
+
+def _entry(record, listing):
+    return {'fp': fingerprint(record.price, record.was_price, record.promotion), 'price': record.price,
+            'was_price': record.was_price, 'promotion': record.promotion, 'store': record.store,
+            'name': record.name, 'url': record.url, 'listing': listing}
+
+class ChangeDetector:
+    """Compares each run's results against the previous run's snapshot and reports the deltas"""
+
+    def __init__(self, path=SNAPSHOT_FILE, sinks=(), log=print):
+        self.path = path
+        self.sinks = list(sinks)
+        self.log = log
+        self.previous = {}  # product key -> snapshot entry
+        self.begin()
+
+    def __len__(self):
+        return len(self.previous)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.previous = json.load(f).get('products', {})
+        except (OSError, ValueError) as e:
+            self.log(f"Could not read {self.path}: {e}")
+            return False
+        return True
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'saved_at': time.time(), 'products': self.previous}, f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def begin(self):
+        """Start a run"""
+        self.current = {}      # product key -> snapshot entry seen this run
+        self.listings = set()  # listing URLs that returned products this run
+        self.changes = []
+
+    def observe(self, data, record=None):
+        """Compare one scrape result against the snapshot; returns its Change or None.
+
+        Errors and results served from the cache say nothing new about a price
+        and are skipped, so a failed page never reads as the product vanishing.
+        """
+        if 'error' in data or 'cached_at' in data:
+            return None
+        record = record or normalize(data)
+        listing = data.get('listing')
+        if listing:
+            self.listings.add(listing)
+        key = product_key(record.url)
+        entry = _entry(record, listing)
+        self.current[key] = entry
+        old = self.previous.get(key)
+        if old is None or old['fp'] == entry['fp']:
+            return None
+        change = Change(classify_change(old, record), key, record.store, record.name, record.url,
+                        old['price'], record.price, old['promotion'], record.promotion)
+        self.changes.append(change)
+        return change
+
+    def finish(self, save=True):
+        """End a run: report products gone from their listings, update the snapshot and notify the sinks.
+
+        Returns the products that dropped off their listings (their other
+        changes were already returned by observe); self.changes has them all.
+        """
+        gone = []
+        for key, old in self.previous.items():
+            if key in self.current or old.get('listing') not in self.listings or old['price'] is None:
+                continue
+            change = Change('unavailable', key, old['store'], old['name'], old['url'], old['price'], None, old['promotion'], "")
+            gone.append(change)
+            self.current[key] = dict(old, fp=fingerprint(None, None, ""), price=None, was_price=None, promotion="")
+        self.changes.extend(gone)
+        self.previous.update(self.current)
+        if save:
+            try:
+                self.save()
+            except OSError as e:
+                self.log(f"Could not save {self.path}: {e}")
+        if self.changes:
+            counts = {}
+            for change in self.changes:
+                counts[change.kind] = counts.get(change.kind, 0) + 1
+            self.log(f"Changes since the last run: {len(self.changes)} ("
+                     + ", ".join(f"{CHANGE_LABELS[kind].lower()} {counts[kind]}" for kind in CHANGE_KINDS if kind in counts) + ")")
+            self.notify(self.changes)
+        else:
+            self.log(f"No price changes among {len(self.current)} products since the last run")
+        return gone
+
+    def notify(self, changes):
+        for sink in self.sinks:
+            try:
+                sink.send(changes)
+            except Exception as e:
+                self.log(f"Change notification to {sink} failed: {e}")
+
+class JsonlSink:
+    """Appends one JSON line per change"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return self.path
+
+    def send(self, changes):
+        detected_at = time.time()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for change in changes:
+                f.write(json.dumps(dict(change_dict(change), detected_at=detected_at), ensure_ascii=False) + '\n')
+
+class WebhookSink:
+    """POSTs changes as JSON ({'detected_at', 'changes': [...]}) in batches of batch_size"""
+
+    def __init__(self, url, timeout=10.0, batch_size=500, headers=None, log=print):
+        self.url = url
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+        self.log = log
+
+    def __str__(self):
+        return self.url
+
+    def send(self, changes):
+        detected_at = time.time()
+        for start in range(0, len(changes), self.batch_size):
+            body = json.dumps({'detected_at': detected_at, 'changes': [change_dict(c) for c in changes[start:start + self.batch_size]]},
+                              ensure_ascii=False).encode('utf-8')
+            request = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError) as e:
+                raise RuntimeError(f"POST failed after {start} of {len(changes)} changes: {e}") from e
+        self.log(f"Posted {len(changes)} changes to {self.url}")
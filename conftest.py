@@ -0,0 +1 @@
+"""pytest configuration: the modules live at the top of the repository, so tests import them from here."""
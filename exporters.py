@@ -0,0 +1,251 @@
+"""Export scrape results as CSV, Excel or Parquet/Arrow without building them up in memory.
+
+The writers take PriceRecords (see price_records.normalize), which are parsed
+once as results arrive, with the discount and promotion label already worked
+out, and stream them out:
+
+- CsvExporter appends and flushes row by row, so a CSV can be written while a
+  scrape is still running.
+- XlsxExporter uses openpyxl's write-only mode. Column widths have to be fixed
+  before the first row is written there, so they come from a ColumnWidths
+  tracker fed as records stream past (or one cheap pass over the values).
+- export_columnar writes Parquet (or Arrow IPC for .arrow/.feather) in record
+  batches with pyarrow, for analytics tools.
+- write_changes_csv and the workbook's Changes sheet hold only the products
+  whose price moved since the last run (see change_detection).
+"""
+import csv
+import os
+from copy import copy
+from change_detection import CHANGE_LABELS
+
+# Try to import optional libraries
+try:
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import PatternFill, Font
+    HAS_EXCEL = True
+except ImportError:
+    HAS_EXCEL = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+HEADERS = ('Store', 'Product Name', 'Current Price', 'Was Price', 'Unit Price', 'Promotion', 'URL')
+
+# Side-by-side sheet for products matched across stores (see product_matching)
+COMPARISON_STORES = ('Woolworths', 'Coles')
+COMPARISON_HEADERS = tuple(f"{store} {column}" for store in COMPARISON_STORES for column in ('Product', 'Price', 'Unit Price')) + ('Difference', 'Cheaper')
+
+# Change-only sheet and CSV (see change_detection)
+CHANGE_HEADERS = ('Change', 'Store', 'Product Name', 'Old Price', 'New Price', 'Old Promotion', 'New Promotion', 'URL')
+
+def csv_values(record):
+    return (record.store, record.name, record.price_text, record.was_text, record.cup_price, record.promotion, record.url)
+
+def excel_values(record):
+    price = record.price if record.price is not None else ""
+    was_price = record.was_price if record.was_price is not None else ""
+    return (record.store, record.name, price, was_price, record.cup_price, record.promotion, record.url)
+
+def comparison_values(members):
+    """Side-by-side row for a {store: PriceRecord} match group"""
+    values, prices = [], {}
+    for store in COMPARISON_STORES:
+        record = members.get(store)
+        if record is None:
+            values += ["", "", ""]
+            continue
+        values += [record.name, record.price if record.price is not None else "", record.cup_price]
+        if record.price is not None:
+            prices[store] = record.price
+    if len(prices) == 2:
+        woolworths, coles = (prices[store] for store in COMPARISON_STORES)
+        values += [round(woolworths - coles, 2), "Same" if woolworths == coles else min(prices, key=prices.get)]
+    else:
+        values += ["", ""]
+    return values
+
+def change_values(change):
+    return (CHANGE_LABELS[change.kind], change.store, change.name,
+            change.old_price if change.old_price is not None else "", change.new_price if change.new_price is not None else "",
+            change.old_promotion, change.new_promotion, change.url)
+
+class ColumnWidths:
+    """Running maximum text width per column, updated as rows stream past"""
+
+    def __init__(self, headers=HEADERS, cap=60, padding=2):
+        self.cap = cap
+        self.padding = padding
+        self.maxima = [len(h) for h in headers]
+
+    def update(self, values):
+        maxima = self.maxima
+        for i, value in enumerate(values):
+            if value is not None:
+                length = len(str(value))
+                if length > maxima[i]:
+                    maxima[i] = length
+
+    def widths(self):
+        return [min(width + self.padding, self.cap) for width in self.maxima]
+
+class CsvExporter:
+    """CSV writer that can append to an existing file and flushes every row"""
+
+    def __init__(self, path, append=False):
+        new = not (append and os.path.exists(path) and os.path.getsize(path))
+        self.path = path
+        self.rows = 0
+        self._file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if new:
+            self._writer.writerow(HEADERS)
+            self._file.flush()
+
+    def write(self, record):
+        self._writer.writerow(csv_values(record))
+        self._file.flush()
+        self.rows += 1
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+def write_changes_csv(path, changes, append=False):
+    """Write (or append) one row per Change"""
+    new = not (append and os.path.exists(path) and os.path.getsize(path))
+    with open(path, 'a' if append else 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if new:
+            writer.writerow(CHANGE_HEADERS)
+        writer.writerows(change_values(change) for change in changes)
+    return len(changes)
+
+def write_csv(path, records):
+    exporter = CsvExporter(path)
+    try:
+        for record in records:
+            exporter.write(record)
+    finally:
+        exporter.close()
+    return exporter.rows
+
+class XlsxExporter:
+    """Write-only (streaming) workbook; rows go straight to disk instead of living in a Workbook"""
+
+    def __init__(self, path, widths=None, title="Price Comparison"):
+        if not HAS_EXCEL:
+            raise RuntimeError("openpyxl is not installed (pip install openpyxl)")
+        self.path = path
+        self.rows = 0
+        self._wb = openpyxl.Workbook(write_only=True)
+        self._ws = self._wb.create_sheet(title)
+        # Write-only sheets need their column widths before the first row
+        for index, width in enumerate(widths or ColumnWidths().widths(), 1):
+            self._ws.column_dimensions[openpyxl.utils.get_column_letter(index)].width = width
+        self._header_font, self._header_fill = Font(bold=True, color="FFFFFF"), PatternFill(start_color="366092", fill_type="solid")
+        # Styling a cell registers the style with the workbook, so do it once and copy the result
+        self._half_price_style = self._cell(None, PatternFill(start_color="FFC7CE", fill_type="solid"))._style
+        self._special_style = self._cell(None, PatternFill(start_color="FFEB9C", fill_type="solid"))._style
+        self._ws.append([self._cell(header, self._header_fill, self._header_font) for header in HEADERS])
+
+    def _cell(self, value, fill=None, font=None, style=None):
+        cell = WriteOnlyCell(self._ws, value=value)
+        if style is not None: cell._style = copy(style)
+        if fill: cell.fill = fill
+        if font: cell.font = font
+        return cell
+
+    def write(self, record):
+        values = excel_values(record)
+        if "HALF PRICE" in record.promotion.upper():
+            values = [self._cell(value, style=self._half_price_style) for value in values]
+        elif record.promotion:
+            values = [self._cell(value, style=self._special_style) for value in values]
+        self._ws.append(values)
+        self.rows += 1
+
+    def write_comparisons(self, comparisons, title="Side by Side"):
+        """Add a sheet with one row per match group: [(group id, {store: PriceRecord})]"""
+        self._write_sheet(title, COMPARISON_HEADERS, [comparison_values(members) for _, members in comparisons])
+
+    def write_changes(self, changes, title="Changes"):
+        """Add a sheet with one row per Change since the last run"""
+        self._write_sheet(title, CHANGE_HEADERS, [change_values(change) for change in changes])
+
+    def _write_sheet(self, title, headers, rows):
+        widths = ColumnWidths(headers)
+        for row in rows:
+            widths.update(row)
+        ws = self._wb.create_sheet(title)
+        for index, width in enumerate(widths.widths(), 1):
+            ws.column_dimensions[openpyxl.utils.get_column_letter(index)].width = width
+        header = [WriteOnlyCell(ws, value=value) for value in headers]
+        for cell in header:
+            cell.font, cell.fill = self._header_font, self._header_fill
+        ws.append(header)
+        for row in rows:
+            ws.append(row)
+
+    def close(self):
+        self._wb.save(self.path)
+
+def write_xlsx(path, records, widths=None, comparisons=None, changes=None):
+    """Stream records to an .xlsx; without widths, one pass over a record list measures them first"""
+    if widths is None:
+        tracker = ColumnWidths()
+        for record in records:
+            tracker.update(excel_values(record))
+        widths = tracker.widths()
+    exporter = XlsxExporter(path, widths)
+    for record in records:
+        exporter.write(record)
+    if comparisons:
+        exporter.write_comparisons(comparisons)
+    if changes:
+        exporter.write_changes(changes)
+    exporter.close()
+    return exporter.rows
+
+def arrow_schema():
+    return pa.schema([
+        ('store', pa.string()), ('name', pa.string()), ('price', pa.float64()), ('was_price', pa.float64()),
+        ('unit_price', pa.float64()), ('unit', pa.string()), ('cup_price', pa.string()), ('promotion', pa.string()),
+        ('discount_pct', pa.float64()), ('url', pa.string()),
+    ])
+
+def _arrow_batch(schema, records):
+    columns = list(zip(*[(r.store, r.name, r.price, r.was_price, r.unit_price, r.unit, r.cup_price, r.promotion, r.discount, r.url) for r in records]))
+    return pa.record_batch([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+def export_columnar(path, records, batch_size=10000):
+    """Write records as Parquet, or Arrow IPC when path ends in .arrow/.feather, in batches of batch_size"""
+    if not HAS_ARROW:
+        raise RuntimeError("pyarrow is not installed (pip install pyarrow)")
+    schema = arrow_schema()
+    if path.endswith(('.arrow', '.feather')):
+        writer = pa.ipc.new_file(path, schema)
+        write = writer.write_batch
+    else:
+        writer = pq.ParquetWriter(path, schema, compression='zstd')
+        write = writer.write_batch
+    rows, batch = 0, []
+    try:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                write(_arrow_batch(schema, batch))
+                rows += len(batch)
+                batch = []
+        if batch:
+            write(_arrow_batch(schema, batch))
+            rows += len(batch)
+    finally:
+        writer.close()
+    return rows
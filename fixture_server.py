@@ -0,0 +1,139 @@
+"""Serve captured product pages locally so the scraper can be exercised offline.
+
+Pages live in fixtures/<store>/<product id>.html and are trimmed down to the
+markup and embedded JSON the extractors read. Listing pages live in
+fixtures/<store>/listing-<last path segment>-<page number>.html. Requests are
+routed by their Host header and path, so a client can keep using the real
+retailer URLs:
+
+    python fixture_server.py --port 8765
+
+A page captured with debug mode on (debug_<store>_*.html) can be added for the
+product URL it was saved from:
+
+    python fixture_server.py --add https://www.coles.com.au/product/...-5452994 debug_coles_....html
+"""
+import argparse
+import os
+import re
+import shutil
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qsl
+from scraper_core import LISTING_PAGE_PARAMS, detect_store, is_listing_url, product_key
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def fixture_path(host, path, root=FIXTURES_DIR):
+    """Map a retailer host and path to the fixture file that stands in for it"""
+    path, _, query = path.partition('?')
+    path = path.rstrip('/')
+    if 'woolworths' not in host and 'coles' not in host:
+        # Proxied without the retailer Host header: go by the URL shape instead
+        host = 'www.woolworths.com.au' if path.startswith('/shop/') else 'www.coles.com.au'
+    url = f"https://{host}{path}"
+    if is_listing_url(url):
+        store = detect_store(url)
+        number = dict(parse_qsl(query)).get(LISTING_PAGE_PARAMS[store], '1')
+        name = re.sub(r'[^a-z0-9]+', '-', path.rsplit('/', 1)[-1].lower())
+        return os.path.join(root, store.lower(), f"listing-{name}-{number}.html")
+    if path.endswith('/challenge'):
+        store = 'coles' if 'coles' in host else 'woolworths'
+        return os.path.join(root, store, 'challenge.html')
+    if 'woolworths' in host:
+        match = re.search(r'/shop/productdetails/(\d+)', path)
+        return match and os.path.join(root, 'woolworths', match.group(1) + '.html')
+    if 'coles' in host:
+        match = re.search(r'/product/.*?-(\d+)$', path)
+        return match and os.path.join(root, 'coles', match.group(1) + '.html')
+    return None
+
+def add_fixture(url, html_path, root=FIXTURES_DIR):
+    """Copy a captured page into the fixtures as the page for a product URL; returns the new path"""
+    key = product_key(url)
+    if not key or not key.split(':', 1)[1].isdigit():
+        raise ValueError(f"Not a Woolworths or Coles product URL: {url}")
+    store, product_id = key.split(':', 1)
+    target = os.path.join(root, store, product_id + '.html')
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(html_path, target)
+    return target
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this, Nagle plus delayed ACKs add ~40ms a page
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        filename = fixture_path(self.headers.get('Host', ''), self.path, self.server.root)
+        if not filename or not os.path.exists(filename):
+            self._send(404, b'Not found')
+            return
+        with open(filename, 'rb') as f:
+            body = f.read()
+        self._send(403 if filename.endswith('challenge.html') else 200, body, 'text/html; charset=utf-8')
+
+    def _send(self, status, body, content_type='text/plain'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class FixtureServer:
+    """Threaded local HTTP server for the fixture pages; usable as a context manager"""
+
+    def __init__(self, port=0, root=FIXTURES_DIR, verbose=False):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+        self.httpd.root = root
+        self.httpd.verbose = verbose
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    @property
+    def base_url(self):
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve captured Woolworths/Coles pages for offline testing")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--root', default=FIXTURES_DIR)
+    parser.add_argument('--add', nargs=2, metavar=('URL', 'HTML_FILE'), help="add a captured page as the fixture for a product URL and exit")
+    args = parser.parse_args()
+    if args.add:
+        print(f"Added {add_fixture(args.add[0], args.add[1], args.root)}")
+        return
+    server = FixtureServer(args.port, args.root, verbose=True)
+    print(f"Serving {args.root} on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
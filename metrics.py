@@ -0,0 +1,183 @@
+"""Always-on timing metrics for the scrape hot path.
+
+Every URL records a span per phase (politeness sleep, HTTP fast path, browser
+start, goto, time its store sat suspended on a CAPTCHA, field extraction and
+the whole URL), aggregated into fixed-bucket histograms per (phase, store) plus
+a few counters (pages, errors, challenges shown and solved). Observing a span
+is a perf_counter call, a bisect and a locked increment, so it can stay on in
+production. Metrics can be written as Prometheus text (for a node_exporter
+textfile collector) or JSON, and summary() gives a table for the run log.
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds, from a cached DOM read to a CAPTCHA solved by hand
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Phases in the order they happen to a URL, for the summary table
+PHASES = ('sleep', 'http', 'browser', 'warmup', 'goto', 'captcha', 'fields', 'total')
+
+class Histogram:
+    """Cumulative-style histogram with fixed buckets, optionally keeping raw samples for exact percentiles"""
+
+    def __init__(self, buckets=BUCKETS, keep_samples=False):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.samples = [] if keep_samples else None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if self.samples is not None:
+            self.samples.append(value)
+
+    def quantile(self, q):
+        """Exact from samples when kept, otherwise interpolated within the bucket like Prometheus does"""
+        if not self.count:
+            return None
+        if self.samples is not None:
+            ordered = sorted(self.samples)
+            return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+class _Span:
+    __slots__ = ('metrics', 'phase', 'store', 'started')
+
+    def __init__(self, metrics, phase, store):
+        self.metrics, self.phase, self.store = metrics, phase, store
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.phase, self.store, time.perf_counter() - self.started)
+        return False
+
+class Metrics:
+    """Per-(phase, store) timing histograms and per-(name, store, label) counters for one run"""
+
+    def __init__(self, keep_samples=False):
+        self.keep_samples = keep_samples
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def span(self, phase, store):
+        """Context manager that records how long its block took"""
+        return _Span(self, phase, store)
+
+    def observe(self, phase, store, seconds):
+        with self._lock:
+            histogram = self.histograms.get((phase, store))
+            if histogram is None:
+                histogram = self.histograms[(phase, store)] = Histogram(keep_samples=self.keep_samples)
+            histogram.observe(seconds)
+
+    def inc(self, name, store, label=None, amount=1):
+        key = (name, store, label)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def count(self, name, store=None, label=None):
+        """A counter's value, summed over every store and label that isn't given"""
+        with self._lock:
+            return sum(value for (n, s, l), value in self.counters.items()
+                       if n == name and (store is None or s == store) and (label is None or l == label))
+
+    def histogram(self, phase, store=None):
+        """One store's histogram, or all stores merged when store is None"""
+        with self._lock:
+            if store is not None:
+                return self.histograms.get((phase, store))
+            parts = [h for (p, _), h in self.histograms.items() if p == phase]
+            if not parts:
+                return None
+            merged = Histogram(keep_samples=self.keep_samples)
+            for part in parts:
+                merged.counts = [a + b for a, b in zip(merged.counts, part.counts)]
+                merged.sum += part.sum
+                merged.count += part.count
+                if part.samples is not None:
+                    merged.samples.extend(part.samples)
+            return merged
+
+    def _sorted_histograms(self):
+        order = {phase: i for i, phase in enumerate(PHASES)}
+        with self._lock:
+            return sorted(self.histograms.items(), key=lambda item: (order.get(item[0][0], len(order)), item[0][0], str(item[0][1])))
+
+    def to_json(self):
+        phases = {}
+        for (phase, store), h in self._sorted_histograms():
+            phases.setdefault(phase, {})[store or 'all'] = {
+                'count': h.count, 'sum': h.sum, 'mean': h.mean(),
+                'p50': h.quantile(0.5), 'p95': h.quantile(0.95),
+                'buckets': dict(zip([str(b) for b in h.buckets] + ['+Inf'], h.counts)),
+            }
+        with self._lock:
+            counters = [{'name': name, 'store': store, 'label': label, 'value': value}
+                        for (name, store, label), value in sorted(self.counters.items(), key=lambda item: tuple(map(str, item[0])))]
+        return {'generated_at': time.time(), 'phases': phases, 'counters': counters}
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP scraper_phase_seconds Time spent in each scrape phase per URL",
+            "# TYPE scraper_phase_seconds histogram",
+        ]
+        for (phase, store), h in self._sorted_histograms():
+            labels = f'phase="{phase}",store="{store or "all"}"'
+            cumulative = 0
+            for bound, count in zip(h.buckets, h.counts):
+                cumulative += count
+                lines.append(f'scraper_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'scraper_phase_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f'scraper_phase_seconds_sum{{{labels}}} {h.sum:.6f}')
+            lines.append(f'scraper_phase_seconds_count{{{labels}}} {h.count}')
+        with self._lock:
+            counters = sorted(self.counters.items(), key=lambda item: tuple(map(str, item[0])))
+        declared = set()
+        for (name, store, label), value in counters:
+            if name not in declared:
+                lines.append(f"# TYPE scraper_{name}_total counter")
+                declared.add(name)
+            labels = f'store="{store or "all"}"' + (f',kind="{label}"' if label else '')
+            lines.append(f"scraper_{name}_total{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write Prometheus text, or JSON when the path ends in .json; atomic so collectors never see half a file"""
+        text = json.dumps(self.to_json(), indent=2) if path.endswith('.json') else self.to_prometheus()
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def summary(self):
+        """Run summary table lines: count, mean, p50, p95 and total seconds per phase and store"""
+        rows = [(phase, store or 'all', h) for (phase, store), h in self._sorted_histograms() if h.count]
+        if not rows:
+            return []
+        lines = [f"{'Phase':<9}{'Store':<12}{'Count':>7}{'Mean':>9}{'p50':>9}{'p95':>9}{'Total':>10}"]
+        for phase, store, h in rows:
+            lines.append(f"{phase:<9}{store:<12}{h.count:>7}{h.mean():>9.3f}{h.quantile(0.5):>9.3f}{h.quantile(0.95):>9.3f}{h.sum:>10.1f}")
+        return lines
@@ -0,0 +1,101 @@
+"""Batch analytics over a run's PriceRecords: discounts, best value per unit and store-vs-store spreads.
+
+With pandas installed the calculations run column-wise over a DataFrame; without
+it the same results come from plain Python loops, so callers never need to
+check which one they got.
+"""
+import math
+
+# Try to import optional libraries
+try:
+    import pandas as pd
+    HAS_PANDAS = True
+except ImportError:
+    HAS_PANDAS = False
+
+from price_records import PriceRecord
+
+def to_frame(records):
+    """DataFrame with one column per PriceRecord field (needs pandas)"""
+    if not HAS_PANDAS:
+        raise RuntimeError("pandas is not installed (pip install pandas)")
+    return pd.DataFrame.from_records(list(records), columns=PriceRecord._fields)
+
+def _by_unit(record):
+    return record.unit
+
+def _nan_to_none(values):
+    return [None if value is None or math.isnan(value) else float(value) for value in values]
+
+def discounts(records):
+    """Percent off the was price for every record (None where it isn't discounted)"""
+    if HAS_PANDAS:
+        df = to_frame(records)
+        price, was_price = df['price'].astype(float), df['was_price'].astype(float)
+        return _nan_to_none((((was_price - price) / was_price) * 100).where(was_price > price).tolist())
+    return [(r.was_price - r.price) / r.was_price * 100 if r.price is not None and r.was_price is not None and r.was_price > r.price else None
+            for r in records]
+
+def best_value(records, top=5):
+    """{unit: up to top records with the lowest unit price, cheapest first}"""
+    records = list(records)
+    if HAS_PANDAS:
+        df = to_frame(records)
+        df = df[df['unit_price'].notna()].sort_values(['unit', 'unit_price'], kind='stable')
+        return {unit: [records[i] for i in group.index[:top]] for unit, group in df.groupby('unit', sort=True)}
+    best = {}
+    for record in sorted((r for r in records if r.unit_price is not None), key=lambda r: (r.unit, r.unit_price)):
+        ranked = best.setdefault(record.unit, [])
+        if len(ranked) < top:
+            ranked.append(record)
+    return best
+
+def store_spreads(records, group=_by_unit):
+    """Per group, the lowest unit price in each store and the gap between the cheapest and dearest store.
+
+    group(record) decides what is compared (default: the unit, i.e. the best
+    per-kg price at each store); groups only one store carries are skipped.
+    Returns dicts sorted by the widest relative spread first.
+    """
+    records = [r for r in records if r.unit_price is not None]
+    lowest = {}
+    if HAS_PANDAS and records:
+        df = to_frame(records)
+        df['group'] = [group(r) for r in records]
+        table = df[df['group'].notna()].groupby(['group', 'store'])['unit_price'].min().unstack('store')
+        for key, row in table.iterrows():
+            lowest[key] = {store: float(price) for store, price in row.dropna().items()}
+    else:
+        for record in records:
+            key = group(record)
+            if key is None:
+                continue
+            stores = lowest.setdefault(key, {})
+            if record.store not in stores or record.unit_price < stores[record.store]:
+                stores[record.store] = record.unit_price
+    spreads = []
+    for key, prices in lowest.items():
+        if len(prices) < 2:
+            continue
+        cheapest = min(prices, key=prices.get)
+        low, high = prices[cheapest], max(prices.values())
+        spreads.append({'group': key, 'prices': prices, 'cheapest': cheapest,
+                        'spread': high - low, 'spread_pct': (high - low) / low * 100 if low else None})
+    spreads.sort(key=lambda s: -(s['spread_pct'] or 0))
+    return spreads
+
+def summary_lines(records, top=3):
+    """Log lines with the best unit prices and store spreads of a run"""
+    records = list(records)
+    if not records:
+        return []
+    lines = []
+    discounted = [d for d in discounts(records) if d is not None]
+    if discounted:
+        lines.append(f"On special: {len(discounted)}/{len(records)} products, average {sum(discounted) / len(discounted):.0f}% off")
+    for unit, ranked in best_value(records, top).items():
+        lines.append(f"Best value per {unit}: " + "; ".join(f"{r.store} {r.name} (${r.unit_price:.2f})" for r in ranked))
+    for spread in store_spreads(records):
+        prices = ", ".join(f"{store} ${price:.2f}" for store, price in sorted(spread['prices'].items()))
+        lines.append(f"Cheapest per {spread['group']}: {spread['cheapest']} ({prices}, {spread['spread_pct'] or 0:.0f}% apart)")
+    return lines
@@ -0,0 +1,201 @@
+"""Persistent price history for scraped products, stored in SQLite.
+
+Results are buffered and written in batched transactions as they arrive, and the
+database runs in WAL mode so queries never block the writer. Rows are keyed by
+product_key() ('woolworths:897214', 'coles:5452994') and indexed by
+(product, time) and (store, time); a latest_prices table is upserted alongside,
+so per-product lookups stay in the milliseconds even with millions of rows.
+latest_prices also counts each product's samples and price/promo changes as
+rows are flushed, so the refresh scheduler reads a product's volatility from
+one row instead of scanning its history.
+Products scraped off a listing page are also filed under the listing's key in
+listing_products, so the refresh scheduler can tell when a listing was last
+scraped and which products it held.
+"""
+import sqlite3
+import threading
+import time
+from scraper_core import product_key
+
+HISTORY_DB = 'price_history.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    id INTEGER PRIMARY KEY,
+    product_key TEXT NOT NULL,
+    store TEXT NOT NULL,
+    url TEXT NOT NULL,
+    name TEXT,
+    price REAL,
+    was_price REAL,
+    cup_price TEXT,
+    promo_badge TEXT,
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_prices_product_time ON prices (product_key, scraped_at);
+CREATE INDEX IF NOT EXISTS idx_prices_store_time ON prices (store, scraped_at);
+CREATE TABLE IF NOT EXISTS latest_prices (
+    product_key TEXT PRIMARY KEY,
+    store TEXT NOT NULL,
+    url TEXT NOT NULL,
+    name TEXT,
+    price REAL,
+    was_price REAL,
+    cup_price TEXT,
+    promo_badge TEXT,
+    scraped_at REAL NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 1,
+    changes INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL,
+    last_change REAL
+);
+CREATE INDEX IF NOT EXISTS idx_latest_store ON latest_prices (store);
+CREATE TABLE IF NOT EXISTS listing_products (
+    listing_key TEXT NOT NULL,
+    product_key TEXT NOT NULL,
+    scraped_at REAL NOT NULL,
+    PRIMARY KEY (listing_key, product_key)
+);
+"""
+
+# A listing's pages load over a while; products seen this long before its last product count as the same scrape
+LISTING_SCRAPE_WINDOW = 3600
+
+COLUMNS = ('product_key', 'store', 'url', 'name', 'price', 'was_price', 'cup_price', 'promo_badge', 'scraped_at')
+
+# Change counters on latest_prices, added after the table first shipped
+COUNTER_COLUMNS = (('samples', 'INTEGER NOT NULL DEFAULT 1'), ('changes', 'INTEGER NOT NULL DEFAULT 0'),
+                   ('first_seen', 'REAL'), ('last_change', 'REAL'))
+
+# A new row differs from the product's latest one in price, was price or promotion
+CHANGED = ("(latest_prices.price IS NOT excluded.price OR latest_prices.was_price IS NOT excluded.was_price "
+           "OR latest_prices.promo_badge IS NOT excluded.promo_badge)")
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class PriceHistory:
+    """Append-only price store with batched writes and indexed time-series queries"""
+
+    def __init__(self, path=HISTORY_DB, batch_size=200, flush_interval=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self._pending = []
+        self._pending_listings = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, data, scraped_at=None):
+        """Queue one scrape result; errors and results served from the cache are ignored"""
+        if 'error' in data or 'cached_at' in data:
+            return
+        row = (
+            product_key(data['url']), data['store'], data['url'], data.get('name'),
+            _to_float(data.get('price')), _to_float(data.get('was_price')),
+            data.get('cup_price'), data.get('promo_badge', ''), scraped_at or time.time()
+        )
+        with self._lock:
+            self._pending.append(row)
+            if data.get('listing'):
+                self._pending_listings.append((product_key(data['listing']), row[0], row[-1]))
+            due = len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write everything queued so far in one transaction"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            listings, self._pending_listings = self._pending_listings, []
+            self._last_flush = time.monotonic()
+            if not rows:
+                return 0
+            placeholders = ', '.join('?' * len(COLUMNS))
+            with self.conn:
+                self.conn.executemany(f"INSERT INTO prices ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+                # Keep one row per product current, with its change counters, so neither
+                # "latest" lookups nor the refresh scheduler ever scan history
+                self.conn.executemany(
+                    f"INSERT INTO latest_prices ({', '.join(COLUMNS)}, first_seen) VALUES ({placeholders}, ?) "
+                    f"ON CONFLICT (product_key) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in COLUMNS[1:])}, "
+                    f"samples = latest_prices.samples + 1, changes = latest_prices.changes + {CHANGED}, "
+                    f"last_change = CASE WHEN {CHANGED} THEN excluded.scraped_at ELSE latest_prices.last_change END "
+                    "WHERE excluded.scraped_at >= latest_prices.scraped_at", [row + (row[-1],) for row in rows])
+                self.conn.executemany(
+                    "INSERT INTO listing_products (listing_key, product_key, scraped_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (listing_key, product_key) DO UPDATE SET scraped_at = MAX(scraped_at, excluded.scraped_at)", listings)
+        return len(rows)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def latest(self, key):
+        """Most recent row for a product key or URL, or None"""
+        rows = self._query("SELECT * FROM latest_prices WHERE product_key = ?", (self._key(key),))
+        return rows[0] if rows else None
+
+    def latest_by_store(self, store):
+        """Most recent row for every product in a store"""
+        return self._query("SELECT * FROM latest_prices WHERE store = ? ORDER BY name", (store,))
+
+    def listing_products(self, key):
+        """(time of a listing's last scrape, product keys found on it then), or (None, []) if never scraped"""
+        rows = self._query(
+            "SELECT product_key, scraped_at FROM listing_products WHERE listing_key = ? AND scraped_at >= "
+            "(SELECT MAX(scraped_at) FROM listing_products WHERE listing_key = ?) - ?", (key, key, LISTING_SCRAPE_WINDOW))
+        if not rows:
+            return None, []
+        return max(row['scraped_at'] for row in rows), [row['product_key'] for row in rows]
+
+    def history(self, key, since=None, until=None):
+        """Rows for a product between two epoch timestamps (default: all time), oldest first"""
+        return self._query(
+            "SELECT * FROM prices WHERE product_key = ? AND scraped_at >= ? AND scraped_at <= ? ORDER BY scraped_at",
+            (self._key(key), since or 0, until or time.time()))
+
+    def lowest(self, key, days=30):
+        """Row with the lowest price for a product in the last N days, or None"""
+        rows = self._query(
+            "SELECT * FROM prices WHERE product_key = ? AND scraped_at >= ? AND price IS NOT NULL ORDER BY price, scraped_at DESC LIMIT 1",
+            (self._key(key), time.time() - days * 86400))
+        return rows[0] if rows else None
+
+    def _migrate(self):
+        """Add the change counters to a latest_prices table from before they existed, counting the history once"""
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(latest_prices)")}
+        missing = [(name, kind) for name, kind in COUNTER_COLUMNS if name not in columns]
+        if not missing:
+            return
+        with self.conn:
+            for name, kind in missing:
+                self.conn.execute(f"ALTER TABLE latest_prices ADD COLUMN {name} {kind}")
+            rows = self.conn.execute(
+                "SELECT product_key, COUNT(*), SUM(changed), MIN(scraped_at), MAX(CASE WHEN changed THEN scraped_at END) "
+                "FROM (SELECT product_key, scraped_at, "
+                "      (LAG(scraped_at) OVER w IS NOT NULL AND (price IS NOT LAG(price) OVER w OR was_price IS NOT LAG(was_price) OVER w "
+                "       OR promo_badge IS NOT LAG(promo_badge) OVER w)) AS changed "
+                "      FROM prices WINDOW w AS (PARTITION BY product_key ORDER BY scraped_at)) "
+                "GROUP BY product_key").fetchall()
+            self.conn.executemany(
+                "UPDATE latest_prices SET samples = ?, changes = ?, first_seen = ?, last_change = ? WHERE product_key = ?",
+                [(samples, changes, first_seen, last_change, key) for key, samples, changes, first_seen, last_change in rows])
+
+    @staticmethod
+    def _key(key):
+        return key if '://' not in key else product_key(key)
@@ -0,0 +1,81 @@
+"""Typed price records, parsed once per scrape result.
+
+The scrapers return prices as display strings ("3.50", "Not found", "Not
+applicable", "$1.20 per 100g"). normalize() turns a result into a PriceRecord
+with float prices, a unit price converted to a canonical unit (per kg, per L or
+per each) and the promotion label, so the results table, exporters and
+analytics never have to run a regex over those strings again.
+"""
+import re
+from collections import namedtuple
+
+PriceRecord = namedtuple('PriceRecord', (
+    'store', 'name', 'url',
+    'price', 'was_price', 'unit_price', 'unit',   # floats (None when missing) and the canonical unit
+    'price_text', 'was_text', 'cup_price', 'promo_badge',
+    'discount', 'promotion',
+))
+
+PRICE_RE = re.compile(r'\d[\d,]*(?:\.\d+)?|\.\d+')
+# "$0.42 / 1EA", "$1.20 per 100g", "$3.50/1KG", "$0.35 per 1ea"
+UNIT_PRICE_RE = re.compile(r'\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(?:/|per)\s*(\d+(?:\.\d+)?)?\s*([a-zA-Z]+)', re.IGNORECASE)
+
+# Measured unit -> (canonical unit, multiplier from one measured unit to one canonical unit)
+UNITS = {
+    'g': ('kg', 1000), 'gm': ('kg', 1000), 'kg': ('kg', 1),
+    'ml': ('L', 1000), 'l': ('L', 1), 'lt': ('L', 1), 'litre': ('L', 1), 'liter': ('L', 1),
+    'ea': ('ea', 1), 'each': ('ea', 1),
+}
+
+def parse_price(text):
+    """Float value of a price string, or None for "Not found", "Not applicable" and the like"""
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = PRICE_RE.search(text)
+    return float(match.group().replace(',', '')) if match else None
+
+def parse_unit_price(text):
+    """(price per canonical unit, unit) for a cup price string, or (None, None)"""
+    match = UNIT_PRICE_RE.search(text or '')
+    if not match:
+        return None, None
+    price = float(match.group(1).replace(',', ''))
+    quantity = float(match.group(2)) if match.group(2) else 1.0
+    unit = match.group(3).lower()
+    if not quantity:
+        return None, None
+    canonical, per_canonical = UNITS.get(unit, (unit.rstrip('s') or unit, 1))
+    return price / quantity * per_canonical, canonical
+
+def classify_promotion(price, was_price, promo_badge=""):
+    """Return (discount percent or None, promotion label) from typed prices"""
+    if price is not None and was_price is not None and was_price > price:
+        discount_amt, discount_pct = was_price - price, ((was_price - price) / was_price) * 100
+        if "1/2 Price" in promo_badge or 48 <= discount_pct <= 52: return discount_pct, "HALF PRICE!"
+        if "Special" in promo_badge: return discount_pct, f"{discount_pct:.0f}% OFF"
+        if discount_pct >= 30: return discount_pct, f"{discount_pct:.0f}% OFF!"
+        if discount_pct >= 20: return discount_pct, f"{discount_pct:.0f}% OFF"
+        if discount_pct > 0: return discount_pct, f"Save ${discount_amt:.2f}"
+    if promo_badge:
+        if "1/2 Price" in promo_badge: return 50.0, "HALF PRICE!"
+        if "Special" in promo_badge: return None, "SPECIAL"
+    return None, ""
+
+def calculate_discount(current_price, was_price, promo_badge=""):
+    """classify_promotion for price strings as the scrapers return them"""
+    return classify_promotion(parse_price(current_price), parse_price(was_price), promo_badge or "")
+
+def normalize(data):
+    """Parse a successful scrape result into a PriceRecord"""
+    promo_badge = data.get('promo_badge') or ""
+    price, was_price = parse_price(data.get('price')), parse_price(data.get('was_price'))
+    unit_price, unit = parse_unit_price(data.get('cup_price'))
+    discount, promotion = classify_promotion(price, was_price, promo_badge)
+    return PriceRecord(
+        data['store'], data['name'], data['url'],
+        price, was_price, unit_price, unit,
+        data['price'], data['was_price'], data['cup_price'], promo_badge,
+        discount, promotion,
+    )
@@ -0,0 +1,200 @@
+"""Pairs the same product across Woolworths and Coles.
+
+Names are normalised into tokens (lower case, punctuation and filler words
+dropped, plurals folded) plus a pack size ("25 pack", "1.5kg", "500ml") pulled
+out as (quantity, unit). Candidates come from an inverted index of tokens, so
+each product is only scored against products it shares a distinctive word
+with; tokens common across the catalogue ("laundry", "sheet") still count
+towards the score but are not used to find candidates. Pairs are scored with an
+IDF-weighted Jaccard similarity, products with different known pack sizes never
+match, and each product ends up in at most one group (best score first).
+
+Match groups are kept in a JSON file, so later runs only match products that
+aren't grouped yet and the results table and exports can show both stores'
+prices side by side.
+"""
+import itertools
+import json
+import math
+import os
+import re
+from collections import namedtuple
+from scraper_core import product_key
+
+MATCHES_FILE = 'product_matches.json'
+
+STOPWORDS = frozenset(('the', 'and', 'with', 'for', 'of', 'in', 'a', 'pack', 'pk', 'each', 'ea', 'x'))
+
+# Pack size -> (canonical unit, multiplier); "25 pack" and "25pk" both become (25, 'ea')
+SIZE_UNITS = {
+    'kg': ('g', 1000), 'g': ('g', 1), 'gm': ('g', 1),
+    'l': ('ml', 1000), 'lt': ('ml', 1000), 'litre': ('ml', 1000), 'ml': ('ml', 1),
+    'pack': ('ea', 1), 'pk': ('ea', 1), 'ea': ('ea', 1), 'each': ('ea', 1), 'sheets': ('ea', 1), 'sheet': ('ea', 1),
+}
+SIZE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(kg|gm|g|litre|lt|ml|l|pack|pk|each|ea|sheets|sheet)\b')
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+Signature = namedtuple('Signature', 'key store name tokens brand size')
+
+def url_slug(url):
+    """The descriptive part of a product URL, with the product id dropped"""
+    path = url.split('?', 1)[0].split('#', 1)[0].rstrip('/')
+    slug = path.rsplit('/', 1)[-1]
+    return re.sub(r'-\d+$', '', slug).replace('-', ' ')
+
+def name_tokens(text):
+    """(token set, pack size or None) for a product name"""
+    text = text.lower().replace("'", '')
+    size = None
+    match = SIZE_RE.search(text)
+    if match:
+        unit, multiplier = SIZE_UNITS[match.group(2)]
+        size = (round(float(match.group(1)) * multiplier, 3), unit)
+        text = text[:match.start()] + ' ' + text[match.end():]
+    tokens = []
+    for token in TOKEN_RE.findall(text):
+        if token in STOPWORDS or token.isdigit():
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens, size
+
+def signature(record):
+    """Matching signature for a PriceRecord; unscraped names fall back to the URL slug"""
+    name = record.name if record.name and record.name != "Not found" else url_slug(record.url)
+    tokens, size = name_tokens(name)
+    return Signature(product_key(record.url), record.store, name, frozenset(tokens), tokens[0] if tokens else None, size)
+
+def _weighted_jaccard(a, b, idf):
+    shared = sum(idf[t] for t in a & b)
+    return shared / sum(idf[t] for t in a | b) if shared else 0.0
+
+class ProductMatcher:
+    """Cross-store match groups with an inverted-index matcher and a JSON backing file"""
+
+    def __init__(self, path=MATCHES_FILE, threshold=0.5, max_df=0.05, min_postings=50, log=print):
+        self.path = path
+        self.threshold = threshold
+        self.max_df = max_df              # tokens in more than this share of a store are not used for candidates...
+        self.min_postings = min_postings  # ...unless the store is small enough that it doesn't matter
+        self.log = log
+        self.groups = {}  # group id -> {'members': {store: product key}, 'names': {store: name}, 'score': float}
+        self.by_key = {}  # product key -> group id
+
+    def __len__(self):
+        return len(self.groups)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                groups = json.load(f).get('groups', [])
+        except (OSError, ValueError) as e:
+            self.log(f"Could not read {self.path}: {e}")
+            return False
+        self.groups, self.by_key = {}, {}
+        for group in groups:
+            self._add_group(group)
+        return True
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'groups': list(self.groups.values())}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def _add_group(self, group):
+        group_id = '+'.join(sorted(group['members'].values()))
+        self.groups[group_id] = group
+        for key in group['members'].values():
+            self.by_key[key] = group_id
+        return group_id
+
+    def group_of(self, key):
+        """Group id for a product key or URL, or None"""
+        return self.by_key.get(key if '://' not in key else product_key(key))
+
+    def partners(self, key):
+        """{store: product key} of the other members of a product's group"""
+        group_id = self.group_of(key)
+        if group_id is None:
+            return {}
+        own = key if '://' not in key else product_key(key)
+        return {store: other for store, other in self.groups[group_id]['members'].items() if other != own}
+
+    def partner_map(self):
+        """{product key: key of another member of its group} for every grouped product"""
+        partners = {}
+        for group in self.groups.values():
+            keys = list(group['members'].values())
+            for i, key in enumerate(keys):
+                partners[key] = keys[(i + 1) % len(keys)]
+        return partners
+
+    def match(self, records, rematch=False):
+        """Group products across stores; returns the new group ids.
+
+        Products already in a group are left alone unless rematch is set, so a
+        run only pays for the products it hasn't seen before.
+        """
+        if rematch:
+            self.groups, self.by_key = {}, {}
+        by_store = {}
+        for record in records:
+            sig = signature(record)
+            if sig.key in self.by_key or not sig.tokens:
+                continue
+            by_store.setdefault(record.store, {})[sig.key] = sig
+        pairs = []
+        for store_a, store_b in itertools.combinations(sorted(by_store), 2):
+            pairs.extend(self._candidate_pairs(list(by_store[store_a].values()), list(by_store[store_b].values())))
+        pairs.sort(key=lambda pair: -pair[0])
+        new = []
+        for score, a, b in pairs:
+            if a.key in self.by_key or b.key in self.by_key:
+                continue
+            new.append(self._add_group({'members': {a.store: a.key, b.store: b.key},
+                                        'names': {a.store: a.name, b.store: b.name}, 'score': round(score, 3)}))
+        return new
+
+    def _candidate_pairs(self, left, right):
+        documents = len(left) + len(right)
+        df = {}
+        for sig in itertools.chain(left, right):
+            for token in sig.tokens:
+                df[token] = df.get(token, 0) + 1
+        idf = {token: math.log(1 + documents / count) for token, count in df.items()}
+        # Index the right-hand store; common tokens are too unselective to be worth their posting lists
+        cap = max(self.min_postings, self.max_df * len(right))
+        postings = {}
+        for i, sig in enumerate(right):
+            for token in sig.tokens:
+                postings.setdefault(token, []).append(i)
+        postings = {token: ids for token, ids in postings.items() if len(ids) <= cap}
+        pairs = []
+        for a in left:
+            candidates = set()
+            for token in a.tokens:
+                candidates.update(postings.get(token, ()))
+            for i in candidates:
+                b = right[i]
+                if a.size and b.size and a.size != b.size:
+                    continue
+                score = _weighted_jaccard(a.tokens, b.tokens, idf)
+                if a.brand != b.brand:
+                    score *= 0.5
+                if score >= self.threshold:
+                    pairs.append((score, a, b))
+        return pairs
+
+    def comparisons(self, records):
+        """[(group id, {store: PriceRecord})] for groups with more than one member among records"""
+        by_key = {product_key(record.url): record for record in records}
+        rows = []
+        for group_id, group in self.groups.items():
+            members = {store: by_key[key] for store, key in group['members'].items() if key in by_key}
+            if len(members) > 1:
+                rows.append((group_id, members))
+        return rows
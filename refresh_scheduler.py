@@ -0,0 +1,124 @@
+"""Volatility-aware re-scrape scheduling on top of the price history.
+
+Each product gets its own refresh interval: about half the average time between
+the price/promo changes seen in its history, clamped between a freshness TTL and
+a maximum age, and jittered so a large catalogue doesn't come due all at once.
+PriceHistory keeps the change counts on each product's latest row as results
+are written, so planning reads one row per product rather than its history.
+Products are also always due once after each weekly specials changeover
+(Wednesday for both Woolworths and Coles). Anything not due is served from the
+latest row in the history instead of being scraped again.
+
+A listing URL counts as scraped when its products were, and comes due with the
+most volatile of the products found on it last time; until then its products
+are served from the history together.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from scraper_core import product_key, is_listing_url
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Both stores roll their weekly specials over on Wednesday morning
+SPECIALS_CHANGEOVER_WEEKDAY = 2
+SPECIALS_CHANGEOVER_HOUR = 0
+
+def last_changeover(now):
+    """Epoch time of the most recent weekly specials changeover at or before now (local time)"""
+    current = datetime.fromtimestamp(now)
+    days_back = (current.weekday() - SPECIALS_CHANGEOVER_WEEKDAY) % 7
+    changeover = (current - timedelta(days=days_back)).replace(hour=SPECIALS_CHANGEOVER_HOUR, minute=0, second=0, microsecond=0)
+    if changeover > current:
+        changeover -= timedelta(days=7)
+    return changeover.timestamp()
+
+def cached_result(row):
+    """Turn a latest_prices row back into the scrape result shape, marked with when it was scraped"""
+    return {
+        'store': row['store'],
+        'name': row['name'],
+        'price': f"{row['price']:.2f}" if row['price'] is not None else "Not found",
+        'was_price': f"{row['was_price']:.2f}" if row['was_price'] is not None else "Not applicable",
+        'cup_price': row['cup_price'],
+        'url': row['url'],
+        'promo_badge': row['promo_badge'] or "",
+        'cached_at': row['scraped_at'],
+    }
+
+class RefreshScheduler:
+    """Decide which URLs need scraping now and serve the rest from the price history"""
+
+    def __init__(self, history, fresh_ttl=6 * HOUR, max_interval=7 * DAY, jitter=0.2):
+        self.history = history
+        self.fresh_ttl = fresh_ttl
+        self.max_interval = max_interval
+        self.jitter = jitter
+
+    def interval(self, latest):
+        """Refresh interval in seconds from a product's latest_prices row and its change counters (None = never scraped)"""
+        if not latest:
+            return 0
+        span = latest['scraped_at'] - (latest['first_seen'] or latest['scraped_at'])
+        if latest['changes']:
+            interval = span / latest['changes'] / 2
+        else:
+            # No change seen yet: trust the product's stability as far as we have watched it
+            interval = span
+        return min(max(interval, self.fresh_ttl), self.max_interval)
+
+    def _jittered(self, key, last_seen, interval):
+        # Deterministic per product and scrape, so repeated plans agree with each other
+        spread = random.Random(f"{key}:{last_seen}").uniform(-self.jitter, self.jitter)
+        return interval * (1 + spread)
+
+    def _schedule(self, url):
+        """(key, last scrape time, refresh interval, cached results) for a URL, or None if it is unknown"""
+        key = product_key(url)
+        if is_listing_url(url):
+            scraped_at, members = self.history.listing_products(key)
+            rows = [row for row in map(self.history.latest, members) if row is not None]
+            if not rows:
+                return None
+            interval = min(self.interval(row) for row in rows)
+            return key, scraped_at, interval, [dict(cached_result(row), listing=url) for row in rows]
+        latest = self.history.latest(key)
+        if latest is None:
+            return None
+        return key, latest['scraped_at'], self.interval(latest), [cached_result(latest)]
+
+    def plan(self, urls, now=None):
+        """Split URLs into (due, cached): URLs to scrape now, and cached result dicts for the rest"""
+        now = now or time.time()
+        changeover = last_changeover(now)
+        due, cached = [], []
+        for url in urls:
+            schedule = self._schedule(url)
+            if schedule is None:
+                due.append(url)
+                continue
+            key, scraped_at, interval, results = schedule
+            age = now - scraped_at
+            missed_changeover = scraped_at < changeover and age > self.fresh_ttl
+            if missed_changeover or age >= self._jittered(key, scraped_at, interval):
+                due.append(url)
+            else:
+                cached.extend(results)
+        return due, cached
+
+    def next_run_in(self, urls, now=None, floor=60):
+        """Seconds until the earliest of these URLs comes due (at least floor)"""
+        now = now or time.time()
+        changeover = last_changeover(now)
+        soonest = changeover + 7 * DAY
+        for url in urls:
+            schedule = self._schedule(url)
+            if schedule is None:
+                return floor
+            key, scraped_at, interval, _ = schedule
+            if scraped_at < changeover:
+                soonest = min(soonest, scraped_at + self.fresh_ttl)
+                continue
+            soonest = min(soonest, scraped_at + self._jittered(key, scraped_at, interval))
+        return max(floor, soonest - now)
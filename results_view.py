@@ -0,0 +1,403 @@
+"""Virtualized, sortable and filterable results table.
+
+A Treeview with one real item per result becomes unusable at tens of thousands
+of rows. ResultsModel keeps the rows in plain lists with a lazily built sort
+index per column (kept up to date with bisect as results stream in), and
+ResultsView only creates Treeview items for the rows that fit on screen,
+refilling them as the user scrolls. Rows can carry the Change since the last
+run (see change_detection), shown in their own column, and the view can be
+narrowed to the changed rows only.
+"""
+import bisect
+import tkinter as tk
+from tkinter import ttk
+from scraper_core import product_key
+from change_detection import CHANGE_KINDS, describe
+
+COLUMNS = (
+    ('Store', 'Store', 80, 'center'),
+    ('Product', 'Product Name', 400, 'w'),
+    ('Price', 'Current Price', 100, 'center'),
+    ('Was', 'Was Price', 100, 'center'),
+    ('Unit Price', 'Unit Price', 150, 'center'),
+    ('Promotion', 'Promotion', 150, 'center'),
+    ('Other Store', 'Other Store', 150, 'center'),
+    ('Change', 'Change', 200, 'w'),
+)
+
+# Columns whose first click sorts largest first
+DESCENDING_FIRST = ('Promotion',)
+
+# Column positions with numeric sort keys; rows missing the number always go last
+NUMERIC_COLUMNS = (2, 3, 4, 5, 6, 7)
+MISSING = (1, 0.0)
+OTHER_STORE = 6
+CHANGE = 7
+
+def _numeric_key(value):
+    return (0, value) if value is not None else MISSING
+
+class ResultsModel:
+    """Result rows plus per-column sort indexes and a filtered view of row ids"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.values = []     # display tuple per row
+        self.records = []
+        self.urls = []
+        self.rows_by_key = {}  # product key -> row id
+        self.partners = {}     # product key -> matched product key at another store
+        self.changes = []    # Change since the last run per row, or None
+        self.keys = []       # sort key per column per row
+        self.haystacks = []  # lower-cased text the filter matches against
+        self._indexes = {}   # column -> sorted list of (key, row id)
+        self.sort_column, self.descending = None, False
+        self.query = ''
+        self.changes_only = False
+        self.view = []       # row ids that pass the filter, in ascending sort order
+        self._view_keys = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, record, change=None):
+        """Append one PriceRecord (and its Change, if any) and slot it into the indexes and the current view"""
+        price_display = f"${record.price_text}" if record.price_text != "Not found" else "N/A"
+        was_display = f"${record.was_text}" if record.was_text != "Not applicable" else "-"
+        values = (record.store, record.name, price_display, was_display, record.cup_price, record.promotion, "",
+                  describe(change) if change else "")
+        keys = (
+            (record.store, record.name.lower()),
+            record.name.lower(),
+            _numeric_key(record.price),
+            _numeric_key(record.was_price),
+            # Unit prices only compare within a unit, so group per kg, per L and per each
+            _numeric_key((record.unit, record.unit_price) if record.unit_price is not None else None),
+            _numeric_key(record.discount),
+            MISSING,
+            # Changed rows group by kind of change; unchanged ones go last
+            _numeric_key(CHANGE_KINDS.index(change.kind) if change else None),
+        )
+        row_id = len(self.values)
+        self.values.append(values)
+        self.records.append(record)
+        self.changes.append(change)
+        self.urls.append(record.url)
+        self.keys.append(keys)
+        self.haystacks.append(' '.join(str(v) for v in values).lower())
+        for column, index in self._indexes.items():
+            bisect.insort(index, (keys[column], row_id))
+        self._view_insert(row_id)
+        key = product_key(record.url)
+        self.rows_by_key[key] = row_id
+        other = self.rows_by_key.get(self.partners.get(key))
+        if other is not None and other != row_id:
+            self._set_other(row_id, other, refresh=True)
+            self._set_other(other, row_id, refresh=True)
+        return row_id
+
+    def set_partners(self, partners):
+        """Show each row's matched product from another store (partners: product key -> product key)"""
+        self.partners = partners
+        for key, row_id in self.rows_by_key.items():
+            other = self.rows_by_key.get(partners.get(key))
+            if other is not None and other != row_id:
+                self._set_other(row_id, other)
+        # Rebuild the affected index and view once rather than moving rows one by one
+        self._indexes.pop(OTHER_STORE, None)
+        self._refilter(self._ordered_ids())
+
+    def _set_other(self, row_id, other, refresh=False):
+        record, match = self.records[row_id], self.records[other]
+        if match.price is None:
+            text, difference = f"{match.store} N/A", None
+        elif record.price is None:
+            text, difference = f"{match.store} ${match.price:.2f}", None
+        else:
+            difference = record.price - match.price
+            text = f"{match.store} ${match.price:.2f} ({difference:+.2f})"
+        if refresh:
+            self._view_remove(row_id)
+            if OTHER_STORE in self._indexes:
+                index = self._indexes[OTHER_STORE]
+                del index[bisect.bisect_left(index, (self.keys[row_id][OTHER_STORE], row_id))]
+                bisect.insort(index, (_numeric_key(difference), row_id))
+        values, keys = self.values[row_id], self.keys[row_id]
+        self.values[row_id] = values[:OTHER_STORE] + (text,) + values[OTHER_STORE + 1:]
+        self.keys[row_id] = keys[:OTHER_STORE] + (_numeric_key(difference),) + keys[OTHER_STORE + 1:]
+        self.haystacks[row_id] = ' '.join(str(v) for v in self.values[row_id]).lower()
+        if refresh:
+            self._view_insert(row_id)
+
+    def _passes(self, row_id):
+        return self.query in self.haystacks[row_id] and (not self.changes_only or self.changes[row_id] is not None)
+
+    def _view_insert(self, row_id):
+        if not self._passes(row_id):
+            return
+        if self.sort_column is None:
+            bisect.insort(self.view, row_id)
+        else:
+            entry = (self.keys[row_id][self.sort_column], row_id)
+            position = bisect.bisect(self._view_keys, entry)
+            self._view_keys.insert(position, entry)
+            self.view.insert(position, row_id)
+
+    def _view_remove(self, row_id):
+        position = self._view_position(row_id)
+        if position is not None:
+            del self.view[position]
+            if self.sort_column is not None:
+                del self._view_keys[position]
+
+    def _index(self, column):
+        if column not in self._indexes:
+            self._indexes[column] = sorted((keys[column], row_id) for row_id, keys in enumerate(self.keys))
+        return self._indexes[column]
+
+    def sort(self, column, descending=False):
+        self.sort_column, self.descending = column, descending
+        self._refilter(self._ordered_ids())
+
+    def set_filter(self, query):
+        """Filter rows by a case-insensitive substring; narrowing a query only rescans the current view"""
+        query = query.strip().lower()
+        candidates = self.view if self.query in query else self._ordered_ids()
+        self.query = query
+        self._refilter(candidates)
+
+    def set_changes_only(self, changes_only):
+        """Show only rows that changed since the last run"""
+        candidates = self.view if changes_only or not self.changes_only else self._ordered_ids()
+        self.changes_only = changes_only
+        self._refilter(candidates)
+
+    def _ordered_ids(self):
+        if self.sort_column is None:
+            return range(len(self.values))
+        return [row_id for _, row_id in self._index(self.sort_column)]
+
+    def _refilter(self, candidates):
+        if self.query or self.changes_only:
+            self.view = [row_id for row_id in candidates if self._passes(row_id)]
+        else:
+            self.view = list(candidates)
+        if self.sort_column is None:
+            self._view_keys = []
+        else:
+            self._view_keys = [(self.keys[row_id][self.sort_column], row_id) for row_id in self.view]
+
+    def _present(self):
+        # Number of rows in the view that have a value in the sort column
+        if self.sort_column not in NUMERIC_COLUMNS:
+            return len(self.view)
+        return bisect.bisect_left(self._view_keys, (MISSING, -1))
+
+    def _flip(self, position):
+        # Descending order reverses the rows that have a value and leaves the missing ones at the end
+        if not self.descending:
+            return position
+        present = self._present()
+        return present - 1 - position if position < present else position
+
+    def row_at(self, position):
+        """Row id shown at a position of the (possibly descending) view"""
+        return self.view[self._flip(position)]
+
+    def _view_position(self, row_id):
+        # Index of a row in the ascending view, or None
+        if self.sort_column is None:
+            position = bisect.bisect_left(self.view, row_id)
+        else:
+            position = bisect.bisect_left(self._view_keys, (self.keys[row_id][self.sort_column], row_id))
+        if position >= len(self.view) or self.view[position] != row_id:
+            return None
+        return position
+
+    def position_of(self, row_id):
+        """Position of a row in the view, or None if it is filtered out"""
+        position = self._view_position(row_id)
+        return None if position is None else self._flip(position)
+
+class ResultsView(ttk.Frame):
+    """Filter box and Treeview that only materialises the rows in the viewport"""
+
+    def __init__(self, parent, on_open=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.model = ResultsModel()
+        self.on_open = on_open
+        self.offset = 0
+        self.slots = 20
+        self.selected = None
+        self.row_height, self.heading_height = 20, None
+        self.viewport_height = None
+
+        filter_frame = ttk.Frame(self)
+        filter_frame.grid(column=0, row=0, columnspan=2, sticky='ew', pady=(0, 5))
+        ttk.Label(filter_frame, text="Filter:").pack(side='left')
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add('write', lambda *args: self.set_filter(self.filter_var.get()))
+        ttk.Entry(filter_frame, textvariable=self.filter_var, width=40).pack(side='left', padx=5)
+        self.changes_only_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(filter_frame, text="Changes only", variable=self.changes_only_var,
+                        command=lambda: self.set_changes_only(self.changes_only_var.get())).pack(side='left', padx=5)
+        self.count_label = ttk.Label(filter_frame, text="")
+        self.count_label.pack(side='left', padx=5)
+
+        self.tree = ttk.Treeview(self, columns=[c[0] for c in COLUMNS], show='headings', height=self.slots, selectmode='browse')
+        for column, (name, text, width, anchor) in enumerate(COLUMNS):
+            self.tree.heading(name, text=text, command=lambda c=column: self.sort_by(c))
+            self.tree.column(name, width=width, anchor=anchor)
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=hsb.set)
+        self.tree.grid(column=0, row=1, sticky='nsew')
+        self.vsb.grid(column=1, row=1, sticky='ns')
+        hsb.grid(column=0, row=2, sticky='ew')
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Up>', lambda e: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-self.slots))
+        self.tree.bind('<Next>', lambda e: self.scroll(self.slots))
+        self.tree.bind('<Home>', lambda e: self.scroll(-len(self.model)))
+        self.tree.bind('<End>', lambda e: self.scroll(len(self.model)))
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<Double-1>', self._on_double_click)
+
+    def clear(self):
+        self.model.clear()
+        self.model.changes_only = self.changes_only_var.get()
+        self.offset, self.selected = 0, None
+        for column, (name, text, _, _) in enumerate(COLUMNS):
+            self.tree.heading(name, text=text)
+        self.render()
+
+    def add(self, rows):
+        """Add a batch of (PriceRecord, Change or None) rows and redraw once"""
+        for record, change in rows:
+            self.model.add(record, change)
+        self.render()
+
+    def set_partners(self, partners):
+        self.model.set_partners(partners)
+        self.render()
+
+    def set_filter(self, query):
+        self.model.set_filter(query)
+        self.offset = 0
+        self.render()
+
+    def set_changes_only(self, changes_only):
+        self.model.set_changes_only(changes_only)
+        self.offset = 0
+        self.render()
+
+    def sort_by(self, column):
+        if self.model.sort_column == column:
+            descending = not self.model.descending
+        else:
+            descending = COLUMNS[column][0] in DESCENDING_FIRST
+        self.model.sort(column, descending)
+        for other, (name, text, _, _) in enumerate(COLUMNS):
+            arrow = (' ▼' if descending else ' ▲') if other == column else ''
+            self.tree.heading(name, text=text + arrow)
+        self.offset = 0
+        self.render()
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.render()
+        return 'break'
+
+    def render(self):
+        """Refill the on-screen slots from the current offset"""
+        total = len(self.model.view)
+        self.offset = max(0, min(self.offset, total - self.slots))
+        shown = min(self.slots, total - self.offset)
+        items = self.tree.get_children()
+        if len(items) > shown:
+            self.tree.delete(*items[shown:])
+        for slot in range(shown):
+            row_id = self.model.row_at(self.offset + slot)
+            iid = f"slot{slot}"
+            if slot < len(items):
+                self.tree.item(iid, values=self.model.values[row_id])
+            else:
+                self.tree.insert('', tk.END, iid=iid, values=self.model.values[row_id])
+        self.tree.yview_moveto(0)
+        position = self.model.position_of(self.selected) if self.selected is not None else None
+        if position is not None and self.offset <= position < self.offset + shown:
+            self.tree.selection_set(f"slot{position - self.offset}")
+        elif self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+        if total:
+            self.vsb.set(self.offset / total, (self.offset + shown) / total)
+        else:
+            self.vsb.set(0, 1)
+        filtered = f"{total:,} of {len(self.model):,} products" if self.model.query or self.model.changes_only else f"{total:,} products"
+        self.count_label.config(text=filtered)
+        if self.heading_height is None and shown:
+            self._fit()
+
+    def _fit(self):
+        # Row and heading heights depend on theme and font, so measure them off the first real row
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if items else ''
+        if bbox:
+            self.heading_height, self.row_height = bbox[1], bbox[3]
+        if self.viewport_height is None:
+            return
+        slots = max(1, (self.viewport_height - (self.heading_height or 0)) // self.row_height)
+        if slots != self.slots:
+            self.slots = slots
+            self.render()
+
+    def _slot_row(self, iid):
+        if not iid or not iid.startswith('slot'):
+            return None
+        position = self.offset + int(iid[4:])
+        return self.model.row_at(position) if position < len(self.model.view) else None
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        row_id = self._slot_row(selection[0]) if selection else None
+        if row_id is not None:
+            self.selected = row_id
+
+    def _move_selection(self, step):
+        position = self.model.position_of(self.selected) if self.selected is not None else None
+        position = self.offset if position is None else max(0, min(position + step, len(self.model.view) - 1))
+        if not self.model.view:
+            return 'break'
+        self.selected = self.model.row_at(position)
+        if position < self.offset:
+            self.offset = position
+        elif position >= self.offset + self.slots:
+            self.offset = position - self.slots + 1
+        self.render()
+        return 'break'
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        total = len(self.model.view)
+        if action == 'moveto':
+            self.offset = int(float(amount) * total)
+        elif action == 'scroll':
+            self.offset += int(amount) * (self.slots if unit == 'pages' else 1)
+        self.render()
+
+    def _on_resize(self, event):
+        self.viewport_height = event.height
+        self._fit()
+
+    def _on_double_click(self, event):
+        row_id = self._slot_row(self.tree.identify_row(event.y))
+        if row_id is not None and self.on_open:
+            self.on_open(self.model.urls[row_id])
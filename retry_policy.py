@@ -0,0 +1,99 @@
+"""Retry backoff and per-store circuit breakers for the page pool.
+
+Failed URLs are sorted into kinds (see scraper_core.classify_error): 'timeout',
+'selector' (the page loaded but the product never rendered), 'blocked' (bot
+challenge or HTTP 403/429), 'navigation' (DNS, connection and other network
+errors) and 'error' for anything else. RetryPolicy decides which kinds are worth
+another go and how long to back off first; the pool puts those URLs back at the
+end of their store's queue. A CircuitBreaker per store stops a store that keeps
+failing from costing a full timeout per URL: after a few failures in a row it
+pauses the store, lets a single trial URL through once the pause is over, and
+gives the store up for the run if it keeps tripping, so its remaining URLs are
+deferred at once (a resumed run picks them up again).
+"""
+import random
+
+# Kinds that say something is wrong with the store rather than with one product
+TRIPPING_KINDS = ('timeout', 'navigation', 'blocked', 'selector')
+
+class RetryPolicy:
+    """How many times each kind of failure is tried, and the exponential backoff between tries"""
+
+    # Total tries per kind, the first one included; kinds left out are never retried
+    ATTEMPTS = {'timeout': 3, 'navigation': 3, 'blocked': 2, 'selector': 2}
+
+    # Blocked stores need longer to cool off than a flaky connection
+    SLOWDOWN = {'blocked': 4.0}
+
+    def __init__(self, attempts=None, base_delay=15.0, factor=2.0, max_delay=600.0, jitter=0.25):
+        self.attempts = dict(self.ATTEMPTS if attempts is None else attempts)
+        self.base_delay = base_delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def should_retry(self, kind, attempt):
+        """True if a URL that just failed its attempt-th try with kind gets another one"""
+        return attempt < self.attempts.get(kind, 1)
+
+    def delay(self, kind, attempt):
+        """Seconds to wait before try attempt + 1"""
+        delay = self.base_delay * self.factor ** (attempt - 1) * self.SLOWDOWN.get(kind, 1.0)
+        return min(delay, self.max_delay) * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+class CircuitBreaker:
+    """Closed, open (pausing the store), half-open (one trial URL in flight) or given up.
+
+    Opens after threshold tripping failures in a row. Each time it opens the
+    pause doubles, and once it has opened max_trips times the store is given up
+    on. Like TokenBucket, it is told the time rather than reading the clock.
+    """
+
+    def __init__(self, threshold=3, cooldown=60.0, max_trips=3):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_trips = max_trips
+        self.state = 'closed'
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+
+    def wait_time(self, now):
+        return max(0.0, self.open_until - now) if self.state == 'open' else 0.0
+
+    def take(self, now):
+        """A URL is about to go out; once an open breaker's pause is over, that URL is the trial"""
+        if self.state == 'open' and now >= self.open_until:
+            self.state = 'half_open'
+
+    def record(self, outcome, now):
+        """Settle a finished URL; returns 'tripped', 'gave_up' or 'closed' when the state changes, else None.
+
+        Whatever the outcome of a half-open trial, it moves the breaker out of half-open.
+        """
+        if outcome == 'ok':
+            self.failures = 0
+            if self.state == 'half_open':
+                self.state = 'closed'
+                return 'closed'
+            return None
+        if outcome not in TRIPPING_KINDS and self.state == 'half_open':
+            # The trial reached the store and failed on something about the product itself,
+            # which says the store is back; leaving the breaker half-open would stall the store for good
+            self.failures = 0
+            self.state = 'closed'
+            return 'closed'
+        if outcome not in TRIPPING_KINDS or self.state in ('open', 'gave_up'):
+            # Stragglers that were already in flight when the breaker opened don't count again
+            return None
+        self.failures += 1
+        if self.state == 'closed' and self.failures < self.threshold:
+            return None
+        self.trips += 1
+        self.failures = 0
+        if self.trips >= self.max_trips:
+            self.state = 'gave_up'
+            return 'gave_up'
+        self.state = 'open'
+        self.open_until = now + self.cooldown * 2 ** (self.trips - 1)
+        return 'tripped'
@@ -0,0 +1,116 @@
+"""Crash-safe journal of a scrape run, so an interrupted run can be resumed.
+
+The journal is an append-only JSONL file: a 'run' header with the full URL list,
+then one 'result' line per URL as it completes, then an 'end' line. Writes are
+flushed straight away and fsynced in batches, so a crash, dead browser or
+sleeping laptop loses at most the last few results. A torn final line from a
+crash is simply skipped when the journal is read back.
+"""
+import json
+import os
+import time
+import uuid
+
+JOURNAL_FILE = 'last_run.jsonl'
+
+class RunJournal:
+    """Append-only record of one run's results"""
+
+    def __init__(self, path=JOURNAL_FILE, fsync_every=20, fsync_interval=2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def start(self, urls):
+        """Begin a new run, replacing any previous journal"""
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._write({'type': 'run', 'run_id': uuid.uuid4().hex, 'started_at': time.time(), 'urls': urls}, sync=True)
+        return self
+
+    def resume(self):
+        """Keep appending to the existing journal"""
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if self._file.tell() and not _ends_with_newline(self.path):
+            self._file.write('\n')  # terminate a line torn by the crash
+        self._write({'type': 'resume', 'at': time.time()}, sync=True)
+        return self
+
+    def record(self, data):
+        self._write({'type': 'result', 'at': time.time(), 'data': data})
+
+    def finish(self):
+        if self._file:
+            self._write({'type': 'end', 'at': time.time()}, sync=True)
+            self.close()
+
+    def close(self):
+        if self._file:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def _write(self, entry, sync=False):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self._unsynced += 1
+        if sync or self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+def read_journal(path=JOURNAL_FILE):
+    """Return (urls, results by URL, finished) from a journal, or None if there is none"""
+    if not os.path.exists(path):
+        return None
+    urls, results, finished = None, {}, False
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn write from a crash
+            if entry['type'] == 'run':
+                urls = entry['urls']
+            elif entry['type'] == 'result':
+                data = entry['data']
+                data.setdefault('cached_at', entry['at'])
+                # A later success for the same URL wins over an earlier failure
+                if 'error' not in data or data['url'] not in results:
+                    results[data['url']] = data
+            elif entry['type'] == 'end':
+                finished = True
+    if urls is None:
+        return None
+    return urls, results, finished
+
+def resume_plan(path=JOURNAL_FILE):
+    """Split the last run into (done, remaining): earlier successful results and URLs still to scrape"""
+    journal = read_journal(path)
+    if journal is None:
+        return None
+    urls, results, _ = journal
+    # Products read off a listing page are journaled under their own URLs; the listing is done if any were
+    listed = {}
+    for data in results.values():
+        if data.get('listing') and 'error' not in data:
+            listed.setdefault(data['listing'], []).append(data)
+    done, remaining = [], []
+    for url in urls:
+        if url in listed:
+            done.extend(listed[url])
+        elif url in results and 'error' not in results[url]:
+            done.append(results[url])
+        else:
+            remaining.append(url)
+    return done, remaining
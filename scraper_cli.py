@@ -0,0 +1,373 @@
+"""Headless command-line runner for the price scraper.
+
+Scrapes a URL file and writes one JSON line per product as soon as it is
+scraped, so it can run from cron or on a server without a display:
+
+    python scraper_cli.py scraper_urls.txt --store coles --pages 2 -o results.jsonl
+
+With --smart only products likely to have changed are scraped, and --watch keeps
+running unattended, waking whenever the next product comes due.
+
+To spread a large list over several browsers, possibly on several machines, run
+a coordinator and any number of workers against one shared queue file:
+
+    python scraper_cli.py urls.txt --coordinator --queue /shared/work_queue.db -o results.jsonl
+    python scraper_cli.py --worker --queue /shared/work_queue.db      # on each worker machine
+
+or let the coordinator start local worker processes itself with --spawn N.
+Workers keep each store's politeness delay between them through the queue file.
+
+--csv appends each product to a CSV as it is scraped; --xlsx and --parquet are
+streamed out after every run.
+
+--changes, --webhook and --changes-only compare every run against the last one
+(see change_detection) and pass on only the products whose price or promotion
+moved, instead of the whole catalogue.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from scraper_core import Scraper, filter_urls
+from price_history import PriceHistory, HISTORY_DB
+from refresh_scheduler import RefreshScheduler
+from run_journal import RunJournal, JOURNAL_FILE, resume_plan
+from url_catalogue import load_url_file
+from work_queue import WorkQueue, QUEUE_FILE, default_worker_id
+from price_records import normalize
+from price_analytics import summary_lines
+from product_matching import ProductMatcher, MATCHES_FILE
+from snapshot_archive import SnapshotArchive, ARCHIVE_DIR
+from change_detection import ChangeDetector, JsonlSink, WebhookSink, SNAPSHOT_FILE, unavailable_record
+from exporters import CsvExporter, ColumnWidths, HAS_EXCEL, HAS_ARROW, excel_values, export_columnar, write_xlsx
+
+STORE_CHOICES = {'woolworths': 'Woolworths', 'coles': 'Coles'}
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Scrape Woolworths/Coles product URLs and stream JSONL results")
+    parser.add_argument('urls_file', nargs='?', help="text file with one product or listing URL per line (not needed with --resume)")
+    parser.add_argument('-o', '--output', default='-', help="JSONL output file, '-' for stdout (default)")
+    parser.add_argument('--store', action='append', choices=sorted(STORE_CHOICES), help="only scrape this store (repeatable; default: all)")
+    parser.add_argument('--headed', action='store_true', help="show the browser window (needed to solve a CAPTCHA by hand)")
+    parser.add_argument('--pages', type=int, default=1, help="number of browser pages to scrape with in parallel")
+    parser.add_argument('--woolworths-max', type=int, default=2, help="maximum pages on Woolworths at once")
+    parser.add_argument('--coles-max', type=int, default=1, help="maximum pages on Coles at once")
+    parser.add_argument('--no-fast-path', action='store_true', help="always use the browser instead of reading embedded JSON over HTTP")
+    parser.add_argument('--no-block', action='store_true', help="let the browser load images, fonts and trackers")
+    parser.add_argument('--no-retry', action='store_true', help="don't retry timeouts, blocks and network errors at the end of the run")
+    parser.add_argument('--ordered', action='store_true', help="emit results in input order instead of as they finish")
+    parser.add_argument('--history', default=HISTORY_DB, help=f"SQLite price-history database to append to (default: {HISTORY_DB})")
+    parser.add_argument('--no-history', action='store_true', help="do not record results in the price history")
+    parser.add_argument('--smart', action='store_true', help="only scrape products due for a refresh; serve the rest from the price history")
+    parser.add_argument('--watch', action='store_true', help="keep running, re-scraping products as they come due (implies --smart)")
+    parser.add_argument('--journal', default=JOURNAL_FILE, help=f"crash-safe run journal (default: {JOURNAL_FILE})")
+    parser.add_argument('--resume', action='store_true', help="resume the last journaled run, skipping URLs that already succeeded")
+    parser.add_argument('--coordinator', action='store_true', help="queue the URLs for --worker processes and merge their results instead of scraping here")
+    parser.add_argument('--worker', action='store_true', help="lease URLs from the coordinator's queue and scrape them")
+    parser.add_argument('--queue', default=QUEUE_FILE, help=f"shared SQLite work queue for --coordinator/--worker (default: {QUEUE_FILE})")
+    parser.add_argument('--spawn', type=int, default=0, help="with --coordinator, also start this many local worker processes")
+    parser.add_argument('--lease-seconds', type=int, default=600, help="how long a worker may hold a URL before it is handed to another (default 600)")
+    parser.add_argument('--worker-id', default=None, help="name for this worker in the queue (default: host-pid)")
+    parser.add_argument('--csv', metavar='FILE', help="also append every product to this CSV as it is scraped")
+    parser.add_argument('--xlsx', metavar='FILE', help="write each run's products to this Excel file when it finishes")
+    parser.add_argument('--parquet', metavar='FILE', help="write each run's products to this Parquet file (.arrow for Arrow IPC) when it finishes")
+    parser.add_argument('--changes', metavar='FILE', help="append the products that changed since the last run to this JSONL file")
+    parser.add_argument('--webhook', metavar='URL', help="POST the products that changed since the last run to this URL as JSON")
+    parser.add_argument('--changes-only', action='store_true', help="only write products that changed since the last run to the output, --csv, --xlsx and --parquet")
+    parser.add_argument('--snapshot', default=SNAPSHOT_FILE, help=f"last run's prices to detect changes against (default: {SNAPSHOT_FILE})")
+    parser.add_argument('--match', action='store_true', help=f"pair products across stores after each run (kept in {MATCHES_FILE}; adds a side-by-side sheet to --xlsx)")
+    parser.add_argument('--metrics', metavar='FILE', help="write per-phase timing metrics after each run (.json for JSON, otherwise Prometheus text)")
+    parser.add_argument('--archive', metavar='DIR', help="keep a compressed snapshot of every page scraped (replay with snapshot_archive.py)")
+    parser.add_argument('--debug', action='store_true', help=f"archive every page scraped in {ARCHIVE_DIR}/ (same as --archive {ARCHIVE_DIR})")
+    return parser
+
+def log(message):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stores = [STORE_CHOICES[name] for name in args.store] if args.store else list(STORE_CHOICES.values())
+    # A worker's --watch means "keep serving runs", not smart refresh
+    smart = args.smart or (args.watch and not args.worker)
+    if smart and args.no_history:
+        log("--smart and --watch need the price history; drop --no-history")
+        return 2
+    if args.coordinator and args.worker:
+        log("A process is either the --coordinator or a --worker")
+        return 2
+    if args.worker:
+        if args.urls_file or args.resume or args.smart:
+            log("--worker takes its URLs from the queue; drop the URL file, --resume and --smart")
+            return 2
+    elif (args.xlsx and not HAS_EXCEL) or (args.parquet and not HAS_ARROW):
+        log("--xlsx needs openpyxl and --parquet needs pyarrow (pip install openpyxl pyarrow)")
+        return 2
+    elif args.resume == bool(args.urls_file) or (args.resume and (args.watch or args.coordinator)):
+        log("Give either a URL file or --resume (which cannot be combined with --watch or --coordinator)")
+        return 2
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    archive = SnapshotArchive(args.archive or ARCHIVE_DIR, log=log) if args.archive or args.debug else None
+    scraper = Scraper(
+        log=log,
+        headless=not args.headed,
+        archive=archive,
+        block_resources=not args.no_block,
+        fast_path=not args.no_fast_path,
+        pool_size=args.pages,
+        store_limits={'Woolworths': args.woolworths_max, 'Coles': args.coles_max},
+        metrics_file=args.metrics,
+        retries=not args.no_retry
+    )
+    # Workers hand their results to the coordinator, which records them
+    history = None if args.no_history or args.worker else PriceHistory(args.history)
+    scheduler = RefreshScheduler(history) if smart else None
+
+    journal = RunJournal(args.journal)
+    work_queue = WorkQueue(args.queue, lease_seconds=args.lease_seconds) if args.coordinator or args.worker else None
+    if args.worker:
+        # Keep the politeness delay per store across every worker on the queue, not just within this one
+        scraper.configure(shared_pace=work_queue)
+    csv_out = CsvExporter(args.csv, append=True) if args.csv and not args.worker else None
+    records, changed, widths = [], [], ColumnWidths()
+    matcher = ProductMatcher(log=log) if args.match and not args.worker else None
+    if matcher:
+        matcher.load()
+    detector = None
+    if (args.changes or args.webhook or args.changes_only) and not args.worker:
+        sinks = ([JsonlSink(args.changes)] if args.changes else []) + ([WebhookSink(args.webhook, log=log)] if args.webhook else [])
+        detector = ChangeDetector(args.snapshot, sinks, log=log)
+        detector.load()
+
+    def write_result(index, data):
+        journal.record(data)
+        if history:
+            history.add(data)
+        record = normalize(data) if 'error' not in data else None
+        change = detector.observe(data, record) if detector else None
+        if record is not None:
+            records.append(record)
+        if args.changes_only and change is None:
+            return
+        out.write(json.dumps(data, ensure_ascii=False) + '\n')
+        out.flush()
+        if record is not None:
+            if args.changes_only:
+                changed.append(record)
+            if csv_out:
+                csv_out.write(record)
+            if args.xlsx:
+                widths.update(excel_values(record))
+
+    try:
+        if args.worker:
+            return run_worker(scraper, work_queue, args.worker_id or default_worker_id(), max(1, args.pages), args.watch)
+        while True:
+            if args.resume:
+                plan = resume_plan(args.journal)
+                if plan is None:
+                    log(f"No previous run to resume in {args.journal}")
+                    return 1
+                done, urls = plan
+                log(f"Resuming last run: {len(done)} already scraped, {len(urls)} left to do")
+                journal.resume()
+            else:
+                urls = filter_urls(load_url_file(args.urls_file), stores)
+                if not urls:
+                    log("No URLs to scrape based on current selection!")
+                    return 1
+                journal.start(urls)
+            if detector:
+                detector.begin()
+            if args.coordinator:
+                successful = run_coordinated(work_queue, scheduler, urls, write_result, args)
+            else:
+                successful = run_once(scraper, scheduler, urls, write_result, args.ordered)
+            journal.finish()
+            if history:
+                history.flush()
+            for line in summary_lines(records):
+                log(line)
+            changes = detect_changes(detector, changed if args.changes_only else None, widths) if detector else None
+            comparisons = match_products(matcher, records) if matcher else None
+            exported = changed if args.changes_only else records
+            if exported and (args.xlsx or args.parquet):
+                write_exports(args, exported, widths, comparisons, changes)
+            records, changed, widths = [], [], ColumnWidths()
+            if not args.watch:
+                return 0 if successful else 1
+            wait = scheduler.next_run_in(urls)
+            log(f"Next product comes due in {wait / 60:.0f} minutes")
+            time.sleep(wait)
+    except KeyboardInterrupt:
+        log("Interrupted")
+        return 130
+    finally:
+        scraper.shutdown()
+        if archive:
+            archive.close()
+        journal.close()
+        if work_queue:
+            work_queue.close()
+        if history:
+            history.close()
+        if csv_out:
+            csv_out.close()
+        if out is not sys.stdout:
+            out.close()
+
+def detect_changes(detector, changed, widths):
+    """Finish the run's change detection; products that dropped off their listings join the changed records, if kept"""
+    gone = detector.finish()
+    if changed is not None:
+        for change in gone:
+            record = unavailable_record(change)
+            changed.append(record)
+            widths.update(excel_values(record))
+    return detector.changes
+
+def match_products(matcher, records):
+    """Pair the run's products across stores; returns the side-by-side rows for the run"""
+    new = matcher.match(records)
+    if new:
+        matcher.save()
+    comparisons = matcher.comparisons(records)
+    log(f"Product matches: {len(new)} new, {len(comparisons)} pairs scraped in this run")
+    return comparisons
+
+def write_exports(args, records, widths, comparisons=None, changes=None):
+    try:
+        if args.xlsx:
+            write_xlsx(args.xlsx, records, widths.widths(), comparisons, changes)
+            log(f"Wrote {len(records)} products to {args.xlsx}")
+        if args.parquet:
+            export_columnar(args.parquet, records)
+            log(f"Wrote {len(records)} products to {args.parquet}")
+    except Exception as e:
+        log(f"Export failed: {e}")
+
+def run_once(scraper, scheduler, urls, on_result, ordered):
+    """Scrape one round of URLs (only the due ones when scheduling) and return the number of good results"""
+    cached = []
+    if scheduler:
+        urls, cached = scheduler.plan(urls)
+        log(f"Smart refresh: {len(urls)} due, {len(cached)} served from the price history")
+        for data in cached:
+            on_result(None, data)
+    results = []
+    if urls:
+        log(f"Starting scraper for {len(urls)} URLs...")
+        results = scraper.run(urls, on_result=on_result, ordered=ordered)
+        for line in scraper.report():
+            log(line)
+    successful = sum(1 for d in results if d and 'error' not in d)
+    log(f"Scraped: {successful}/{len(urls)} products")
+    return successful + len(cached)
+
+def worker_command(args):
+    """Command line for a local worker process that scrapes like this coordinator was asked to"""
+    command = [sys.executable, __file__, '--worker', '--queue', args.queue, '--pages', str(args.pages),
+               '--woolworths-max', str(args.woolworths_max), '--coles-max', str(args.coles_max),
+               '--lease-seconds', str(args.lease_seconds)]
+    for flag in ('headed', 'no_fast_path', 'no_block', 'debug'):
+        if getattr(args, flag):
+            command.append('--' + flag.replace('_', '-'))
+    if args.archive:
+        command += ['--archive', args.archive]
+    return command
+
+def run_coordinated(work_queue, scheduler, urls, on_result, args, poll=2.0, report_every=30.0):
+    """Queue the due URLs for workers and stream their results back; returns the number of good results"""
+    cached = []
+    if scheduler:
+        urls, cached = scheduler.plan(urls)
+        log(f"Smart refresh: {len(urls)} due, {len(cached)} served from the price history")
+        for data in cached:
+            on_result(None, data)
+    if not urls:
+        return len(cached)
+    # Fleet-wide caps, so adding workers never puts more pages on a store than one process may
+    run_id = work_queue.create_run(urls, {'Woolworths': args.woolworths_max, 'Coles': args.coles_max})
+    log(f"Queued {len(urls)} URLs in {args.queue} (run {run_id[:8]}); waiting for workers...")
+    workers = [subprocess.Popen(worker_command(args)) for _ in range(args.spawn)]
+    successful, last_report = 0, time.monotonic()
+    try:
+        while True:
+            finished = work_queue.finished(run_id)
+            for position, result in work_queue.take_results(run_id):
+                # A listing URL comes back from its worker as the list of products on it
+                for data in result if isinstance(result, list) else (result,):
+                    on_result(position, data)
+                    successful += 'error' not in data
+            if finished:
+                break
+            if time.monotonic() - last_report >= report_every:
+                counts = work_queue.progress(run_id)
+                log(f"Progress: {counts['done'] + counts['failed']}/{len(urls)} done, {counts['leased']} in progress, {counts['pending']} waiting")
+                last_report = time.monotonic()
+            time.sleep(poll)
+        work_queue.close_run(run_id)
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.terminate()
+        for worker in workers:
+            worker.wait()
+    log(f"Scraped: {successful}/{len(urls)} products across the workers")
+    return successful + len(cached)
+
+def run_worker(scraper, work_queue, worker_id, batch_size, watch=False, poll=5.0):
+    """Lease URLs from the open run, scrape them and report back until the run is finished"""
+    log(f"Worker {worker_id} polling {work_queue.path}")
+    leased = {}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def keep_leases():
+        # Renew well before expiry so a slow page (or a CAPTCHA being solved) doesn't lose its lease
+        while not stop.wait(work_queue.lease_seconds / 3):
+            with lock:
+                job_ids = list(leased)
+            work_queue.renew(worker_id, job_ids)
+
+    def report(job_ids):
+        def on_result(index, data):
+            work_queue.complete(job_ids[index], worker_id, data)
+            with lock:
+                leased.pop(job_ids[index], None)
+        return on_result
+
+    renewer = threading.Thread(target=keep_leases, daemon=True)
+    renewer.start()
+    scraped = 0
+    try:
+        while True:
+            run_id = work_queue.open_run()
+            if run_id is None or work_queue.finished(run_id):
+                if run_id:
+                    work_queue.close_run(run_id)
+                if not watch:
+                    break
+                time.sleep(poll)
+                continue
+            jobs = work_queue.lease(run_id, worker_id, batch_size)
+            if not jobs:
+                # Everything left is leased to other workers or capped for its store
+                time.sleep(poll)
+                continue
+            job_ids = [job_id for job_id, _ in jobs]
+            with lock:
+                leased.update(dict(jobs))
+            scraper.run([url for _, url in jobs], on_result=report(job_ids), ordered=False, expand_listings=False)
+            scraped += len(jobs)
+        log(f"Worker {worker_id} done: scraped {scraped} URLs")
+        return 0
+    finally:
+        stop.set()
+        work_queue.release(worker_id)
+
+if __name__ == "__main__":
+    sys.exit(main())
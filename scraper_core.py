@@ -0,0 +1,1615 @@
+"""Scraping core for the Woolworths/Coles price scraper.
+
+Everything needed to turn a list of product URLs into result dicts lives here,
+free of any GUI code, so both the Tk app (scraper_gui.py) and the command-line
+runner (scraper_cli.py) drive the same engine through Scraper.
+"""
+import threading
+import gzip
+import http.client
+import time
+import re
+import os
+import json
+import random
+import queue
+import weakref
+from collections import deque, namedtuple
+from concurrent.futures import Future
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
+from metrics import Metrics
+from retry_policy import RetryPolicy, CircuitBreaker
+
+# Enhanced stealth script injected into every browser context
+STEALTH_SCRIPT = """
+// Override webdriver property
+Object.defineProperty(navigator, 'webdriver', {
+    get: () => undefined
+});
+
+// Override plugins to look more realistic
+Object.defineProperty(navigator, 'plugins', {
+    get: () => [1, 2, 3, 4, 5]
+});
+
+// Override language properties
+Object.defineProperty(navigator, 'languages', {
+    get: () => ['en-AU', 'en']
+});
+
+// Fix chrome runtime
+window.chrome = {
+    runtime: {}
+};
+
+// Override permissions query
+const originalQuery = window.navigator.permissions.query;
+window.navigator.permissions.query = (parameters) => (
+    parameters.name === 'notifications' ?
+        Promise.resolve({ state: Notification.permission }) :
+        originalQuery(parameters)
+);
+"""
+
+def detect_store(url):
+    """Return the store name for a product URL, or None if it is not recognised"""
+    if 'woolworths.com.au' in url: return 'Woolworths'
+    if 'coles.com.au' in url: return 'Coles'
+    return None
+
+def product_key(url):
+    """Stable 'store:id' key for a product URL (Woolworths stockcode, Coles trailing id)"""
+    store = detect_store(url)
+    if store == 'Woolworths':
+        match = re.search(r'/productdetails/(\d+)', url)
+    elif store == 'Coles':
+        match = re.search(r'/product/[^?#]*?-(\d+)(?:[/?#]|$)', url)
+    else:
+        return None
+    if match:
+        return f"{store.lower()}:{match.group(1)}"
+    if is_listing_url(url):
+        # Each page of a listing is its own entry, so archived pages don't replace one another
+        parsed = urlparse(url)
+        return f"{store.lower()}:list:{parsed.path.rstrip('/')}" + (f"?{parsed.query}" if parsed.query else "")
+    return f"{store.lower()}:{url}"
+
+# Category, search and specials pages, which show a few dozen products per page load
+LISTING_PATHS = {
+    'Woolworths': ('/shop/browse/', '/shop/search/products', '/shop/specials'),
+    'Coles': ('/browse/', '/search/products', '/on-special'),
+}
+
+# Query parameter each store pages its listings with
+LISTING_PAGE_PARAMS = {'Woolworths': 'pageNumber', 'Coles': 'page'}
+
+def is_listing_url(url):
+    """True for a category, search or specials listing URL"""
+    return urlparse(url).path.startswith(LISTING_PATHS.get(detect_store(url), ()))
+
+def listing_page_url(url, number):
+    """The URL of page number of a listing (page 1 has no page parameter)"""
+    parsed = urlparse(url)
+    param = LISTING_PAGE_PARAMS.get(detect_store(url), 'page')
+    query = [(name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True) if name != param]
+    if number > 1:
+        query.append((param, str(number)))
+    return urlunparse(parsed._replace(query=urlencode(query)))
+
+def is_supported_url(url):
+    """True for the product and listing URLs the scraper knows how to read"""
+    return 'woolworths.com.au/shop/productdetails/' in url or 'coles.com.au/product/' in url or is_listing_url(url)
+
+def filter_urls(urls, stores=('Woolworths', 'Coles')):
+    """Keep the URLs that belong to one of the selected stores, in their original order"""
+    return [url for url in urls if detect_store(url) in stores]
+
+# Politeness delay range (seconds) between requests to the same store
+STORE_DELAYS = {'Woolworths': (2, 5), 'Coles': (5, 10)}
+
+class TokenBucket:
+    """Single-token bucket whose refill interval is jittered and scaled by recent outcomes"""
+
+    def __init__(self, low, high, max_scale=8.0, speedup_after=10):
+        self.low, self.high = low, high
+        self.max_scale = max_scale
+        self.speedup_after = speedup_after
+        self.scale = 1.0
+        self.ready_at = 0.0
+        self.streak = 0
+
+    def _interval(self):
+        return random.uniform(self.low, self.high) * self.scale
+
+    def wait_time(self, now):
+        return max(0.0, self.ready_at - now)
+
+    def take(self, now):
+        self.ready_at = now + self._interval()
+
+    def settle(self, now, outcome):
+        if outcome in ('timeout', 'blocked'):
+            self.scale = min(self.scale * 2, self.max_scale)
+            self.streak = 0
+        elif outcome == 'ok':
+            self.streak += 1
+            if self.streak >= self.speedup_after and self.scale > 1.0:
+                self.scale = max(1.0, self.scale * 0.75)
+                self.streak = 0
+        # The gap is measured from the end of the request, as the old fixed sleeps were
+        self.ready_at = max(self.ready_at, now + self._interval())
+
+class StoreRateLimiter:
+    """One adaptive token bucket per store host, so waits for one store overlap work on another.
+
+    Buckets back off on timeouts and bot challenges and ease back towards the base
+    politeness delay after a run of successes; they never go faster than it.
+
+    With shared (a WorkQueue, or anything with pace_wait/claim_pace/hold_pace)
+    the gap is also kept fleet-wide, so several worker processes on one store
+    still leave the delay between their requests rather than each keeping its own.
+    """
+
+    def __init__(self, delays=None, log=print, shared=None):
+        self.buckets = {store: TokenBucket(low, high) for store, (low, high) in (delays or STORE_DELAYS).items()}
+        self.log = log
+        self.shared = shared
+        self.slept = 0.0
+        self._lock = threading.Lock()
+
+    def wait_time(self, store):
+        bucket = self.buckets.get(store)
+        if bucket is None: return 0.0
+        with self._lock:
+            wait = bucket.wait_time(time.monotonic())
+        return max(wait, self.shared.pace_wait(store)) if self.shared else wait
+
+    def take(self, store):
+        """Claim the store's next request; returns 0.0, or the seconds left if another process claimed the slot first"""
+        bucket = self.buckets.get(store)
+        if bucket is None: return 0.0
+        with self._lock:
+            now = time.monotonic()
+            ready_at = bucket.ready_at
+            bucket.take(now)
+            interval = bucket.ready_at - now
+        left = self.shared.claim_pace(store, interval) if self.shared else 0.0
+        if left > 0:
+            with self._lock:
+                bucket.ready_at = ready_at
+        return left
+
+    def record(self, store, outcome):
+        """Settle a finished request: outcome is 'ok' or a failure kind from classify_outcome"""
+        bucket = self.buckets.get(store)
+        if bucket is None: return
+        with self._lock:
+            before = bucket.scale
+            now = time.monotonic()
+            bucket.settle(now, outcome)
+            after = bucket.scale
+            gap = bucket.ready_at - now
+        if self.shared:
+            self.shared.hold_pace(store, gap)
+        if after > before:
+            self.log(f"  {store}: {outcome} - slowing down to {after:.0f}x the normal delay")
+        elif after < before:
+            self.log(f"  {store}: steady run - easing back to {after:.1f}x the normal delay")
+
+    def pace(self, store, outcome='ok', what='request'):
+        """Settle a request made inside a job and block until the store's next one may go out.
+
+        For the extra requests one URL makes after the pool handed it out, such as
+        a listing's later pages or the browser after the fast path; returns the seconds slept.
+        """
+        self.record(store, outcome)
+        slept = 0.0
+        while True:
+            wait = self.wait_time(store)
+            if wait <= 0:
+                wait = self.take(store)
+                if wait <= 0:
+                    break
+            if not slept:
+                self.log(f"  Waiting for {wait:.1f} seconds before the next {store} {what}...")
+            time.sleep(wait)
+            slept += wait
+        with self._lock:
+            self.slept += slept
+        return slept
+
+class SelectorMissing(PlaywrightTimeoutError):
+    """The page loaded but the product never rendered (or the selectors no longer match it)"""
+
+def classify_error(error):
+    """Failure kind for an exception raised while scraping: 'timeout', 'selector', 'blocked', 'navigation' or 'error'"""
+    message = str(error)
+    if isinstance(error, SelectorMissing): return 'selector'
+    if 'challenge' in message or 'CAPTCHA' in message or 'HTTP 403' in message or 'HTTP 429' in message: return 'blocked'
+    if isinstance(error, (PlaywrightTimeoutError, TimeoutError)) or 'Timeout' in message: return 'timeout'
+    if isinstance(error, (PlaywrightError, ConnectionError)) and ('net::ERR_' in message or 'NS_ERROR_' in message or 'navigat' in message.lower()):
+        return 'navigation'
+    return 'error'
+
+def error_result(url, error):
+    """Result dict for a URL that failed with an exception, tagged with its failure kind"""
+    return {'error': str(error), 'url': url, 'kind': classify_error(error)}
+
+def classify_outcome(data):
+    """'ok' for a scraped product or listing, otherwise the failure kind of an error result"""
+    if isinstance(data, list) or 'error' not in data: return 'ok'
+    return data.get('kind') or classify_error(data['error'])
+
+# Resource types that are never needed to read the product text
+BLOCKED_RESOURCE_TYPES = ('image', 'font', 'media')
+
+# Third-party analytics and ad hosts blocked on every store
+TRACKER_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'googleadservices.com', 'facebook.net', 'facebook.com', 'hotjar.com', 'bat.bing.com',
+    'clarity.ms', 'adobedtm.com', 'omtrdc.net', 'demdex.net', 'everesttech.net', 'tiktok.com',
+    'pinterest.com', 'snapchat.com', 'criteo.com', 'criteo.net', 'taboola.com', 'quantummetric.com',
+    'nr-data.net', 'newrelic.com', 'segment.io', 'mparticle.com', 'branch.io'
+)
+
+# Per-store rules: 'allow' hosts are never blocked (the Cloudflare challenge must render),
+# 'deny' hosts are blocked on top of the shared tracker list
+STORE_RESOURCE_RULES = {
+    'Woolworths': {'allow': ('challenges.cloudflare.com',), 'deny': TRACKER_HOSTS},
+    'Coles': {'allow': ('challenges.cloudflare.com',), 'deny': TRACKER_HOSTS},
+}
+
+# Typical transfer sizes, used to estimate the bandwidth a blocked request would have cost
+ESTIMATED_RESOURCE_BYTES = {'image': 60000, 'font': 40000, 'media': 500000, 'script': 30000}
+
+class ResourceBlocker:
+    """Route handler that aborts images, fonts, media and tracker requests, and counts what it saved"""
+
+    def __init__(self, rules=None, blocked_types=BLOCKED_RESOURCE_TYPES):
+        self.rules = rules or STORE_RESOURCE_RULES
+        self.blocked_types = set(blocked_types)
+        self.requests = 0
+        self.blocked = {}
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def attach(self, context):
+        context.route('**/*', self._handle)
+
+    def reset(self):
+        """Zero the counters; contexts stay attached across runs"""
+        with self._lock:
+            self.requests = 0
+            self.blocked = {}
+            self.bytes_saved = 0
+
+    def should_block(self, store, url, resource_type):
+        host = urlparse(url).hostname or ''
+        rules = self.rules.get(store, {})
+        if any(host == h or host.endswith('.' + h) for h in rules.get('allow', ())):
+            return None
+        if resource_type in self.blocked_types:
+            return resource_type
+        if any(host == h or host.endswith('.' + h) for h in rules.get('deny', ())):
+            return 'tracker'
+        return None
+
+    def _handle(self, route):
+        request = route.request
+        try:
+            store = detect_store(request.frame.page.url) or detect_store(request.url)
+        except Exception:
+            store = detect_store(request.url)
+        reason = self.should_block(store, request.url, request.resource_type)
+        with self._lock:
+            self.requests += 1
+            if reason:
+                self.blocked[reason] = self.blocked.get(reason, 0) + 1
+                self.bytes_saved += ESTIMATED_RESOURCE_BYTES.get(request.resource_type, 5000)
+        if reason:
+            route.abort()
+        else:
+            route.continue_()
+
+    def summary(self):
+        with self._lock:
+            total = sum(self.blocked.values())
+            detail = ", ".join(f"{kind}: {count}" for kind, count in sorted(self.blocked.items()))
+            return f"Blocked {total}/{self.requests} requests ({detail or 'none'}), ~{self.bytes_saved / 1048576:.1f} MB saved"
+
+# Storage state (cookies and local storage) carried between browser sessions
+BROWSER_STATE_FILE = 'browser_state.json'
+
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
+
+# Markers of a bot challenge page rather than a product page
+CHALLENGE_MARKERS = ('challenges.cloudflare.com', 'cf-chl-', '_Incapsula_Resource', 'Pardon Our Interruption')
+
+class HttpFastPath:
+    """Browser-free extraction: fetch the product page over keep-alive HTTP and parse its embedded JSON.
+
+    scrape() returns the same dict shape as the page scrapers, or None when the
+    page is challenged or carries no usable product JSON so the caller can fall
+    back to the browser. host_map points retailer hostnames at another server,
+    e.g. {'www.coles.com.au': 'http://127.0.0.1:8765'} for offline fixtures.
+    Pages it reads are handed to archive, if given, like the browser's are.
+
+    A URL that needs more than one request (a paginated listing) calls
+    pace(store, outcome) between them, so the store's politeness gap holds
+    inside the URL as well as between URLs; last_outcome() says how this
+    thread's last request went, for pacing the browser when it takes over.
+    """
+
+    def __init__(self, host_map=None, timeout=20, give_up_after=3, archive=None, max_listing_pages=50, pace=None, log=print):
+        self.host_map = host_map or {}
+        self.pace = pace
+        self.max_listing_pages = max_listing_pages
+        self.archive = archive
+        self.timeout = timeout
+        self.give_up_after = give_up_after
+        self.log = log
+        self.hits = 0
+        self.fallbacks = 0
+        self.challenged = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self, scheme, host):
+        # One persistent connection per host per worker thread
+        pool = self._local.__dict__.setdefault('connections', {})
+        if (scheme, host) not in pool:
+            conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            pool[(scheme, host)] = conn_class(host, timeout=self.timeout)
+        return pool[(scheme, host)]
+
+    def fetch(self, url):
+        """Return (status, html) for a URL, reusing this thread's connection to the host"""
+        parsed = urlparse(url)
+        scheme, host = parsed.scheme, parsed.netloc
+        if parsed.hostname in self.host_map:
+            target = urlparse(self.host_map[parsed.hostname])
+            scheme, host = target.scheme, target.netloc
+        path = parsed.path + ('?' + parsed.query if parsed.query else '')
+        headers = {
+            'Host': parsed.netloc,
+            'User-Agent': BROWSER_USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-AU,en;q=0.9',
+            'Accept-Encoding': 'gzip',
+        }
+        for attempt in range(2):
+            conn = self._connection(scheme, host)
+            try:
+                conn.request('GET', path or '/', headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server dropped the idle keep-alive connection; reconnect once
+                conn.close()
+                if attempt: raise
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return response.status, body.decode('utf-8', errors='replace')
+
+    def _page(self, url, store, missing_ok=False):
+        """The page's HTML, or None (after logging why) when the browser has to take over.
+
+        With missing_ok a 404 comes back as an empty page, for running off the end of a listing.
+        """
+        if self.challenged.get(store, 0) >= self.give_up_after:
+            # This store keeps challenging plain HTTP clients; stop wasting a request on it
+            return None
+        if getattr(self._local, 'outcome', None) is not None and self.pace:
+            self.pace(store, self._local.outcome)
+        self._local.outcome = 'ok'
+        try:
+            status, html = self.fetch(url)
+        except Exception as e:
+            self.log(f"  Fast path fetch failed ({e}), using browser")
+            self._local.outcome = 'navigation'
+            return None
+        if status in (403, 429, 503) or any(marker in html for marker in CHALLENGE_MARKERS):
+            self.log(f"  Fast path was challenged (HTTP {status}), using browser")
+            self._local.outcome = 'blocked'
+            with self._lock:
+                self.challenged[store] = self.challenged.get(store, 0) + 1
+            return None
+        if status == 404 and missing_ok:
+            return ''
+        if status != 200:
+            self.log(f"  Fast path got HTTP {status}, using browser")
+            return None
+        with self._lock:
+            self.challenged[store] = 0
+        if self.archive:
+            self.archive.add(url, html, store, source='http')
+        return html
+
+    def last_outcome(self):
+        """How this thread's last scrape() left the store: None if it sent no request, else 'ok' or a failure kind"""
+        return getattr(self._local, 'outcome', None)
+
+    def scrape(self, url):
+        store = detect_store(url)
+        self._local.outcome = None
+        if is_listing_url(url):
+            return self.scrape_listing(url, store)
+        html = self._page(url, store)
+        if html is None:
+            return self._fallback()
+        data = parse_embedded_product(store, html)
+        if data is None:
+            self.log("  No embedded product JSON, using browser")
+            return self._fallback()
+        with self._lock:
+            self.hits += 1
+        return {'store': store, 'name': data['name'], 'price': data['price'], 'was_price': data['was_price'],
+                'cup_price': data['cup_price'], 'url': url, 'promo_badge': data['promo_badge']}
+
+    def scrape_listing(self, url, store):
+        """Every product on a listing, page by page, from the embedded JSON; None to use the browser"""
+        results, seen, first_page = [], set(), None
+        for number in range(1, self.max_listing_pages + 1):
+            html = self._page(listing_page_url(url, number), store, missing_ok=number > 1)
+            if html is None:
+                # The browser starts the listing over, so no page goes silently missing
+                return self._fallback()
+            found = parse_embedded_listing(store, html, url)
+            new = [data for data in found if data['url'] not in seen]
+            if number == 1:
+                if not found:
+                    self.log("  No embedded listing JSON, using browser")
+                    return self._fallback()
+                first_page = len(found)
+            seen.update(data['url'] for data in new)
+            results.extend(new)
+            if found:
+                with self._lock:
+                    self.hits += 1
+            # A page with nothing new, or shorter than the first, is the last one
+            if not new or len(found) < first_page:
+                break
+        return results
+
+    def summary(self):
+        return f"Fast path: {self.hits} pages read without a browser, {self.fallbacks} fell back to the browser"
+
+    def _fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+        return None
+
+def _embedded_json(html):
+    """Yield every JSON document embedded in a page's script tags"""
+    for match in re.finditer(r'<script[^>]*type="application/(?:ld\+)?json"[^>]*>(.*?)</script>', html, re.S):
+        try:
+            yield json.loads(match.group(1))
+        except ValueError:
+            continue
+
+def _find_dict(node, predicate):
+    """Depth-first search of decoded JSON for the first dict matching predicate"""
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            if predicate(item):
+                return item
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return None
+
+def _money(value):
+    return f"{float(value):.2f}"
+
+# Product dicts in each store's embedded JSON, on product and listing pages alike
+EMBEDDED_PRODUCT = {
+    'Woolworths': lambda d: 'Stockcode' in d and 'Price' in d,
+    'Coles': lambda d: 'pricing' in d and 'name' in d,
+}
+
+def _find_dicts(node, predicate):
+    """Every dict in decoded JSON matching predicate, in document order, without looking inside matches"""
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            if predicate(item):
+                yield item
+                continue
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+
+def _embedded_fields(store, product):
+    """Scrape result fields from one embedded product dict, or None if it has no price"""
+    if store == 'Woolworths':
+        if product.get('Price') is None:
+            return None
+        price, was = float(product['Price']), float(product.get('WasPrice') or 0)
+        promo_badge = "1/2 Price" if product.get('IsHalfPrice') else "Special" if product.get('IsOnSpecial') else ""
+        return {
+            'name': product.get('DisplayName') or product.get('Name', 'Not found'),
+            'price': _money(price),
+            'was_price': _money(was) if was > price else "Not applicable",
+            'cup_price': product.get('CupString') or "Not found",
+            'promo_badge': promo_badge,
+        }
+    if store == 'Coles':
+        if not (product.get('pricing') or {}).get('now'):
+            return None
+        pricing = product['pricing']
+        price, was = float(pricing['now']), float(pricing.get('was') or 0)
+        name = " ".join(part for part in (product.get('brand'), product['name']) if part)
+        if product.get('size'):
+            name += f" | {product['size']}"
+        # Same badge rules as scrape_coles_page
+        promo_badge = ""
+        if was:
+            promo_badge = "1/2 Price" if was / 2 == price else "Special"
+        return {
+            'name': name,
+            'price': _money(price),
+            'was_price': _money(was) if was else "Not applicable",
+            'cup_price': pricing.get('comparable') or "Not found",
+            'promo_badge': promo_badge,
+        }
+    return None
+
+def _slug(text):
+    return re.sub(r'[^a-z0-9.]+', '-', text.lower()).strip('-')
+
+def embedded_product_url(store, product):
+    """Product page URL for an embedded product dict, built the way each store builds its links"""
+    if store == 'Woolworths':
+        return (f"https://www.woolworths.com.au/shop/productdetails/{product['Stockcode']}/"
+                f"{product.get('UrlFriendlyName') or _slug(product.get('Name') or '')}")
+    name = " ".join(str(part) for part in (product.get('brand'), product.get('name'), product.get('size')) if part)
+    return f"https://www.coles.com.au/product/{_slug(name)}-{product['id']}"
+
+def parse_embedded_product(store, html):
+    """Turn a product page's embedded JSON into the scrape result fields, or None if absent"""
+    predicate = EMBEDDED_PRODUCT.get(store)
+    if predicate is None:
+        return None
+    for doc in _embedded_json(html):
+        product = _find_dict(doc, predicate)
+        fields = product and _embedded_fields(store, product)
+        if fields:
+            return fields
+    return None
+
+def parse_embedded_listing(store, html, listing_url=None):
+    """Scrape results for every product in a listing page's embedded JSON, in page order"""
+    predicate = EMBEDDED_PRODUCT.get(store)
+    results, seen = [], set()
+    for doc in _embedded_json(html) if predicate else ():
+        for product in _find_dicts(doc, predicate):
+            fields = _embedded_fields(store, product)
+            if not fields or ('Stockcode' not in product and 'id' not in product):
+                continue
+            url = embedded_product_url(store, product)
+            if url in seen:
+                continue
+            seen.add(url)
+            results.append({'store': store, 'name': fields['name'], 'price': fields['price'], 'was_price': fields['was_price'],
+                            'cup_price': fields['cup_price'], 'url': url, 'promo_badge': fields['promo_badge'], 'listing': listing_url})
+    return results
+
+# Declarative field specs: once the 'ready' selector matches inside 'root', every
+# field is read in a single page.evaluate round trip and missing ones come back as None
+WOOLWORTHS_FIELDS = {
+    'root': 'section[class*="product-details-panel_component_product-panel"]',
+    'ready': 'h1[class*="product-title_component_product-title"]',
+    'fields': {
+        'name': 'h1[class*="product-title_component_product-title"]',
+        'price': 'div[class*="product-price_component_price-lead"]',
+        'was_price': 'div[class*="product-unit-price_component_price-was"]',
+        'cup_price': 'div[class*="product-unit-price_component_price-cup-string"]',
+        'promo_badge': 'div[class*="product-stamp_message"]',
+    },
+}
+
+# Anything on the page that means a bot challenge is showing instead of the product
+CHALLENGE_SELECTOR = ('iframe[title="Widget containing a Cloudflare security challenge"], '
+                      'iframe[src*="challenges.cloudflare.com"], #challenge-form, #cf-challenge-running')
+
+COLES_FIELDS = {
+    'root': None,
+    'ready': 'h1[data-testid="title"], section[data-testid="product_price"]',
+    'challenge': CHALLENGE_SELECTOR,
+    'fields': {
+        'name': 'h1[data-testid="title"]',
+        'price': 'span[data-testid="pricing"]',
+        'was_price': '.price__was',
+        'cup_price': '.price__calculation_method',
+    },
+}
+
+# The same fields without the race, for waiting out a challenge someone is solving
+COLES_PRODUCT_FIELDS = dict(COLES_FIELDS, challenge=None)
+
+EXTRACT_FIELDS_JS = """spec => {
+    const root = spec.root ? document.querySelector(spec.root) : document;
+    if (!root || !root.querySelector(spec.ready)) {
+        // The product isn't there yet; a challenge showing up first ends the wait just as well
+        return spec.challenge && document.querySelector(spec.challenge) ? {__challenge__: true} : null;
+    }
+    const out = {};
+    for (const [name, selector] of Object.entries(spec.fields)) {
+        const el = root.querySelector(selector);
+        out[name] = el ? el.innerText : null;
+    }
+    return out;
+}"""
+
+def woolworths_result(fields, url):
+    """Scrape result from the WOOLWORTHS_FIELDS values read off a page"""
+    name = fields['name']
+    price, was_price, cup_price, promo_badge = "Not found", "Not applicable", "Not found", ""
+    if fields['price']: price = fields['price'].replace('$', '').strip()
+    was_match = re.search(r'[\d.]+', fields['was_price'] or '')
+    if was_match: was_price = was_match.group()
+    if fields['cup_price']: cup_price = fields['cup_price']
+    if fields['promo_badge']: promo_badge = fields['promo_badge']
+    return {'store': 'Woolworths', 'name': name, 'price': price, 'was_price': was_price, 'cup_price': cup_price, 'url': url, 'promo_badge': promo_badge}
+
+def coles_result(fields, url):
+    """Scrape result from the COLES_FIELDS values read off a page"""
+    name, price, was_price, cup_price, promo_badge = "Not found", "Not found", "Not applicable", "Not found", ""
+    if fields['name']: name = fields['name']
+    if fields['price']: price = fields['price'].replace('$', '').strip()
+    was_match = re.search(r'[\d.]+', fields['was_price'] or '')
+    if was_match: was_price = was_match.group()
+    if fields['cup_price']: cup_price = fields['cup_price'].strip()
+
+    if was_price != "Not applicable":
+        promo_badge = "Special"
+        if was_price and price:
+            try:
+                if float(was_price) / 2 == float(price):
+                    promo_badge = "1/2 Price"
+            except Exception:
+                pass
+
+    return {'store': 'Coles', 'name': name, 'price': price, 'was_price': was_price, 'cup_price': cup_price, 'url': url, 'promo_badge': promo_badge}
+
+def extract_fields(page, spec, timeout=20000):
+    """Wait for the spec's ready selector, then read every field in the same browser round trip.
+
+    When the spec has a 'challenge' selector the wait is a race: whichever of
+    the product and the challenge shows up first ends it, and a challenge comes
+    back as None instead of the fields.
+    """
+    try:
+        handle = page.wait_for_function(EXTRACT_FIELDS_JS, arg=spec, timeout=timeout)
+    except PlaywrightTimeoutError as e:
+        raise SelectorMissing(f"The product did not render within {timeout / 1000:.0f}s: {spec['ready']}") from e
+    fields = handle.json_value()
+    return None if fields.get('__challenge__') else fields
+
+class ChallengeRequired(Exception):
+    """A bot challenge needs a person to solve it in the browser window.
+
+    Raised by a page scraper so the pool can set the page aside and suspend only
+    that store's lane. resume(timeout) is then called on the same worker thread
+    until it returns the result; it raises PlaywrightTimeoutError while the
+    challenge is still showing.
+    """
+
+    def __init__(self, store, url, resume):
+        super().__init__(f"{store} bot challenge on {url}")
+        self.store = store
+        self.url = url
+        self.resume = resume
+
+# Listing page specs: every 'tile' with a product 'link' becomes one result, its
+# fields read relative to the tile; 'next' is the pagination link, if the page has one
+WOOLWORTHS_LISTING = {
+    'tile': 'div[class*="product-tile-v2"], section[class*="product-tile_component"]',
+    'link': 'a[href*="/shop/productdetails/"]',
+    'next': 'a[class*="paging-next"], a[aria-label="Next page"]',
+    'empty': 'div[class*="no-results"], [class*="search-no-results"]',
+    'challenge': CHALLENGE_SELECTOR,
+    'fields': {
+        'name': '[class*="product-title"]',
+        'price': '[class*="price-dollars"], [class*="primary"]',
+        'was_price': '[class*="price-was"], [class*="was-price"]',
+        'cup_price': '[class*="price-per-cup"], [class*="cup-price"]',
+        'promo_badge': '[class*="product-tile-label"], [class*="product-stamp"]',
+    },
+}
+
+COLES_LISTING = {
+    'tile': 'section[data-testid="product-tile"]',
+    'link': 'a[href*="/product/"]',
+    'next': 'a[aria-label="Next page"], button[aria-label="Next page"]:not([disabled])',
+    'empty': '[data-testid="no-results"]',
+    'challenge': CHALLENGE_SELECTOR,
+    'fields': {
+        'name': '.product__title',
+        'price': '.price__value',
+        'was_price': '.price__was',
+        'cup_price': '.price__calculation_method',
+    },
+}
+
+# Runs as a wait_for_function predicate: null (keep waiting) until tiles, an empty
+# result or a challenge show up, then every tile is read in the same round trip
+LISTING_JS = """spec => {
+    if (spec.challenge && document.querySelector(spec.challenge)) return {__challenge__: true};
+    const tiles = document.querySelectorAll(spec.tile);
+    if (!tiles.length && !(spec.empty && document.querySelector(spec.empty))) return null;
+    const seen = new Set();
+    const products = [];
+    for (const tile of tiles) {
+        const link = tile.querySelector(spec.link);
+        if (!link || seen.has(link.href)) continue;
+        seen.add(link.href);
+        const item = {url: link.href.split('?')[0]};
+        for (const [name, selector] of Object.entries(spec.fields)) {
+            const el = tile.querySelector(selector);
+            item[name] = el ? el.innerText : null;
+        }
+        products.push(item);
+    }
+    return {products: products, tiles: tiles.length, next: !!(spec.next && document.querySelector(spec.next))};
+}"""
+
+# Resolves once more tiles than before have rendered, for infinite-scroll listings
+MORE_TILES_JS = "([tile, count]) => document.querySelectorAll(tile).length > count"
+
+def read_listing(page, spec, timeout=20000):
+    """Wait for a listing page's tiles and read them all; None if a challenge showed up instead"""
+    try:
+        handle = page.wait_for_function(LISTING_JS, arg=spec, timeout=timeout)
+    except PlaywrightTimeoutError as e:
+        raise SelectorMissing(f"No product tiles rendered within {timeout / 1000:.0f}s: {spec['tile']}") from e
+    listing = handle.json_value()
+    return None if listing.get('__challenge__') else listing
+
+LISTINGS = {'Woolworths': (WOOLWORTHS_LISTING, woolworths_result), 'Coles': (COLES_LISTING, coles_result)}
+
+class FieldStats:
+    """Per-store, per-field hit counts so a broken selector shows up as a falling hit rate"""
+
+    # Fields every product page should have; a low hit rate on these means a selector broke
+    EXPECTED = ('name', 'price', 'cup_price')
+
+    def __init__(self):
+        self.pages = {}
+        self.hits = {}
+        self._lock = threading.Lock()
+
+    def record(self, store, fields):
+        with self._lock:
+            self.pages[store] = self.pages.get(store, 0) + 1
+            store_hits = self.hits.setdefault(store, {})
+            for name, value in fields.items():
+                store_hits[name] = store_hits.get(name, 0) + (1 if value else 0)
+
+    def hit_rates(self, store):
+        with self._lock:
+            pages = self.pages.get(store, 0)
+            return {name: hits / pages for name, hits in self.hits.get(store, {}).items()} if pages else {}
+
+    def report(self, min_pages=5, warn_below=0.5):
+        lines = []
+        for store in sorted(self.pages):
+            rates = self.hit_rates(store)
+            lines.append(f"{store} field hit rates over {self.pages[store]} pages: " + ", ".join(f"{name} {rate:.0%}" for name, rate in rates.items()))
+            if self.pages[store] >= min_pages:
+                for name in self.EXPECTED:
+                    if name in rates and rates[name] < warn_below:
+                        lines.append(f"  WARNING: {store} '{name}' found on only {rates[name]:.0%} of pages - the selector may have changed")
+        return lines
+
+# What a scraper plugs into the shared BrowserService for its runs: how to open, close and
+# checkpoint a browser session, and where to log
+SessionHooks = namedtuple('SessionHooks', 'open_session close_session save_state log')
+
+class BrowserWorker:
+    """Long-lived thread owning one Playwright instance, browser, warmed context and page.
+
+    Sync Playwright objects can only be used from the thread that created them, so
+    work is submitted to the worker as callables that receive the worker itself.
+    """
+
+    def __init__(self, service, worker_id):
+        self.service = service
+        self.worker_id = worker_id
+        self.config = None
+        self.hooks = None        # the current run's SessionHooks, set by BrowserService.acquire
+        self.reported = False
+        self._playwright = None
+        self._session = None
+        self._session_hooks = None  # the hooks the open session was built with
+        self._inbox = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"browser-worker-{worker_id + 1}", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn):
+        future = Future()
+        self._inbox.put((fn, future))
+        return future
+
+    def _run(self):
+        while True:
+            try:
+                fn, future = self._inbox.get(timeout=self.service.idle_timeout)
+            except queue.Empty:
+                # Idle for a long time: give the memory back, the next run starts cold
+                self.recycle()
+                continue
+            if fn is None:
+                self.recycle()
+                if self._playwright: self._playwright.stop()
+                future.set_result(None)
+                return
+            try:
+                future.set_result(fn(self))
+            except Exception as e:
+                future.set_exception(e)
+
+    def healthy(self):
+        if self._session is None: return False
+        browser, context, page = self._session
+        try:
+            return browser.is_connected() and not page.is_closed()
+        except Exception:
+            return False
+
+    def page(self):
+        """Return this worker's page, launching and warming a browser only if there is no healthy one"""
+        started = time.monotonic()
+        # A session built by another scraper has its resource blocker and logging wired to that scraper
+        if self._session is not None and self.healthy() and self.config == self.service.config and self._session_hooks == self.hooks:
+            page = self._session[-1]
+            if not self.reported:
+                self.service.record_start(warm=True, seconds=time.monotonic() - started)
+                self.reported = True
+            return page
+        self.recycle()
+        self._playwright = self._playwright or sync_playwright().start()
+        self._session = self.hooks.open_session(self._playwright, self.worker_id)
+        self._session_hooks = self.hooks
+        self.config = self.service.config
+        self.service.record_start(warm=False, seconds=time.monotonic() - started)
+        self.reported = True
+        return self._session[-1]
+
+    def park_page(self):
+        """Set the current page aside, e.g. for a person to solve a challenge in, and carry on in a new tab"""
+        browser, context, page = self._session
+        self._session = (browser, context, context.new_page())
+        return page
+
+    def checkpoint(self):
+        """Persist the context's storage state without closing it"""
+        if self.healthy():
+            self._session_hooks.save_state(self._session[1])
+
+    def recycle(self):
+        if self._session is None: return
+        session, self._session = self._session, None
+        hooks, self._session_hooks = self._session_hooks, None
+        try:
+            hooks.close_session(*session)
+        except Exception as e:
+            hooks.log(f"Error closing browser worker {self.worker_id + 1}: {e}")
+
+class BrowserService:
+    """In-process service that keeps warmed browser workers alive between scrape runs.
+
+    Workers are only recycled when their browser dies, the launch configuration
+    changes (e.g. headless toggled) or they sit idle past idle_timeout. Warm and
+    cold page hand-outs are counted so their start latency can be reported.
+
+    The service is shared by every Scraper in the process, so each run brings
+    its own SessionHooks to acquire(); a worker whose browser was opened for
+    another scraper's hooks starts a fresh one.
+    """
+
+    _shared = None
+
+    def __init__(self, idle_timeout=1800):
+        self.idle_timeout = idle_timeout
+        self.config = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def shared(cls, *args, **kwargs):
+        """Return the process-wide service, creating it on first use"""
+        if cls._shared is None:
+            cls._shared = cls(*args, **kwargs)
+        return cls._shared
+
+    def acquire(self, count, config, hooks):
+        """Return count workers configured for config and hooks; workers built for others restart cold"""
+        with self._lock:
+            self.config = config
+            while len(self._workers) < count:
+                self._workers.append(BrowserWorker(self, len(self._workers)))
+            for worker in self._workers[:count]:
+                worker.reported = False
+                worker.hooks = hooks
+            return self._workers[:count]
+
+    def reset_stats(self):
+        with self._lock:
+            self.starts = {True: [], False: []}
+
+    def record_start(self, warm, seconds):
+        with self._lock:
+            self.starts[warm].append(seconds)
+
+    def summary(self):
+        with self._lock:
+            parts = []
+            for warm, label in ((True, 'warm'), (False, 'cold')):
+                times = self.starts[warm]
+                if times:
+                    parts.append(f"{len(times)} {label} (avg {sum(times) / len(times):.2f}s)")
+        return "Browser starts: " + (", ".join(parts) if parts else "none needed")
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for future in [worker.submit(None) for worker in workers]:
+            try:
+                future.result(timeout=30)
+            except Exception:
+                pass
+
+class PagePool:
+    """Spread URLs across a pool of browser pages with per-store concurrency caps.
+
+    Each page belongs to a BrowserWorker from the BrowserService, so browsers stay
+    warm between runs. The page functions run unchanged on top of the pool and
+    results are emitted in input order.
+
+    A page function that raises ChallengeRequired suspends that store's lane
+    only: the challenged page is set aside in its own tab for a person to solve,
+    the worker carries on with the other stores and checks the page between
+    jobs, and the lane resumes once the product shows up or challenge_timeout
+    runs out.
+
+    Failures are settled through retry (a RetryPolicy; None never retries),
+    which sends retryable ones to the back of their store's queue after a
+    backoff, and a CircuitBreaker per store, which pauses a store that keeps
+    failing and defers the rest of its URLs if it doesn't recover.
+    """
+
+    # _next_job's answer when the only thing left for a worker is checking on its challenge
+    POLL = 'poll'
+
+    def __init__(self, service, config=None, size=1, store_limits=None, limiter=None, fast_path=None, metrics=None,
+                 challenge_timeout=120, retry=None, breaker_threshold=3, breaker_cooldown=60.0, hooks=None, log=print):
+        self.service = service
+        self.config = config
+        self.hooks = hooks
+        self.size = max(1, int(size))
+        self.store_limits = store_limits or {}
+        self.limiter = limiter or StoreRateLimiter(log=log)
+        self.fast_path = fast_path
+        self.metrics = metrics or Metrics()
+        self.challenge_timeout = challenge_timeout
+        self.poll_interval = 1.0
+        self.retry = retry
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.log = log
+        self._cond = threading.Condition()
+
+    def run(self, urls, scrape, on_result=None, ordered=True, expand=True):
+        """Scrape every URL with scrape(page, url) and return the results in input order.
+
+        on_result(index, data) is called in input order, or as soon as each URL
+        finishes when ordered is False. A URL scraped into a list (a listing
+        page) is reported one item at a time, or as the whole list when expand
+        is False.
+        """
+        self._pending = {}
+        for index, url in enumerate(urls):
+            self._pending.setdefault(detect_store(url), deque()).append((index, url))
+        self._active = dict.fromkeys(self._pending, 0)
+        self._held = {}  # store -> the challenge its lane is suspended on
+        self.breakers = {store: CircuitBreaker(self.breaker_threshold, self.breaker_cooldown) for store in self._pending}
+        self._attempts = {}    # index -> the try it is on, for URLs that have failed before
+        self._not_before = {}  # index -> monotonic time its retry may go out
+        self._results = [None] * len(urls)
+        self._next_emit = 0
+        self._announced = None  # reason of the wait logged since the last URL went out
+        self._on_result = on_result
+        self._ordered = ordered
+        self._expand = expand
+        self._live = min(self.size, len(urls))
+        workers = self.service.acquire(self._live, self.config, self.hooks)
+        for future in [worker.submit(lambda worker: self._worker(worker, scrape)) for worker in workers]:
+            future.result()
+        return self._results
+
+    def _limit(self, store):
+        return self.store_limits.get(store) or self.size
+
+    def _held_by(self, worker):
+        return [(store, held) for store, held in self._held.items() if held['worker'] is worker]
+
+    def _next_job(self, worker):
+        """Hand out the URL whose store can be fetched soonest, waiting if every store is resting or suspended"""
+        # A notify_all from another worker (or the gap growing as a request finishes) ends a wait early,
+        # so a wait is logged once, however many workers sit in it, and its time is summed per store
+        waited = {}
+        with self._cond:
+            try:
+                while True:
+                    holding = bool(self._held_by(worker))
+                    now = time.monotonic()
+                    ready = []
+                    for store, jobs in self._pending.items():
+                        if not jobs or store in self._held or self._active[store] >= self._limit(store):
+                            continue
+                        breaker = self.breakers[store]
+                        if breaker.state == 'gave_up':
+                            self._defer(store)
+                            continue
+                        if breaker.state == 'half_open':
+                            continue  # wait for its trial URL to come back
+                        waits = ((self.limiter.wait_time(store), f"next {store} product"),
+                                 (breaker.wait_time(now), f"{store} (circuit breaker open)"),
+                                 (self._not_before.get(jobs[0][0], 0.0) - now, f"retrying {store}"))
+                        wait, reason = max(waits, key=lambda item: item[0])
+                        ready.append((wait, store, reason))
+                    if not any(self._pending.values()) and not self._held:
+                        return None
+                    if not ready:
+                        if holding:
+                            return self.POLL
+                        self._cond.wait()
+                        continue
+                    wait, store, reason = min(ready, key=lambda item: item[0])
+                    if wait > 0:
+                        if holding:
+                            # Spend the politeness wait watching the challenge instead
+                            return self.POLL
+                        if reason != self._announced:
+                            self.log(f"  Waiting for {wait:.1f} seconds before {reason}...")
+                            self._announced = reason
+                        started = time.monotonic()
+                        self._cond.wait(wait)
+                        waited[store] = waited.get(store, 0.0) + time.monotonic() - started
+                        continue
+                    if self.limiter.take(store) > 0:
+                        continue  # another worker process took the store's slot first
+                    self._active[store] += 1
+                    self._announced = None
+                    self.breakers[store].take(time.monotonic())
+                    index, url = self._pending[store].popleft()
+                    return store, index, url
+            finally:
+                for store, seconds in waited.items():
+                    self.limiter.slept += seconds
+                    self.metrics.observe('sleep', store, seconds)
+
+    def pace(self, store, outcome='ok', what='request'):
+        """Keep the store's gap before a job's next request (see StoreRateLimiter.pace)"""
+        slept = self.limiter.pace(store, outcome, what)
+        if slept:
+            self.metrics.observe('sleep', store, slept)
+
+    def _emit(self, index, data):
+        # A listing URL finishes with a list of products, each reported under the listing's index
+        if self._on_result:
+            for item in data if isinstance(data, list) and self._expand else (data,):
+                self._on_result(index, item)
+
+    def _finish(self, index, data, store=None, release=True):
+        with self._cond:
+            if release:
+                self._active[store] -= 1
+            self._results[index] = data
+            if not self._ordered:
+                self._emit(index, data)
+                self._cond.notify_all()
+                return
+            # Only release results once everything before them has completed
+            while self._next_emit < len(self._results) and self._results[self._next_emit] is not None:
+                self._emit(self._next_emit, self._results[self._next_emit])
+                self._next_emit += 1
+            self._cond.notify_all()
+
+    def _settle(self, store, index, url, data, via, started, release=True):
+        """Record a finished try, then either put the URL back for a retry or finish it"""
+        outcome = classify_outcome(data)
+        attempt = self._attempts.get(index, 1)
+        self.limiter.record(store, outcome)
+        self.metrics.observe('total', store, time.perf_counter() - started)
+        self.metrics.inc('pages', store, via)
+        if outcome != 'ok':
+            self.metrics.inc('errors', store, outcome)
+        elif isinstance(data, list):
+            self.metrics.inc('listed', store, amount=len(data))
+        if outcome == 'ok' and attempt > 1:
+            self.metrics.inc('recovered', store)
+        with self._cond:
+            self._breaker_event(store, self.breakers[store].record(outcome, time.monotonic()))
+            if outcome != 'ok' and self.retry and self.retry.should_retry(outcome, attempt):
+                delay = self.retry.delay(outcome, attempt)
+                self.log(f"  {store}: {outcome} on {url.split('/')[-1]}, will retry at the end of the run (in {delay:.0f}s at the earliest)")
+                self.metrics.inc('retries', store, outcome)
+                if release:
+                    self._active[store] -= 1
+                self._attempts[index] = attempt + 1
+                self._not_before[index] = time.monotonic() + delay
+                self._pending[store].append((index, url))
+                self._cond.notify_all()
+                return
+        self._finish(index, data, store, release)
+
+    def _breaker_event(self, store, event):
+        breaker = self.breakers[store]
+        if event == 'tripped':
+            self.metrics.inc('breaker_trips', store)
+            self.log(f"  {store}: too many failures in a row - pausing {store} for {breaker.wait_time(time.monotonic()):.0f}s (circuit breaker open)")
+        elif event == 'closed':
+            self.log(f"  {store}: trial URL went through, circuit breaker closed")
+        elif event == 'gave_up':
+            self.metrics.inc('breaker_trips', store)
+            self.log(f"  {store}: still failing after {breaker.trips} pauses - deferring its remaining URLs to a later run")
+
+    def _defer(self, store):
+        """Finish a given-up store's queued URLs straight away; a resumed run tries them again"""
+        jobs = list(self._pending[store])
+        self._pending[store].clear()
+        self.metrics.inc('deferred', store, amount=len(jobs))
+        for index, url in jobs:
+            self._finish(index, {'error': f"Deferred: {store} kept failing and its circuit breaker gave up for this run",
+                                 'url': url, 'kind': 'deferred'}, release=False)
+
+    def _hold(self, worker, store, index, challenge, started):
+        """Suspend the store's lane on a challenge, keeping its page open in a tab of its own"""
+        self.metrics.inc('challenges', store, 'shown')
+        self.limiter.record(store, 'blocked')
+        with self._cond:
+            self._active[store] -= 1
+            if store in self._held:
+                # The lane is already waiting on a person; this URL goes back in line behind that challenge
+                self._pending[store].appendleft((index, challenge.url))
+                return
+            entry = self._held[store] = {'worker': worker, 'page': None, 'challenge': challenge, 'index': index,
+                                         'started': started, 'shown_at': time.monotonic()}
+        try:
+            entry['page'] = worker.park_page()
+        except Exception:
+            with self._cond:
+                self._active[store] += 1
+                del self._held[store]
+            raise
+        self.log(f"!!! ACTION REQUIRED: {store} is showing a bot challenge. Please solve it in the browser window.")
+        self.log(f"    {store} is paused for up to {self.challenge_timeout:.0f} seconds; other stores carry on meanwhile.")
+
+    def _check_challenges(self, worker, wait=False):
+        """Try to finish the URLs this worker's challenges are holding; wait=True blocks up to poll_interval on them"""
+        with self._cond:
+            held = self._held_by(worker)
+        for store, entry in held:
+            challenge = entry['challenge']
+            try:
+                data = challenge.resume(self.poll_interval * 1000 if wait else 100)
+            except PlaywrightTimeoutError:
+                if time.monotonic() - entry['shown_at'] < self.challenge_timeout:
+                    continue
+                data = {'error': f"Bot challenge was not solved within {self.challenge_timeout:.0f} seconds",
+                        'url': challenge.url, 'kind': 'blocked'}
+            except Exception as e:
+                data = error_result(challenge.url, e)
+            self._release(store, entry, data)
+
+    def _release(self, store, entry, data):
+        seconds = time.monotonic() - entry['shown_at']
+        self.metrics.observe('captcha', store, seconds)
+        try:
+            entry['page'].close()
+        except Exception:
+            pass
+        if 'error' not in data:
+            self.metrics.inc('challenges', store, 'solved')
+            self.log(f"   {store} challenge solved after {seconds:.0f}s, resuming {store}.")
+        else:
+            self.log(f"   {store} challenge: {data['error']}, resuming {store}.")
+        with self._cond:
+            del self._held[store]
+        self._settle(store, entry['index'], entry['challenge'].url, data, 'browser', entry['started'], release=False)
+
+    def _abandon(self):
+        """Fail any remaining URLs once the last worker has gone"""
+        with self._cond:
+            self._live -= 1
+            if self._live > 0:
+                return
+            leftovers = [job for jobs in self._pending.values() for job in jobs]
+            for jobs in self._pending.values(): jobs.clear()
+        for index, url in leftovers:
+            self._finish(index, {'error': 'No browser available', 'url': url}, release=False)
+
+    def _worker(self, worker, scrape):
+        """Runs on the BrowserWorker's thread; the browser is only touched once a URL needs it"""
+        try:
+            while True:
+                self._check_challenges(worker)
+                job = self._next_job(worker)
+                if job is None:
+                    break
+                if job == self.POLL:
+                    self._check_challenges(worker, wait=True)
+                    continue
+                store, index, url = job
+                started = time.perf_counter()
+                data = None
+                if self.fast_path:
+                    with self.metrics.span('http', store):
+                        data = self.fast_path.scrape(url)
+                via = 'http' if data is not None else 'browser'
+                if data is None:
+                    if self.fast_path and self.fast_path.last_outcome() is not None:
+                        # The fast path already sent this store a request; leave the gap before the browser sends another
+                        self.pace(store, self.fast_path.last_outcome())
+                    try:
+                        with self.metrics.span('browser', store):
+                            page = worker.page()
+                    except Exception as e:
+                        self._finish(index, {'error': f"Browser failed to start: {e}", 'url': url}, store)
+                        raise
+                    try:
+                        data = scrape(page, url)
+                    except ChallengeRequired as challenge:
+                        try:
+                            self._hold(worker, store, index, challenge, started)
+                            continue
+                        except Exception as e:
+                            data = {'error': f"Could not set the challenged page aside: {e}", 'url': url, 'kind': 'blocked'}
+                    except Exception as e:
+                        data = error_result(url, e)
+                        if not worker.healthy():
+                            self.log(f"Browser worker {worker.worker_id + 1} is unhealthy, recycling it")
+                            worker.recycle()
+                self._settle(store, index, url, data, via, started)
+            worker.checkpoint()
+        except Exception as e:
+            self.log(f"Browser worker {worker.worker_id + 1} stopped: {e}")
+        finally:
+            with self._cond:
+                held = self._held_by(worker)
+            for store, entry in held:
+                self._release(store, entry, {'error': 'Browser worker stopped during a bot challenge',
+                                             'url': entry['challenge'].url, 'kind': 'error'})
+            self._abandon()
+
+class Scraper:
+    """Turns product URLs into result dicts using the page pool, fast path and warm browsers.
+
+    One Scraper is meant to live for the whole process so its browsers stay warm;
+    call configure() before each run to pick up changed options.
+    """
+
+    OPTIONS = ('headless', 'archive', 'block_resources', 'fast_path', 'pool_size', 'store_limits', 'host_map', 'delays', 'metrics_file', 'retries', 'max_listing_pages', 'shared_pace')
+
+    # Keep every timing sample for exact percentiles (the benchmark); histograms alone are enough otherwise
+    keep_metric_samples = False
+
+    def __init__(self, log=print, **options):
+        self.log = log
+        self.headless = False
+        self.archive = None  # SnapshotArchive (anything with add(url, html, store, source)) to keep every page in
+        self.block_resources = True
+        self.fast_path = True
+        self.pool_size = 1
+        self.store_limits = {'Woolworths': 2, 'Coles': 1}
+        self.host_map = None
+        self.delays = None  # per-store politeness delay ranges, STORE_DELAYS by default
+        self.metrics_file = None  # write run metrics here (.json for JSON, else Prometheus text)
+        self.retries = True  # retry timeouts, blocks and network errors at the end of the run
+        self.max_listing_pages = 50  # stop following a listing's pagination after this many pages
+        self.shared_pace = None  # WorkQueue keeping the politeness gap per store across worker processes
+        self.configure(**options)
+        self.rate_limiter = StoreRateLimiter(self.delays, log=self.log, shared=self.shared_pace)
+        self.metrics = Metrics(self.keep_metric_samples)
+        self.field_stats = FieldStats()
+        self.resource_blocker = ResourceBlocker()
+        self.http = None
+        self.pool = None
+        self.service = BrowserService.shared()
+        self.session_hooks = SessionHooks(self.open_browser_session, self.close_browser_session, self.save_browser_state, self.log)
+        self._warmed_pages = weakref.WeakSet()
+
+    def configure(self, **options):
+        for name, value in options.items():
+            if name not in self.OPTIONS:
+                raise TypeError(f"Unknown scraper option: {name}")
+            setattr(self, name, value)
+        if hasattr(self, 'rate_limiter') and ('delays' in options or 'shared_pace' in options):
+            self.rate_limiter = StoreRateLimiter(self.delays, log=self.log, shared=self.shared_pace)
+
+    def run(self, urls, on_result=None, ordered=True, expand_listings=True):
+        """Scrape the URLs and return the results in input order; on_result(index, data) streams them.
+
+        A listing URL stands for every product on it: on_result is called once
+        per product with the listing's index, and its products are returned in
+        its place. With expand_listings False a listing's products stay together
+        as one list, in on_result and in the returned results.
+        """
+        # The limiter lives as long as the Scraper, so the politeness gap also holds between runs
+        self.rate_limiter.slept = 0.0
+        self.field_stats = FieldStats()
+        self.metrics = Metrics(self.keep_metric_samples)
+        self.resource_blocker.reset()
+        self.service.reset_stats()
+        self.http = HttpFastPath(host_map=self.host_map, archive=self.archive, max_listing_pages=self.max_listing_pages,
+                                 log=self.log) if self.fast_path else None
+        self.pool = PagePool(
+            self.service,
+            config=(self.headless, self.block_resources),
+            size=self.pool_size,
+            store_limits=self.store_limits,
+            limiter=self.rate_limiter,
+            fast_path=self.http,
+            metrics=self.metrics,
+            retry=RetryPolicy() if self.retries else None,
+            hooks=self.session_hooks,
+            log=self.log
+        )
+        if self.http:
+            self.http.pace = self.pool.pace
+        results = self.pool.run(urls, self.scrape_url, on_result=on_result, ordered=ordered, expand=expand_listings)
+        if expand_listings:
+            results = [item for data in results for item in (data if isinstance(data, list) else (data,))]
+        if self.metrics_file:
+            try:
+                self.metrics.write(self.metrics_file)
+            except OSError as e:
+                self.log(f"Could not write metrics to {self.metrics_file}: {e}")
+        return results
+
+    def report(self):
+        """Summary lines for the last run"""
+        lines = [f"Time spent in politeness waits: {self.rate_limiter.slept:.1f}s", self.service.summary()]
+        if self.block_resources:
+            lines.append(self.resource_blocker.summary())
+        if self.http:
+            lines.append(self.http.summary())
+        if self.archive:
+            lines.append(self.archive.summary())
+        for store in sorted(self.rate_limiter.buckets):
+            shown = self.metrics.count('challenges', store, 'shown')
+            if shown:
+                pages = self.metrics.count('pages', store)
+                lines.append(f"{store} bot challenges: {shown} in {pages} pages ({shown / max(pages, 1):.0%}), "
+                             f"{self.metrics.count('challenges', store, 'solved')} solved")
+            retries, trips = self.metrics.count('retries', store), self.metrics.count('breaker_trips', store)
+            if retries or trips:
+                lines.append(f"{store} retries: {retries}, {self.metrics.count('recovered', store)} recovered; "
+                             f"circuit breaker tripped {trips}x, {self.metrics.count('deferred', store)} URLs deferred")
+        return lines + self.field_stats.report() + self.metrics.summary()
+
+    def shutdown(self):
+        self.service.shutdown()
+
+    def _archive_page(self, page, store, url):
+        # Only the page.content() round trip happens here; the archive compresses and writes on its own thread
+        try:
+            self.archive.add(url, page.content(), store)
+        except Exception as e:
+            self.log(f"  Could not archive page: {e}")
+
+    def save_cookies(self, context):
+        """Save browser cookies for reuse"""
+        try:
+            cookies = context.cookies()
+            with open('cookies.json', 'w') as f:
+                json.dump(cookies, f)
+            self.log("Cookies saved for next session")
+        except Exception as e:
+            self.log(f"Could not save cookies: {e}")
+
+    def load_cookies(self, context):
+        """Load saved cookies if available"""
+        try:
+            if os.path.exists('cookies.json'):
+                with open('cookies.json', 'r') as f:
+                    cookies = json.load(f)
+                    context.add_cookies(cookies)
+                self.log("Previous session cookies loaded")
+                return True
+        except Exception as e:
+            self.log(f"Could not load cookies: {e}")
+        return False
+
+    def warmup_browser(self, page):
+        """Simulate normal browsing behavior before scraping"""
+        try:
+            # Visit Coles homepage first
+            page.goto('https://www.coles.com.au', wait_until='networkidle', timeout=30000)
+            time.sleep(random.uniform(2, 4))
+            
+            # Scroll a bit to simulate human behavior
+            page.evaluate("window.scrollTo(0, 300)")
+            time.sleep(random.uniform(1, 2))
+            
+            page.evaluate("window.scrollTo(0, 0)")
+            time.sleep(random.uniform(0.5, 1))
+            
+            self.log("Browser warmup completed")
+        except Exception as e:
+            self.log(f"Warmup failed (non-critical): {e}")
+
+    def scrape_woolworths_page(self, page, url):
+        with self.metrics.span('goto', 'Woolworths'):
+            page.goto(url, wait_until='domcontentloaded', timeout=30000)
+        try:
+            with self.metrics.span('fields', 'Woolworths'):
+                fields = extract_fields(page, WOOLWORTHS_FIELDS, timeout=20000)
+        finally:
+            # Archived even when extraction fails, since that is when the page is most worth a look
+            if self.archive:
+                self._archive_page(page, 'Woolworths', url)
+        self.field_stats.record('Woolworths', fields)
+        return woolworths_result(fields, url)
+
+    def scrape_coles_page(self, page, url):
+        with self.metrics.span('goto', 'Coles'):
+            page.goto(url, wait_until='domcontentloaded', timeout=60000)
+        # One wait races the product against the challenge widget, so pages without a CAPTCHA don't pay for looking
+        try:
+            with self.metrics.span('fields', 'Coles'):
+                fields = extract_fields(page, COLES_FIELDS, timeout=20000)
+        finally:
+            if self.archive:
+                self._archive_page(page, 'Coles', url)
+        if fields is None:
+            # The pool sets this page aside and suspends the Coles lane until the challenge is solved
+            raise ChallengeRequired('Coles', url, lambda timeout: self.resume_coles_page(page, url, timeout))
+        self.field_stats.record('Coles', fields)
+        return coles_result(fields, url)
+
+    def resume_coles_page(self, page, url, timeout):
+        """Read a Coles page that was showing a challenge, once the product has replaced it"""
+        fields = extract_fields(page, COLES_PRODUCT_FIELDS, timeout=timeout)
+        if self.archive:
+            self._archive_page(page, 'Coles', url)
+        self.field_stats.record('Coles', fields)
+        return coles_result(fields, url)
+
+    def scrape_listing_page(self, page, url, store):
+        """Every product on a category, search or specials listing, following its pagination or infinite scroll"""
+        return self._walk_listing(page, url, store, 1, {})
+
+    def _walk_listing(self, page, url, store, number, found, resume_timeout=None):
+        spec, to_result = LISTINGS[store]
+        while number <= self.max_listing_pages:
+            page_url = listing_page_url(url, number)
+            if resume_timeout is None:
+                if number > 1:
+                    self.pool.pace(store, what='listing page')
+                with self.metrics.span('goto', store):
+                    page.goto(page_url, wait_until='domcontentloaded', timeout=60000)
+            try:
+                with self.metrics.span('fields', store):
+                    if resume_timeout is None:
+                        listing = read_listing(page, spec, timeout=20000)
+                    else:
+                        # Back on a page that was showing a challenge: wait for the tiles only
+                        listing = read_listing(page, dict(spec, challenge=None), timeout=resume_timeout)
+                        resume_timeout = None
+                    if listing is not None and not listing['next']:
+                        listing = self._scroll_listing(page, spec, listing)
+            finally:
+                if self.archive:
+                    self._archive_page(page, store, page_url)
+            if listing is None:
+                raise ChallengeRequired(store, url, lambda timeout, number=number: self._walk_listing(page, url, store, number, found, timeout))
+            new = 0
+            for fields in listing['products']:
+                if fields['url'] not in found:
+                    self.field_stats.record(f"{store} listings", {name: fields[name] for name in spec['fields']})
+                    found[fields['url']] = dict(to_result(fields, fields['url']), listing=url)
+                    new += 1
+            self.log(f"  {store} listing page {number}: {len(listing['products'])} products, {new} new")
+            if not listing['next'] or not new:
+                break
+            number += 1
+        return list(found.values())
+
+    def _scroll_listing(self, page, spec, listing, max_scrolls=20):
+        """Scroll an infinite-scroll listing to the bottom until no more tiles load"""
+        for _ in range(max_scrolls):
+            page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            try:
+                page.wait_for_function(MORE_TILES_JS, arg=[spec['tile'], listing['tiles']], timeout=2500)
+            except PlaywrightTimeoutError:
+                break
+            listing = read_listing(page, spec, timeout=5000) or listing
+        return listing
+
+    def open_browser_session(self, p, worker_id):
+        """Launch a browser for one pool worker and return (browser, context, page)"""
+        headless, block_resources = self.service.config
+        # Launch with more realistic browser arguments
+        browser_args = []
+        if not headless:
+            browser_args = [
+                '--disable-blink-features=AutomationControlled',
+                '--disable-dev-shm-usage',
+                '--no-sandbox',
+                '--disable-web-security',
+                '--disable-features=IsolateOrigins,site-per-process'
+            ]
+
+        browser = p.chromium.launch(
+            headless=headless,
+            args=browser_args
+        )
+
+        # More complete context setup, restoring the last saved storage state if there is one
+        has_state = os.path.exists(BROWSER_STATE_FILE)
+        context = browser.new_context(
+            storage_state=BROWSER_STATE_FILE if has_state else None,
+            user_agent=BROWSER_USER_AGENT,
+            viewport={'width': 1920, 'height': 1080},
+            screen={'width': 1920, 'height': 1080},
+            locale='en-AU',
+            timezone_id='Australia/Brisbane',
+            geolocation={'latitude': -27.4698, 'longitude': 153.0251},
+            permissions=['geolocation'],
+            device_scale_factor=1,
+            has_touch=False,
+            is_mobile=False
+        )
+
+        context.add_init_script(STEALTH_SCRIPT)
+        context.grant_permissions(['geolocation'], origin='https://www.coles.com.au')
+        context.grant_permissions(['geolocation'], origin='https://www.woolworths.com.au')
+
+        if block_resources:
+            self.resource_blocker.attach(context)
+
+        # Load cookies if available
+        if not has_state:
+            self.load_cookies(context)
+
+        page = context.new_page()
+        self.log(f"Browser worker {worker_id + 1} started")
+        return browser, context, page
+
+    def close_browser_session(self, browser, context, page):
+        self.save_browser_state(context)
+        browser.close()
+
+    def save_browser_state(self, context):
+        """Save the context's storage state (cookies and local storage) for the next cold start"""
+        try:
+            context.storage_state(path=BROWSER_STATE_FILE)
+        except Exception as e:
+            self.log(f"Could not save browser state: {e}")
+        # Save cookies too, for older setups that only look at cookies.json
+        self.save_cookies(context)
+
+    def scrape_url(self, page, url):
+        self.log(f"Scraping {url.split('/')[-1]}")
+        store = detect_store(url)
+        # Warmup browser once per page before its first Coles product
+        if store == 'Coles' and not self.service.config[0] and page not in self._warmed_pages:
+            with self.metrics.span('warmup', 'Coles'):
+                self.warmup_browser(page)
+            self._warmed_pages.add(page)
+        if store in LISTINGS and is_listing_url(url):
+            return self.scrape_listing_page(page, url, store)
+        if store == 'Woolworths':
+            return self.scrape_woolworths_page(page, url)
+        if store == 'Coles':
+            return self.scrape_coles_page(page, url)
+        return {'error': 'Unknown store', 'url': url}
@@ -1,31 +1,26 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 import threading
-import csv
-import time
-import re
 import os 
 import json
 import webbrowser
 import traceback
-import random
 from datetime import datetime
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
-
-# Import for Gemini AI
-try:
-    import google.generativeai as genai
-    HAS_GEMINI = True
-except ImportError:
-    HAS_GEMINI = False
-
-# Try to import optional libraries
-try:
-    import openpyxl
-    from openpyxl.styles import PatternFill, Font
-    HAS_EXCEL = True
-except ImportError:
-    HAS_EXCEL = False
+from scraper_core import Scraper, filter_urls, is_supported_url
+from price_history import PriceHistory
+from refresh_scheduler import RefreshScheduler
+from run_journal import RunJournal, resume_plan
+from ui_channel import UiChannel, LogBuffer
+from results_view import ResultsView
+from url_catalogue import UrlCatalogue
+from price_records import normalize
+from price_analytics import summary_lines
+from product_matching import ProductMatcher
+from snapshot_archive import SnapshotArchive
+from change_detection import ChangeDetector, WebhookSink, unavailable_record
+from ai_analysis import AnalysisPipeline, AnalysisCache, HAS_GEMINI, STUB_MODEL, TOKENS_PER_MINUTE, create_model
+from exporters import (CsvExporter, ColumnWidths, HAS_EXCEL, HAS_ARROW, excel_values, export_columnar,
+                       write_changes_csv, write_csv, write_xlsx)
 
 class MultiStoreScraperGUI:
     def __init__(self, root):
@@ -34,13 +29,32 @@ class MultiStoreScraperGUI:
         self.root.geometry("1200x700")
 
         self.scraped_data = []
+        self.records = []
+        self.export_widths = ColumnWidths()
+        self.live_csv = None
         self.is_scraping = False
+        self.scraper = Scraper(log=self.log)
+        self.history = PriceHistory()
+        self.matcher = ProductMatcher(log=self.log)
+        self.detector = ChangeDetector(log=self.log)
+        self.changes = []
+        self.archive = None
+        self.journal = None
+        self.total_urls = 0
+        self.urls_done = 0
+        self.finished_indexes = set()
+        # Worker threads never touch widgets; they post here and the main loop applies it
+        self.ui = UiChannel(root, {'log': self.apply_log, 'result': self.apply_results, 'progress': self.apply_progress})
         self.api_key = tk.StringVar()
         self.model_var = tk.StringVar()
-        self.available_models = ['gemini-2.5-flash', 'gemini-2.5-pro']
+        self.webhook_var = tk.StringVar()
+        self.tokens_per_minute_var = tk.IntVar(value=TOKENS_PER_MINUTE)
+        self.available_models = ['gemini-2.5-flash', 'gemini-2.5-pro', STUB_MODEL]
         
         # File for storing URLs
         self.urls_file = "scraper_urls.txt"
+        self.catalogue = UrlCatalogue(self.urls_file, log=self.log)
+        self.importing = False
 
         self.default_urls = [
             # Woolworths URLs
@@ -65,8 +79,14 @@ class MultiStoreScraperGUI:
         ]
 
         self.setup_ui()
+        self.ui.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.load_settings()
         self.load_urls_from_file()
+        if self.matcher.load():
+            self.log(f"Loaded {len(self.matcher)} cross-store product matches")
+        if self.detector.load():
+            self.log(f"Loaded the last run's prices for {len(self.detector)} products to detect changes against")
 
     def setup_ui(self):
         notebook = ttk.Notebook(self.root)
@@ -115,27 +135,8 @@ class MultiStoreScraperGUI:
         ttk.Button(button_frame, text="Export URLs", command=self.export_urls).grid(row=0, column=4, sticky='ew', padx=2)
 
     def setup_results_tab(self):
-        columns = ('Store', 'Product', 'Price', 'Was', 'Unit Price', 'Promotion')
-        self.tree = ttk.Treeview(self.results_frame, columns=columns, show='headings', height=20)
-        self.tree.heading('Store', text='Store')
-        self.tree.heading('Product', text='Product Name')
-        self.tree.heading('Price', text='Current Price')
-        self.tree.heading('Was', text='Was Price')
-        self.tree.heading('Unit Price', text='Unit Price')
-        self.tree.heading('Promotion', text='Promotion')
-        self.tree.column('Store', width=80, anchor='center')
-        self.tree.column('Product', width=400)
-        self.tree.column('Price', width=100, anchor='center')
-        self.tree.column('Was', width=100, anchor='center')
-        self.tree.column('Unit Price', width=150, anchor='center')
-        self.tree.column('Promotion', width=150, anchor='center')
-        self.tree.bind("<Double-1>", self.on_item_double_click)
-        vsb = ttk.Scrollbar(self.results_frame, orient="vertical", command=self.tree.yview)
-        hsb = ttk.Scrollbar(self.results_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        self.tree.grid(column=0, row=0, sticky='nsew', padx=5, pady=5)
-        vsb.grid(column=1, row=0, sticky='ns')
-        hsb.grid(column=0, row=1, sticky='ew')
+        self.results_view = ResultsView(self.results_frame, on_open=self.open_result_url)
+        self.results_view.grid(column=0, row=0, sticky='nsew', padx=5, pady=5)
         self.results_frame.grid_columnconfigure(0, weight=1)
         self.results_frame.grid_rowconfigure(0, weight=1)
         self.summary_label = ttk.Label(self.results_frame, text="No data scraped yet")
@@ -155,13 +156,22 @@ class MultiStoreScraperGUI:
         self.model_selector = ttk.Combobox(settings_pane, textvariable=self.model_var, values=self.available_models, state="readonly")
         self.model_selector.grid(row=5, column=0, columnspan=2, sticky='ew')
         self.model_selector.set(self.available_models[0])
+        ttk.Label(settings_pane, text="Change Webhook URL:", font=('Arial', 10, 'bold')).grid(row=6, column=0, sticky='w', pady=(20, 5))
+        webhook_instructions = "Optional. After each run, the products whose price or promotion changed since the last run are POSTed here as JSON (e.g. http://localhost:8080/prices)."
+        ttk.Label(settings_pane, text=webhook_instructions, wraplength=500).grid(row=7, column=0, columnspan=2, sticky='w', pady=(0, 10))
+        ttk.Entry(settings_pane, textvariable=self.webhook_var, width=70).grid(row=8, column=0, columnspan=2, sticky='ew', padx=(0, 5))
+        ttk.Label(settings_pane, text="AI Tokens per Minute:", font=('Arial', 10, 'bold')).grid(row=9, column=0, sticky='w', pady=(20, 5))
+        budget_instructions = "Most prompt tokens the AI analysis sends per minute, to stay within your API quota and budget. 0 means no limit."
+        ttk.Label(settings_pane, text=budget_instructions, wraplength=500).grid(row=10, column=0, columnspan=2, sticky='w', pady=(0, 10))
+        ttk.Spinbox(settings_pane, from_=0, to=10000000, increment=50000, textvariable=self.tokens_per_minute_var, width=12).grid(row=11, column=0, sticky='w')
         self.save_settings_button = ttk.Button(settings_pane, text="Save Settings", command=self.save_settings)
-        self.save_settings_button.grid(row=6, column=0, columnspan=2, pady=(20, 0))
+        self.save_settings_button.grid(row=12, column=0, columnspan=2, pady=(20, 0))
         settings_pane.grid_columnconfigure(0, weight=1)
 
     def setup_log_tab(self):
         self.log_text = scrolledtext.ScrolledText(self.log_frame, height=25, width=100, wrap=tk.WORD)
         self.log_text.pack(fill='both', expand=True, padx=10, pady=10)
+        self.log_buffer = LogBuffer(self.log_text)
 
     def setup_control_panel(self):
         control_frame = ttk.Frame(self.root)
@@ -182,88 +192,92 @@ class MultiStoreScraperGUI:
         ttk.Checkbutton(options_frame, text="Headless Mode", variable=self.headless_var).pack(anchor='w')
         self.debug_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(options_frame, text="Debug Mode", variable=self.debug_var).pack(anchor='w')
+        self.block_resources_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Block Images/Trackers", variable=self.block_resources_var).pack(anchor='w')
+        self.fast_path_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="HTTP Fast Path", variable=self.fast_path_var).pack(anchor='w')
+        self.smart_refresh_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Smart Refresh", variable=self.smart_refresh_var).pack(anchor='w')
+        self.archive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Archive Pages", variable=self.archive_var).pack(anchor='w')
+        self.live_csv_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Live CSV", variable=self.live_csv_var).pack(anchor='w')
+        pool_frame = ttk.LabelFrame(left_frame, text="Concurrency")
+        pool_frame.pack(side='left', padx=(10, 0))
+        self.pool_size_var = tk.IntVar(value=1)
+        self.woolworths_limit_var = tk.IntVar(value=2)
+        self.coles_limit_var = tk.IntVar(value=1)
+        for row, (label, var) in enumerate([("Pages", self.pool_size_var), ("Woolworths max", self.woolworths_limit_var), ("Coles max", self.coles_limit_var)]):
+            ttk.Label(pool_frame, text=label).grid(row=row, column=0, sticky='w', padx=(2, 5))
+            ttk.Spinbox(pool_frame, from_=1, to=8, width=3, textvariable=var, state='readonly').grid(row=row, column=1, sticky='w')
         buttons_frame = ttk.Frame(control_frame)
         buttons_frame.pack(side='right', padx=5)
         self.scrape_button = ttk.Button(buttons_frame, text="Start Scraping", command=self.start_scraping)
         self.scrape_button.pack(side='left', padx=5)
+        self.resume_button = ttk.Button(buttons_frame, text="Resume Last Run", command=self.resume_scraping)
+        self.resume_button.pack(side='left', padx=5)
         self.csv_button = ttk.Button(buttons_frame, text="Export CSV", command=self.export_csv, state='disabled')
         self.csv_button.pack(side='left', padx=5)
         self.excel_button = ttk.Button(buttons_frame, text="Export Excel", command=self.export_excel, state='disabled')
         self.excel_button.pack(side='left', padx=5)
+        self.parquet_button = ttk.Button(buttons_frame, text="Export Parquet", command=self.export_parquet, state='disabled')
+        self.parquet_button.pack(side='left', padx=5)
+        self.changes_button = ttk.Button(buttons_frame, text="Export Changes", command=self.export_changes, state='disabled')
+        self.changes_button.pack(side='left', padx=5)
         self.ai_button = ttk.Button(buttons_frame, text="AI Analyse", command=self.start_ai_analysis, state='disabled')
         self.ai_button.pack(side='left', padx=5)
 
-    def save_urls_to_file(self):
-        """Save all URLs from the listbox to a text file"""
-        try:
-            urls = list(self.url_listbox.get(0, tk.END))
-            with open(self.urls_file, 'w', encoding='utf-8') as f:
-                for url in urls:
-                    f.write(url + '\n')
-            self.log(f"URLs saved to {self.urls_file}")
-        except Exception as e:
-            self.log(f"Error saving URLs to file: {e}")
-
     def load_urls_from_file(self):
         """Load URLs from the text file if it exists"""
         try:
-            if os.path.exists(self.urls_file):
-                with open(self.urls_file, 'r', encoding='utf-8') as f:
-                    urls = [line.strip() for line in f if line.strip()]
-                
-                if urls:
-                    self.url_listbox.delete(0, tk.END)
-                    for url in urls:
-                        if 'woolworths.com.au/shop/productdetails/' in url or 'coles.com.au/product/' in url:
-                            self.url_listbox.insert(tk.END, url)
-                    self.log(f"Loaded {len(urls)} URLs from {self.urls_file}")
-                else:
-                    # If file is empty, load defaults
-                    self.load_default_urls()
+            if self.catalogue.load() and len(self.catalogue):
+                self.log(f"Loaded {len(self.catalogue)} URLs from {self.urls_file}")
             else:
-                # If file doesn't exist, create it with defaults
-                self.load_default_urls()
-                self.save_urls_to_file()
+                # If the file is missing or empty, start from the defaults
+                self.catalogue.clear()
+                self.catalogue.add_many(self.default_urls)
         except Exception as e:
             self.log(f"Error loading URLs from file: {e}")
-            self.load_default_urls()
-
-    def load_default_urls(self):
-        """Load the default URLs into the listbox"""
-        for url in self.default_urls:
-            self.url_listbox.insert(tk.END, url)
+            self.catalogue.entries = {}
+            self.catalogue.add_many(self.default_urls)
+        self.url_listbox.delete(0, tk.END)
+        self.url_listbox.insert(tk.END, *self.catalogue.urls())
 
     def import_urls(self):
         """Import URLs from a user-selected text file"""
+        if self.importing:
+            messagebox.showinfo("Import Running", "An import is already in progress")
+            return
         filename = filedialog.askopenfilename(
             title="Import URLs from text file",
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
         )
         
         if filename:
-            try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    imported_urls = [line.strip() for line in f if line.strip()]
-                
-                imported_count = 0
-                for url in imported_urls:
-                    if 'woolworths.com.au/shop/productdetails/' in url or 'coles.com.au/product/' in url:
-                        self.url_listbox.insert(tk.END, url)
-                        imported_count += 1
-                
-                if imported_count > 0:
-                    self.save_urls_to_file()
-                    self.log(f"Imported {imported_count} valid URLs from {os.path.basename(filename)}")
-                    messagebox.showinfo("Import Complete", f"Successfully imported {imported_count} URLs")
-                else:
-                    messagebox.showwarning("No Valid URLs", "No valid Woolworths or Coles URLs found in the file")
-                    
-            except Exception as e:
-                messagebox.showerror("Import Error", f"Failed to import URLs: {e}")
+            self.importing = True
+            self.log(f"Importing URLs from {os.path.basename(filename)}...")
+            threading.Thread(target=self.import_urls_thread, args=(filename,), daemon=True).start()
+
+    def import_urls_thread(self, filename):
+        """Stream a URL file into the catalogue, showing each chunk as it lands"""
+        try:
+            imported_count, duplicates, invalid = self.catalogue.import_file(
+                filename, on_chunk=lambda added: self.ui.call(self.url_listbox.insert, tk.END, *added))
+            self.log(f"Imported {imported_count} new URLs from {os.path.basename(filename)} ({duplicates} already listed, {invalid} not product URLs)")
+            if imported_count > 0:
+                self.ui.call(messagebox.showinfo, "Import Complete", f"Successfully imported {imported_count} URLs")
+            elif duplicates:
+                self.ui.call(messagebox.showinfo, "Import Complete", "All products in the file are already listed")
+            else:
+                self.ui.call(messagebox.showwarning, "No Valid URLs", "No valid Woolworths or Coles URLs found in the file")
+        except Exception as e:
+            self.ui.call(messagebox.showerror, "Import Error", f"Failed to import URLs: {e}")
+        finally:
+            self.importing = False
 
     def export_urls(self):
         """Export current URLs to a user-selected text file"""
-        urls = list(self.url_listbox.get(0, tk.END))
+        urls = self.catalogue.urls()
         if not urls:
             messagebox.showwarning("No URLs", "No URLs to export")
             return
@@ -287,361 +301,218 @@ class MultiStoreScraperGUI:
 
     def add_url(self):
         url = self.url_entry.get().strip()
-        if url and ('woolworths.com.au/shop/productdetails/' in url or 'coles.com.au/product/' in url):
+        if url and is_supported_url(url):
+            existing = self.catalogue.get(url)
+            if existing:
+                messagebox.showinfo("Already Listed", f"This product is already in the list:\n{existing}")
+                return
+            self.catalogue.add(url)
             self.url_listbox.insert(tk.END, url)
             self.url_entry.delete(0, tk.END)
-            self.save_urls_to_file()  # Auto-save after adding
             self.log("Added URL: " + url)
         else:
-            messagebox.showwarning("Invalid URL", "Please enter a valid Woolworths or Coles product URL.")
+            messagebox.showwarning("Invalid URL", "Please enter a valid Woolworths or Coles product, category or search URL.")
 
     def remove_url(self):
         selection = self.url_listbox.curselection()
         if selection:
+            self.catalogue.remove(self.url_listbox.get(selection[0]))
             self.url_listbox.delete(selection)
-            self.save_urls_to_file()  # Auto-save after removing
             self.log("Removed selected URL")
 
     def clear_urls(self):
         if messagebox.askyesno("Confirm Clear", "Are you sure you want to clear all URLs?"):
+            self.catalogue.clear()
             self.url_listbox.delete(0, tk.END)
-            self.save_urls_to_file()  # Auto-save after clearing
             self.log("Cleared all URLs")
 
     def reset_urls(self):
         if messagebox.askyesno("Load Defaults", "This will replace all current URLs with the default list. Continue?"):
-            self.clear_urls()
-            for url in self.default_urls:
-                self.url_listbox.insert(tk.END, url)
-            self.save_urls_to_file()  # Auto-save after resetting
+            self.catalogue.clear()
+            self.catalogue.add_many(self.default_urls)
+            self.url_listbox.delete(0, tk.END)
+            self.url_listbox.insert(tk.END, *self.catalogue.urls())
             self.log("Loaded default URLs")
 
     def log(self, message):
+        """Log a message; safe to call from any thread"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        self.ui.post('log', f"[{timestamp}] {message}")
 
-    def calculate_discount(self, current_price, was_price, promo_badge=""):
-        if was_price and was_price not in ["Not applicable", "-", ""]:
-            try:
-                current_match = re.search(r'[\d.]+', str(current_price))
-                was_match = re.search(r'[\d.]+', str(was_price))
-                if current_match and was_match:
-                    current, was = float(current_match.group()), float(was_match.group())
-                    if was > current:
-                        discount_amt, discount_pct = was - current, ((was - current) / was) * 100
-                        if "1/2 Price" in promo_badge or 48 <= discount_pct <= 52: return discount_pct, "HALF PRICE!"
-                        if "Special" in promo_badge: return discount_pct, f"{discount_pct:.0f}% OFF"
-                        if discount_pct >= 30: return discount_pct, f"{discount_pct:.0f}% OFF!"
-                        if discount_pct >= 20: return discount_pct, f"{discount_pct:.0f}% OFF"
-                        if discount_pct > 0: return discount_pct, f"Save ${discount_amt:.2f}"
-            except Exception: pass
-        if promo_badge:
-            if "1/2 Price" in promo_badge: return 50.0, "HALF PRICE!"
-            if "Special" in promo_badge: return None, "SPECIAL"
-        return None, ""
-
-    def _save_debug_html(self, page, store, url):
-        try:
-            html_content = page.content()
-            sanitized_name = re.sub(r'[^a-zA-Z0-9_-]', '', url.split('/')[-1])[:50]
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"debug_{store}_{sanitized_name}_{timestamp}.html"
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            self.log(f"  [DEBUG] Saved page HTML to {filename}")
-        except Exception as e:
-            self.log(f"  [DEBUG] Could not save HTML file: {e}")
+    def apply_log(self, lines):
+        self.log_buffer.extend(lines)
 
-    def save_cookies(self, context):
-        """Save browser cookies for reuse"""
-        try:
-            cookies = context.cookies()
-            with open('cookies.json', 'w') as f:
-                json.dump(cookies, f)
-            self.log("Cookies saved for next session")
-        except Exception as e:
-            self.log(f"Could not save cookies: {e}")
+    def apply_results(self, rows):
+        self.results_view.add(rows)
 
-    def load_cookies(self, context):
-        """Load saved cookies if available"""
-        try:
-            if os.path.exists('cookies.json'):
-                with open('cookies.json', 'r') as f:
-                    cookies = json.load(f)
-                    context.add_cookies(cookies)
-                self.log("Previous session cookies loaded")
-                return True
-        except Exception as e:
-            self.log(f"Could not load cookies: {e}")
-        return False
+    def apply_progress(self, values):
+        self.progress['value'] = values[-1]
 
-    def warmup_browser(self, page):
-        """Simulate normal browsing behavior before scraping"""
-        try:
-            # Visit Coles homepage first
-            page.goto('https://www.coles.com.au', wait_until='networkidle', timeout=30000)
-            time.sleep(random.uniform(2, 4))
-            
-            # Scroll a bit to simulate human behavior
-            page.evaluate("window.scrollTo(0, 300)")
-            time.sleep(random.uniform(1, 2))
-            
-            page.evaluate("window.scrollTo(0, 0)")
-            time.sleep(random.uniform(0.5, 1))
-            
-            self.log("Browser warmup completed")
-        except Exception as e:
-            self.log(f"Warmup failed (non-critical): {e}")
-
-    def scrape_woolworths_page(self, page, url):
-        page.goto(url, wait_until='domcontentloaded', timeout=30000)
-        if self.debug_var.get():
-            self._save_debug_html(page, 'woolworths', url)
-        panel = page.locator('section[class*="product-details-panel_component_product-panel"]')
-        panel.wait_for(timeout=20000)
-        name = panel.locator('h1[class*="product-title_component_product-title"]').inner_text()
-        price, was_price, cup_price, promo_badge = "Not found", "Not applicable", "Not found", ""
-        try: price = panel.locator('div[class*="product-price_component_price-lead"]').inner_text(timeout=5000).replace('$', '').strip()
-        except Exception: pass
-        try: 
-            was_price_full = panel.locator('div[class*="product-unit-price_component_price-was"]').inner_text(timeout=2000)
-            was_price = re.search(r'[\d.]+', was_price_full).group()
-        except Exception: pass
-        try: cup_price = panel.locator('div[class*="product-unit-price_component_price-cup-string"]').inner_text(timeout=5000)
-        except Exception: pass
-        try: promo_badge = panel.locator('div[class*="product-stamp_message"]').inner_text(timeout=1000)
-        except Exception: pass
-        return {'store': 'Woolworths', 'name': name, 'price': price, 'was_price': was_price, 'cup_price': cup_price, 'url': url, 'promo_badge': promo_badge}
-
-    def scrape_coles_page(self, page, url):
-        page.goto(url, wait_until='domcontentloaded', timeout=60000)
-        
-        if self.debug_var.get():
-            self._save_debug_html(page, 'coles', url)
+    def reset_results(self, total):
+        self.results_view.clear()
+        self.results_view.set_partners(self.matcher.partner_map())
+        self.progress['maximum'], self.progress['value'] = total, 0
 
-        # Check for CAPTCHA and wait for user to solve it
-        try:
-            captcha_locator = page.locator('iframe[title="Widget containing a Cloudflare security challenge"]')
-            captcha_locator.wait_for(timeout=5000) # Quick check to see if it's there
-            
-            # If the above line doesn't throw an error, the CAPTCHA is present
-            self.log("!!! ACTION REQUIRED: CAPTCHA detected. Please solve the challenge in the browser window.")
-            self.log("    The script will wait up to 2 minutes for you to complete it...")
-            
-            # Wait for the product page to load after CAPTCHA
-            page.wait_for_selector('h1[data-testid="title"], section[data-testid="product_price"]', timeout=120000)
-            self.log("   CAPTCHA solved! Resuming scraping.")
-
-        except PlaywrightTimeoutError:
-            # This is the normal path - the CAPTCHA was NOT found, so we proceed.
-            self.log("   No CAPTCHA detected, proceeding with scrape.")
-            # Wait for the product title or price section to appear
-            page.wait_for_selector('h1[data-testid="title"], section[data-testid="product_price"]', timeout=20000)
-        
-        name = "Not found"
-        try:
-            # Get product name from the h1 title
-            name = page.locator('h1[data-testid="title"]').inner_text(timeout=5000)
-        except Exception:
-            pass
-        
-        price, was_price, cup_price, promo_badge = "Not found", "Not applicable", "Not found", ""
-        
-        try: 
-            # Get price from the pricing span
-            price = page.locator('span[data-testid="pricing"]').inner_text(timeout=5000).replace('$', '').strip()
-        except Exception: 
-            pass
-        
-        try: 
-            was_price_full = page.locator('.price__was').inner_text(timeout=2000)
-            was_price = re.search(r'[\d.]+', was_price_full).group()
-        except Exception: 
-            pass
-        
-        try: 
-            # Get unit price from the calculation method div
-            cup_price = page.locator('.price__calculation_method').inner_text(timeout=2000).strip()
-        except Exception: 
-            pass
-        
-        if was_price != "Not applicable":
-            promo_badge = "Special" 
-            if was_price and price:
-                try:
-                    if float(was_price) / 2 == float(price): 
-                        promo_badge = "1/2 Price"
-                except Exception: 
-                    pass
-        
-        return {'store': 'Coles', 'name': name, 'price': price, 'was_price': was_price, 'cup_price': cup_price, 'url': url, 'promo_badge': promo_badge}
-
-    def scraping_thread(self):
-        all_urls = list(self.url_listbox.get(0, tk.END))
-        urls_to_scrape = []
-        scrape_ww = self.scrape_woolworths.get()
-        scrape_cl = self.scrape_coles.get()
-        for url in all_urls:
-            if 'woolworths.com.au' in url and scrape_ww: urls_to_scrape.append(url)
-            elif 'coles.com.au' in url and scrape_cl: urls_to_scrape.append(url)
-        if not urls_to_scrape:
-            self.log("No URLs to scrape based on current selection!")
-            self.is_scraping = False
-            self.scrape_button.config(text="Start Scraping", state='normal')
-            return
+    def scraping_finished(self, successful=None, total=0):
+        if successful is not None:
+            self.summary_label.config(text=f"Scraped: {successful}/{total} products, {len(self.changes)} changed since the last run")
+        if self.changes:
+            self.changes_button.config(state='normal')
+        if successful:
+            self.csv_button.config(state='normal')
+            if HAS_EXCEL: self.excel_button.config(state='normal')
+            if HAS_ARROW: self.parquet_button.config(state='normal')
+            self.ai_button.config(state='normal')
+        self.scrape_button.config(text="Start Scraping", state='normal')
+        self.resume_button.config(state='normal')
+
+    def page_archive(self):
+        if self.archive is None:
+            self.archive = SnapshotArchive(log=self.log)
+        return self.archive
+
+    def on_close(self):
+        self.ui.stop()
+        if not self.is_scraping:
+            self.scraper.shutdown()
+            self.history.close()
+            if self.archive:
+                self.archive.close()
+        self.root.destroy()
+
+    def on_scrape_result(self, index, data, replayed=False):
+        """Record one result; the pool calls this in input order (index is None for cached results).
+
+        Every product on a listing page arrives with the listing's index, so
+        progress counts indexes rather than results. Results replayed from the
+        journal on a resume are already journaled and in the history.
+        """
+        self.scraped_data.append(data)
+        if index is None or index not in self.finished_indexes:
+            self.finished_indexes.add(index)
+            self.urls_done += 1
+        if not replayed:
+            self.history.add(data)
+            self.journal.record(data)
+        if 'error' not in data:
+            record = normalize(data)
+            self.records.append(record)
+            self.export_widths.update(excel_values(record))
+            if self.live_csv:
+                self.live_csv.write(record)
+            self.ui.post('result', (record, self.detector.observe(data, record)))
+            source = " (cached)" if 'cached_at' in data else ""
+            self.log(f"  ✓ {self.urls_done}/{self.total_urls} {data['store']}: {data['name']}{source}")
+        else:
+            self.log(f"  ✗ Error for {data.get('url')}: {data.get('error', 'Unknown error')}")
+        self.ui.post('progress', self.urls_done)
+
+    def scraping_thread(self, settings, resume=False):
+        """Run a scrape in the background; settings are read from the widgets by start_scraping"""
+        done = []
+        if resume:
+            plan = resume_plan()
+            if plan is None:
+                self.log("No previous run to resume!")
+                self.is_scraping = False
+                self.ui.call(self.scraping_finished)
+                return
+            done, urls_to_scrape = plan
+            self.log(f"Resuming last run: {len(done)} already scraped, {len(urls_to_scrape)} left to do")
+        else:
+            urls_to_scrape = filter_urls(settings['urls'], settings['stores'])
+            if not urls_to_scrape:
+                self.log("No URLs to scrape based on current selection!")
+                self.is_scraping = False
+                self.ui.call(self.scraping_finished)
+                return
             
-        self.scraped_data, self.progress['value'] = [], 0
-        self.tree.delete(*self.tree.get_children())
-        self.progress['maximum'] = len(urls_to_scrape)
+        self.scraped_data = []
+        self.urls_done, self.finished_indexes = 0, set()
+        self.records, self.export_widths = [], ColumnWidths()
+        self.changes = []
+        self.detector.begin()
+        if settings['live_csv']:
+            self.live_csv = self.open_live_csv()
+        self.total_urls = len(done) + len(urls_to_scrape)
+        self.ui.call(self.reset_results, self.total_urls)
+        self.journal = RunJournal().resume() if resume else RunJournal().start(urls_to_scrape)
+        for data in done:
+            self.on_scrape_result(None, data, replayed=True)
         self.log(f"Starting scraper for {len(urls_to_scrape)} URLs...")
 
-        # Enhanced stealth script
-        stealth_script = """
-        // Override webdriver property
-        Object.defineProperty(navigator, 'webdriver', {
-            get: () => undefined
-        });
-        
-        // Override plugins to look more realistic
-        Object.defineProperty(navigator, 'plugins', {
-            get: () => [1, 2, 3, 4, 5]
-        });
-        
-        // Override language properties
-        Object.defineProperty(navigator, 'languages', {
-            get: () => ['en-AU', 'en']
-        });
-        
-        // Fix chrome runtime
-        window.chrome = {
-            runtime: {}
-        };
-        
-        // Override permissions query
-        const originalQuery = window.navigator.permissions.query;
-        window.navigator.permissions.query = (parameters) => (
-            parameters.name === 'notifications' ?
-                Promise.resolve({ state: Notification.permission }) :
-                originalQuery(parameters)
-        );
-        """
-
+        self.scraper.configure(**settings['scraper'])
         try:
-            with sync_playwright() as p:
-                # Launch with more realistic browser arguments
-                browser_args = []
-                if not self.headless_var.get():
-                    browser_args = [
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-dev-shm-usage',
-                        '--no-sandbox',
-                        '--disable-web-security',
-                        '--disable-features=IsolateOrigins,site-per-process'
-                    ]
-                
-                browser = p.chromium.launch(
-                    headless=self.headless_var.get(),
-                    args=browser_args
-                )
-                
-                # More complete context setup
-                context = browser.new_context(
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-                    viewport={'width': 1920, 'height': 1080},
-                    screen={'width': 1920, 'height': 1080},
-                    locale='en-AU',
-                    timezone_id='Australia/Brisbane',
-                    geolocation={'latitude': -27.4698, 'longitude': 153.0251},
-                    permissions=['geolocation'],
-                    device_scale_factor=1,
-                    has_touch=False,
-                    is_mobile=False
-                )
-                
-                context.add_init_script(stealth_script)
-                context.grant_permissions(['geolocation'], origin='https://www.coles.com.au')
-                context.grant_permissions(['geolocation'], origin='https://www.woolworths.com.au')
-                
-                # Load cookies if available
-                self.load_cookies(context)
-                
-                page = context.new_page()
-                
-                # Warmup browser for Coles if we're scraping Coles URLs
-                has_coles = any('coles.com.au' in url for url in urls_to_scrape)
-                if has_coles and not self.headless_var.get():
-                    self.warmup_browser(page)
-
-                for i, url in enumerate(urls_to_scrape, 1):
-                    self.log(f"Scraping {i}/{len(urls_to_scrape)}: {url.split('/')[-1]}")
-                    data = {}
-                    try:
-                        if 'woolworths.com.au' in url: 
-                            data = self.scrape_woolworths_page(page, url)
-                        elif 'coles.com.au' in url: 
-                            data = self.scrape_coles_page(page, url)
-                        else: 
-                            data = {'error': 'Unknown store', 'url': url}
-                    except Exception as e:
-                        data = {'error': str(e), 'url': url}
-                        
-                    self.scraped_data.append(data)
-                    
-                    if 'error' not in data:
-                        _, promo_type = self.calculate_discount(data['price'], data['was_price'], data.get('promo_badge', ''))
-                        price_display = f"${data['price']}" if data['price'] != "Not found" else "N/A"
-                        was_display = f"${data['was_price']}" if data['was_price'] != "Not applicable" else "-"
-                        self.tree.insert('', tk.END, values=(data['store'], data['name'], price_display, was_display, data['cup_price'], promo_type or ""), tags=(data['url'],))
-                        self.log(f"  ✓ {data['store']}: {data['name']}")
-                    else:
-                        self.log(f"  ✗ Error for {url}: {data.get('error', 'Unknown error')}")
-                        
-                    self.progress['value'] = i
-                    self.root.update_idletasks()
-                    
-                    if i < len(urls_to_scrape):
-                        # Longer, more variable delays for Coles
-                        next_url = urls_to_scrape[i] if i < len(urls_to_scrape) else ""
-                        if 'coles.com.au' in next_url:
-                            sleep_time = random.uniform(5, 10)  # Longer for Coles
-                        else:
-                            sleep_time = random.uniform(2, 5)   # Original for Woolworths
-                        
-                        self.log(f"  Waiting for {sleep_time:.1f} seconds before next product...")
-                        time.sleep(sleep_time)
-
-                # Save cookies before closing
-                self.save_cookies(context)
-                browser.close()
-                
+            if settings['smart_refresh']:
+                self.history.flush()
+                urls_to_scrape, cached = RefreshScheduler(self.history).plan(urls_to_scrape)
+                self.log(f"Smart refresh: {len(urls_to_scrape)} due, {len(cached)} served from the price history")
+                for data in cached:
+                    self.on_scrape_result(None, data)
+            if urls_to_scrape:
+                self.scraper.run(urls_to_scrape, on_result=self.on_scrape_result)
         except Exception as e:
             self.log(f"An unexpected error occurred during scraping: {str(e)}")
+        try:
+            self.history.flush()
+        except Exception as e:
+            self.log(f"Could not save price history: {e}")
+        self.journal.finish()
+        if self.live_csv:
+            self.live_csv.close()
+            self.log(f"Live CSV complete: {self.live_csv.rows} rows in {self.live_csv.path}")
+            self.live_csv = None
 
         successful = sum(1 for d in self.scraped_data if 'error' not in d)
-        self.summary_label.config(text=f"Scraped: {successful}/{len(urls_to_scrape)} products")
-        if successful > 0:
-            self.csv_button.config(state='normal')
-            if HAS_EXCEL: self.excel_button.config(state='normal')
-            if HAS_GEMINI: self.ai_button.config(state='normal')
+        for line in self.scraper.report() + summary_lines(self.records):
+            self.log(line)
+        self.detect_changes(settings['webhook'])
+        self.match_products()
         self.log("Scraping complete!")
         self.is_scraping = False
-        self.scrape_button.config(text="Start Scraping", state='normal')
+        self.ui.call(self.scraping_finished, successful, len(self.scraped_data))
         
-    def on_item_double_click(self, event):
-        item_id = self.tree.identify_row(event.y)
-        if item_id:
-            tags = self.tree.item(item_id, "tags")
-            if tags and tags[0]:
-                webbrowser.open(tags[0])
-                self.log(f"Opened URL in browser: {tags[0]}")
+    def detect_changes(self, webhook):
+        """Finish change detection for the run, show products that dropped off their listings and notify the webhook"""
+        try:
+            self.detector.sinks = [WebhookSink(webhook, log=self.log)] if webhook else []
+            for change in self.detector.finish():
+                self.ui.post('result', (unavailable_record(change), change))
+            self.changes = list(self.detector.changes)
+        except Exception as e:
+            self.log(f"Change detection failed: {e}")
+
+    def match_products(self):
+        """Pair this run's products across stores and show the new pairs in the results table"""
+        try:
+            new = self.matcher.match(self.records)
+            if new:
+                self.matcher.save()
+                self.log(f"Matched {len(new)} more products across stores ({len(self.matcher)} pairs in total)")
+                self.ui.call(self.results_view.set_partners, self.matcher.partner_map())
+        except Exception as e:
+            self.log(f"Product matching failed: {e}")
+
+    def open_live_csv(self):
+        path = f"price_comparison_live_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        try:
+            exporter = CsvExporter(path)
+        except OSError as e:
+            self.log(f"Could not open live CSV {path}: {e}")
+            return None
+        self.log(f"Writing results to {path} as they arrive")
+        return exporter
+
+    def open_result_url(self, url):
+        webbrowser.open(url)
+        self.log(f"Opened URL in browser: {url}")
 
     def start_ai_analysis(self):
-        if not HAS_GEMINI:
+        offline = self.model_var.get() == STUB_MODEL
+        if not HAS_GEMINI and not offline:
             messagebox.showerror("Gemini Not Available", "The 'google-generativeai' library is not installed.\nPlease run: pip install google-generativeai")
             return
-        if not self.api_key.get():
+        if not self.api_key.get() and not offline:
             messagebox.showerror("API Key Missing", "Please go to the Settings tab and enter your Gemini API key.")
             return
         ai_window = tk.Toplevel(self.root)
@@ -650,56 +521,58 @@ class MultiStoreScraperGUI:
         results_text = scrolledtext.ScrolledText(ai_window, height=20, width=80, wrap=tk.WORD, font=("Arial", 10))
         results_text.pack(padx=10, pady=10, fill='both', expand=True)
         results_text.insert('1.0', "Preparing data and contacting Gemini API... Please wait.")
-        threading.Thread(target=self.run_gemini_analysis_thread, args=(results_text,), daemon=True).start()
+        settings = (self.api_key.get(), self.model_var.get(), self.debug_var.get(), self.tokens_per_minute())
+        threading.Thread(target=self.run_gemini_analysis_thread, args=(results_text, settings), daemon=True).start()
+
+    def show_ai_text(self, widget, text):
+        if widget.winfo_exists():
+            widget.delete('1.0', tk.END)
+            widget.insert('1.0', text)
+
+    def append_ai_text(self, widget, text):
+        if widget.winfo_exists():
+            widget.insert(tk.END, text)
+            widget.see(tk.END)
+
+    def run_gemini_analysis_thread(self, results_text_widget, settings):
+        api_key, model_name, debug, tokens_per_minute = settings
+        streaming = [False]
+
+        def on_text(piece):
+            # The first piece replaces the progress message; the rest are appended as they arrive
+            self.ui.call(self.append_ai_text if streaming[0] else self.show_ai_text, results_text_widget, piece)
+            streaming[0] = True
+
+        def on_status(message):
+            self.ui.call(self.show_ai_text, results_text_widget, message)
 
-    def run_gemini_analysis_thread(self, results_text_widget):
-        model_name = ""
         try:
-            genai.configure(api_key=self.api_key.get())
-            model_name = self.model_var.get()
-            model = genai.GenerativeModel(model_name)
-            data_str = "Product Pricing Data from Woolworths and Coles:\n" + "-"*50 + "\n"
-            for item in self.scraped_data:
-                if 'error' not in item:
-                    _, promo_type = self.calculate_discount(item['price'], item['was_price'], item.get('promo_badge', ''))
-                    data_str += f"\nStore: {item['store']}\n"
-                    data_str += f"  Product: {item['name']}\n"
-                    data_str += f"  Current Price: ${item['price']}\n"
-                    if item['was_price'] != "Not applicable":
-                        data_str += f"  Was Price: ${item['was_price']}\n"
-                        data_str += f"  Promotion: {promo_type}\n"
-                    data_str += f"  Unit Price: {item['cup_price']}\n"
-            prompt = f"""You are a market analyst for a consumer goods company. Analyze the following competitive pricing data for detergent sheets from both Woolworths and Coles in Australia.
-**Data:**
-{data_str}
-**Your Task:**
-Provide a concise but insightful analysis covering these points:
-1. **Cross-Store Price Comparison:** Are there significant price differences for similar products between Woolworths and Coles? Which store appears to be cheaper overall for this product category?
-2. **Best Value:** Based on unit price (e.g., price per sheet/load), which specific products offer the best value for money, regardless of the store?
-3. **Promotional Strategy:** Compare the promotional activities between the two stores. Is one more aggressive with discounts?
-4. **Market Opportunities:** Identify any gaps in the market. For example, are there product sizes or types available at one store but not the other?
-5. **Strategic Recommendations:** Provide one key recommendation for a brand selling in both stores. How should they tailor their pricing or promotional strategy for each retailer?
-Structure your response with clear headings. Be professional and data-driven."""
-            if self.debug_var.get():
-                self.log("--- DEBUG: AI PROMPT ---\n" + prompt + "\n--- END AI PROMPT ---")
-            response = model.generate_content(prompt)
-            results_text_widget.delete('1.0', tk.END)
-            results_text_widget.insert('1.0', response.text)
+            pipeline = AnalysisPipeline(create_model(api_key, model_name), AnalysisCache(), tokens_per_minute=tokens_per_minute,
+                                        log=self.log, debug=debug)
+            pipeline.run(list(self.records), on_text, on_status)
         except Exception as e:
             error_message = f"An error occurred during AI analysis:\n\n{str(e)}"
-            results_text_widget.delete('1.0', tk.END)
-            results_text_widget.insert('1.0', error_message)
-            if self.debug_var.get():
+            self.ui.call(self.append_ai_text if streaming[0] else self.show_ai_text, results_text_widget,
+                         ("\n\n" if streaming[0] else "") + error_message)
+            if debug:
                 self.log(f"--- DEBUG: AI ANALYSIS FAILED ---\nModel used: {model_name}\nError Type: {type(e).__name__}\nFull Traceback:\n{traceback.format_exc()}--- END DEBUG ---")
 
+    def tokens_per_minute(self):
+        """The AI token budget setting, falling back to the default if the box holds no number"""
+        try:
+            return max(0, self.tokens_per_minute_var.get())
+        except tk.TclError:
+            return TOKENS_PER_MINUTE
+
     def save_settings(self):
-        key, model = self.api_key.get().strip(), self.model_var.get()
-        if not key:
+        key, model, webhook = self.api_key.get().strip(), self.model_var.get(), self.webhook_var.get().strip()
+        if not key and not webhook:
             messagebox.showwarning("Empty Key", "API key field is empty.")
             return
         try:
             with open("config.json", "w") as f:
-                json.dump({"api_key": key, "model_name": model}, f, indent=4)
+                json.dump({"api_key": key, "model_name": model, "webhook_url": webhook,
+                           "tokens_per_minute": self.tokens_per_minute()}, f, indent=4)
             self.log("Settings saved successfully.")
             messagebox.showinfo("Success", "Settings saved successfully.")
         except Exception as e:
@@ -713,22 +586,42 @@ Structure your response with clear headings. Be professional and data-driven."""
                     self.api_key.set(settings.get("api_key", ""))
                     saved_model = settings.get("model_name", self.available_models[0])
                     self.model_var.set(saved_model if saved_model in self.available_models else self.available_models[0])
+                    self.webhook_var.set(settings.get("webhook_url", ""))
+                    self.tokens_per_minute_var.set(settings.get("tokens_per_minute", TOKENS_PER_MINUTE))
                     if self.api_key.get(): self.log("Loaded settings from config.json")
         except Exception as e:
             self.log(f"Could not load settings: {e}")
             self.api_key.set("")
             self.model_var.set(self.available_models[0])
 
-    def start_scraping(self):
+    def start_scraping(self, resume=False):
         if self.is_scraping: return
         self.is_scraping = True
-        for button in [self.scrape_button, self.csv_button, self.excel_button, self.ai_button]:
+        for button in [self.scrape_button, self.resume_button, self.csv_button, self.excel_button, self.parquet_button, self.changes_button, self.ai_button]:
             button.config(state='disabled')
         self.scrape_button.config(text="Scraping...")
-        threading.Thread(target=self.scraping_thread, daemon=True).start()
+        settings = {
+            'urls': self.catalogue.urls(),
+            'stores': [store for store, var in (('Woolworths', self.scrape_woolworths), ('Coles', self.scrape_coles)) if var.get()],
+            'smart_refresh': self.smart_refresh_var.get(),
+            'live_csv': self.live_csv_var.get(),
+            'webhook': self.webhook_var.get().strip(),
+            'scraper': dict(
+                headless=self.headless_var.get(),
+                archive=self.page_archive() if self.debug_var.get() or self.archive_var.get() else None,
+                block_resources=self.block_resources_var.get(),
+                fast_path=self.fast_path_var.get(),
+                pool_size=self.pool_size_var.get(),
+                store_limits={'Woolworths': self.woolworths_limit_var.get(), 'Coles': self.coles_limit_var.get()}
+            ),
+        }
+        threading.Thread(target=self.scraping_thread, args=(settings, resume), daemon=True).start()
+
+    def resume_scraping(self):
+        self.start_scraping(resume=True)
 
     def export_csv(self):
-        if not self.scraped_data: return
+        if not self.records: return
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = filedialog.asksaveasfilename(
             defaultextension=".csv",
@@ -737,17 +630,7 @@ Structure your response with clear headings. Be professional and data-driven."""
         )
         if not filename: return
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                fieldnames = ['Store', 'Product Name', 'Current Price', 'Was Price', 'Unit Price', 'Promotion', 'URL']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                for item in (d for d in self.scraped_data if 'error' not in d):
-                    _, promo_type = self.calculate_discount(item['price'], item['was_price'], item.get('promo_badge', ''))
-                    writer.writerow({
-                        'Store': item['store'], 'Product Name': item['name'], 'Current Price': item['price'], 
-                        'Was Price': item['was_price'], 'Unit Price': item['cup_price'], 
-                        'Promotion': promo_type, 'URL': item['url']
-                    })
+            write_csv(filename, self.records)
             self.log(f"CSV exported to {filename}")
             messagebox.showinfo("Success", f"Data exported to {filename}")
         except Exception as e: 
@@ -757,7 +640,7 @@ Structure your response with clear headings. Be professional and data-driven."""
         if not HAS_EXCEL:
             messagebox.showwarning("Excel Not Available", "Please install openpyxl:\npip install openpyxl")
             return
-        if not self.scraped_data: return
+        if not self.records: return
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = filedialog.asksaveasfilename(
             defaultextension=".xlsx",
@@ -766,32 +649,46 @@ Structure your response with clear headings. Be professional and data-driven."""
         )
         if not filename: return
         try:
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Price Comparison"
-            ws.append(['Store', 'Product Name', 'Current Price', 'Was Price', 'Unit Price', 'Promotion', 'URL'])
-            header_font, header_fill = Font(bold=True, color="FFFFFF"), PatternFill(start_color="366092", fill_type="solid")
-            for cell in ws[1]: cell.font, cell.fill = header_font, header_fill
-            half_price_fill, special_fill = PatternFill(start_color="FFC7CE", fill_type="solid"), PatternFill(start_color="FFEB9C", fill_type="solid")
-            for item in (d for d in self.scraped_data if 'error' not in d):
-                _, promo_type = self.calculate_discount(item['price'], item['was_price'], item.get('promo_badge', ''))
-                try: price = float(item['price']) 
-                except (ValueError, TypeError): price = ""
-                try: was_price = float(item['was_price'])
-                except (ValueError, TypeError): was_price = ""
-                ws.append([item['store'], item['name'], price, was_price, item['cup_price'], promo_type, item['url']])
-                if "HALF PRICE" in str(promo_type).upper():
-                    for cell in ws[ws.max_row]: cell.fill = half_price_fill
-                elif promo_type:
-                    for cell in ws[ws.max_row]: cell.fill = special_fill
-            for column in ws.columns:
-                max_length = max((len(str(cell.value)) for cell in column if cell.value is not None), default=0)
-                ws.column_dimensions[column[0].column_letter].width = min((max_length + 2), 60)
-            wb.save(filename)
+            # Widths were tracked as the results came in, so the sheet can stream straight out
+            write_xlsx(filename, self.records, self.export_widths.widths(), self.matcher.comparisons(self.records), self.changes)
             self.log(f"Excel file exported to {filename}")
             messagebox.showinfo("Success", f"Data exported to {filename}")
         except Exception as e: messagebox.showerror("Error", f"Failed to export Excel: {e}")
 
+    def export_parquet(self):
+        if not HAS_ARROW:
+            messagebox.showwarning("Parquet Not Available", "Please install pyarrow:\npip install pyarrow")
+            return
+        if not self.records: return
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".parquet",
+            filetypes=[("Parquet files", "*.parquet"), ("Arrow files", "*.arrow")],
+            initialfile=f"price_comparison_{timestamp}.parquet"
+        )
+        if not filename: return
+        try:
+            export_columnar(filename, self.records)
+            self.log(f"Parquet file exported to {filename}")
+            messagebox.showinfo("Success", f"Data exported to {filename}")
+        except Exception as e: messagebox.showerror("Error", f"Failed to export Parquet: {e}")
+
+    def export_changes(self):
+        if not self.changes: return
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv")],
+            initialfile=f"price_changes_{timestamp}.csv"
+        )
+        if not filename: return
+        try:
+            write_changes_csv(filename, self.changes)
+            self.log(f"{len(self.changes)} changes exported to {filename}")
+            messagebox.showinfo("Success", f"Changes exported to {filename}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export changes: {e}")
+
 def main():
     root = tk.Tk()
     app = MultiStoreScraperGUI(root)
@@ -799,3 +696,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+
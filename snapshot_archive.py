@@ -0,0 +1,414 @@
+"""Compressed, content-addressed archive of scraped product pages, with offline replay.
+
+Every archived page is compressed (zstd when the zstandard package is
+installed, gzip otherwise) and stored once under the SHA-256 of its HTML, so a
+page that hasn't changed since the last scrape costs one index row and no new
+blob. The scrape thread only hands the HTML over; hashing, compression and the
+index writes happen on a background writer thread.
+
+    snapshots/objects/3f/3fa1...e2.html.zst
+    snapshots/index.db        (url, product key, store, time -> blob)
+
+Replay re-runs the Woolworths/Coles extractors over archived pages without a
+browser: the same field selectors, matched against the stored HTML by a small
+static CSS matcher, with the embedded-JSON parser as a fallback. An archived
+listing page replays as every product tile on it. After a
+selector fix, the history of thousands of pages can be rebuilt in seconds:
+
+    python snapshot_archive.py replay --since 30 -o replayed.jsonl
+    python snapshot_archive.py replay --history rebuilt_history.db
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from scraper_core import (COLES_FIELDS, LISTINGS, WOOLWORTHS_FIELDS, FieldStats, coles_result, detect_store,
+                          is_listing_url, listing_page_url, parse_embedded_listing, parse_embedded_product,
+                          product_key, woolworths_result)
+
+# Try to import optional libraries
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+ARCHIVE_DIR = 'snapshots'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    product_key TEXT,
+    store TEXT,
+    captured_at REAL NOT NULL,
+    digest TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_product_time ON snapshots (product_key, captured_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_store_time ON snapshots (store, captured_at);
+"""
+
+CODECS = {'gzip': '.html.gz', 'zstd': '.html.zst'}
+
+def compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+class SnapshotArchive:
+    """Deduplicating page store with a background writer and a SQLite index"""
+
+    def __init__(self, root=ARCHIVE_DIR, codec=None, queue_size=256, batch_size=100, log=print):
+        self.root = root
+        self.codec = codec or ('zstd' if HAS_ZSTD else 'gzip')
+        self.batch_size = batch_size
+        self.log = log
+        self.stored = 0   # new blobs written
+        self.deduped = 0  # snapshots whose HTML was already stored
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        # Bounded so a stalled disk slows the scrape down instead of filling memory
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+
+    def add(self, url, html, store=None, source='browser', captured_at=None):
+        """Queue a page for archiving; returns immediately"""
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name='snapshot-writer', daemon=True)
+                    self._writer.start()
+        self._queue.put((url, store or detect_store(url), source, captured_at or time.time(), html))
+
+    def flush(self):
+        """Wait until every queued page is on disk"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._lock:
+            self.conn.close()
+
+    def _blob_path(self, digest, codec):
+        return os.path.join(self.root, 'objects', digest[:2], digest + CODECS[codec])
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            # Drain whatever else is waiting so index rows go in one transaction
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # handled after this batch
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                self.log(f"Could not archive {len(batch)} pages: {e}")
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch):
+        rows = []
+        for url, store, source, captured_at, html in batch:
+            data = html.encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()
+            path = self._blob_path(digest, self.codec)
+            if os.path.exists(path):
+                self.deduped += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.tmp"
+                with open(tmp, 'wb') as f:
+                    f.write(compress(self.codec, data))
+                os.replace(tmp, path)
+                self.stored += 1
+            rows.append((url, product_key(url), store, captured_at, digest, self.codec, len(data), source))
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO snapshots (url, product_key, store, captured_at, digest, codec, size, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def read(self, digest, codec):
+        with open(self._blob_path(digest, codec), 'rb') as f:
+            return decompress(codec, f.read()).decode('utf-8')
+
+    def snapshots(self, store=None, since=None, until=None, latest_only=False):
+        """Index rows oldest first, optionally for one store, a time range, or only each product's latest page"""
+        where, params = ["captured_at >= ?", "captured_at <= ?"], [since or 0, until or time.time()]
+        if store:
+            where.append("store = ?")
+            params.append(store)
+        sql = f"SELECT * FROM snapshots WHERE {' AND '.join(where)}"
+        if latest_only:
+            sql = (f"SELECT * FROM ({sql}) AS s WHERE captured_at = "
+                   "(SELECT MAX(captured_at) FROM snapshots WHERE product_key = s.product_key)")
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql + " ORDER BY captured_at, id", params)]
+
+    def summary(self):
+        return f"Snapshot archive: {self.stored} new pages stored, {self.deduped} unchanged pages deduplicated"
+
+VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'))
+HIDDEN_TAGS = frozenset(('script', 'style', 'template', 'noscript', 'head'))
+SIMPLE_SELECTOR_RE = re.compile(r'([a-zA-Z][\w-]*)?((?:\.[\w-]+|\[[\w-]+(?:[*^$]?="[^"]*")?\])*)$')
+PART_RE = re.compile(r'\.([\w-]+)|\[([\w-]+)(?:([*^$]?=)"([^"]*)")?\]')
+
+class Element:
+    __slots__ = ('tag', 'attrs', 'classes', 'children', 'parent')
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = {name: value or '' for name, value in attrs}
+        self.classes = self.attrs.get('class', '').split()
+        self.children = []
+        self.parent = parent
+
+    def iter(self):
+        """Descendant elements in document order"""
+        stack = [child for child in reversed(self.children) if isinstance(child, Element)]
+        while stack:
+            element = stack.pop()
+            yield element
+            stack.extend(child for child in reversed(element.children) if isinstance(child, Element))
+
+    def text(self):
+        """Approximation of innerText: visible text with whitespace collapsed"""
+        parts, stack = [], [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            elif node.tag not in HIDDEN_TAGS:
+                stack.extend(reversed(node.children))
+        return ' '.join(' '.join(parts).split())
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.document = Element('#document', [], None)
+        self.current = self.document
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, attrs, self.current)
+        self.current.children.append(element)
+        if tag not in VOID_TAGS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Element(tag, attrs, self.current))
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open element; stray end tags are ignored like a browser would
+        node = self.current
+        while node is not self.document and node.tag != tag:
+            node = node.parent
+        if node is not self.document:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+def parse_html(html):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.document
+
+def compile_selector(selector):
+    """Compile a comma list of simple selectors (tag, .class, [attr], [attr="v"], [attr*="v"], ...) into a predicate"""
+    alternatives = []
+    for part in selector.split(','):
+        match = SIMPLE_SELECTOR_RE.match(part.strip())
+        if not match:
+            raise ValueError(f"Unsupported selector for offline replay: {part.strip()!r}")
+        tag, conditions = match.group(1), []
+        for cls, name, op, value in PART_RE.findall(match.group(2)):
+            conditions.append(('class', None, cls) if cls else (name, op, value))
+        alternatives.append((tag.lower() if tag else None, conditions))
+
+    def matches(element):
+        for tag, conditions in alternatives:
+            if tag and element.tag != tag:
+                continue
+            for name, op, value in conditions:
+                if name == 'class' and op is None:
+                    if value not in element.classes:
+                        break
+                    continue
+                actual = element.attrs.get(name)
+                if actual is None or (op == '=' and actual != value) or (op == '*=' and value not in actual) or \
+                        (op == '^=' and not actual.startswith(value)) or (op == '$=' and not actual.endswith(value)):
+                    break
+            else:
+                return True
+        return False
+    return matches
+
+def query_selector(root, selector):
+    predicate = compile_selector(selector)
+    return next((element for element in root.iter() if predicate(element)), None)
+
+def extract_static_fields(html, spec):
+    """EXTRACT_FIELDS_JS over stored HTML: the field texts, or None if the ready selector doesn't match"""
+    document = parse_html(html)
+    root = query_selector(document, spec['root']) if spec['root'] else document
+    if root is None or query_selector(root, spec['ready']) is None:
+        return None
+    fields = {}
+    for name, selector in spec['fields'].items():
+        element = query_selector(root, selector)
+        fields[name] = element.text() if element is not None else None
+    return fields
+
+EXTRACTORS = {'Woolworths': (WOOLWORTHS_FIELDS, woolworths_result), 'Coles': (COLES_FIELDS, coles_result)}
+
+def extract_snapshot(url, html, store=None, field_stats=None):
+    """Scrape result for an archived page, or an error dict if neither the selectors nor the embedded JSON match"""
+    store = store or detect_store(url)
+    if store not in EXTRACTORS:
+        return {'error': f"No extractor for {store}", 'url': url}
+    spec, to_result = EXTRACTORS[store]
+    fields = extract_static_fields(html, spec)
+    if fields is not None:
+        if field_stats:
+            field_stats.record(store, fields)
+        return to_result(fields, url)
+    data = parse_embedded_product(store, html)
+    if data is not None:
+        return {'store': store, 'name': data['name'], 'price': data['price'], 'was_price': data['was_price'],
+                'cup_price': data['cup_price'], 'url': url, 'promo_badge': data['promo_badge']}
+    return {'error': "Product fields not found in snapshot", 'url': url}
+
+def extract_static_listing(html, spec, page_url):
+    """LISTING_JS over stored HTML: the field texts of every product tile, with absolute product URLs"""
+    document = parse_html(html)
+    is_tile, is_link = compile_selector(spec['tile']), compile_selector(spec['link'])
+    products, seen = [], set()
+    for tile in (element for element in document.iter() if is_tile(element)):
+        link = next((element for element in tile.iter() if is_link(element)), None)
+        if link is None:
+            continue
+        url = urljoin(page_url, link.attrs.get('href', '')).split('?', 1)[0]
+        if url in seen:
+            continue
+        seen.add(url)
+        item = {'url': url}
+        for name, selector in spec['fields'].items():
+            element = query_selector(tile, selector)
+            item[name] = element.text() if element is not None else None
+        products.append(item)
+    return products
+
+def extract_listing_snapshot(url, html, store=None, field_stats=None):
+    """Scrape results for every product on an archived listing page, or [error dict] if there are none"""
+    store = store or detect_store(url)
+    if store not in LISTINGS:
+        return [{'error': f"No extractor for {store}", 'url': url}]
+    spec, to_result = LISTINGS[store]
+    listing = listing_page_url(url, 1)
+    results = []
+    for fields in extract_static_listing(html, spec, url):
+        if field_stats:
+            field_stats.record(f"{store} listings", {name: fields[name] for name in spec['fields']})
+        results.append(dict(to_result(fields, fields['url']), listing=listing))
+    return results or parse_embedded_listing(store, html, listing) or [{'error': "No product tiles found in snapshot", 'url': url}]
+
+def replay(archive, store=None, since=None, until=None, latest_only=False, field_stats=None):
+    """Yield (snapshot row, result) for archived pages, re-extracted offline"""
+    for row in archive.snapshots(store, since, until, latest_only):
+        try:
+            html = archive.read(row['digest'], row['codec'])
+        except OSError as e:
+            yield row, {'error': f"Snapshot missing: {e}", 'url': row['url']}
+            continue
+        if is_listing_url(row['url']):
+            for data in extract_listing_snapshot(row['url'], html, row['store'], field_stats):
+                yield row, data
+        else:
+            yield row, extract_snapshot(row['url'], html, row['store'], field_stats)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the page archive or re-extract products from it offline")
+    parser.add_argument('command', choices=('replay', 'stats'))
+    parser.add_argument('--archive', default=ARCHIVE_DIR, help=f"archive directory (default: {ARCHIVE_DIR})")
+    parser.add_argument('--store', choices=('woolworths', 'coles'), help="only this store")
+    parser.add_argument('--since', type=float, help="only pages archived in the last N days")
+    parser.add_argument('--latest', action='store_true', help="only the newest page of each product")
+    parser.add_argument('-o', '--output', default='-', help="JSONL output for replay, '-' for stdout (default)")
+    parser.add_argument('--history', help="also record replayed results, at their original times, in this price-history database")
+    args = parser.parse_args(argv)
+    log = lambda message: print(message, file=sys.stderr, flush=True)
+    archive = SnapshotArchive(args.archive, log=log)
+    store = {'woolworths': 'Woolworths', 'coles': 'Coles'}.get(args.store)
+    since = time.time() - args.since * 86400 if args.since else None
+    try:
+        if args.command == 'stats':
+            rows = archive.snapshots(store, since)
+            blobs = {(row['digest'], row['codec']) for row in rows}
+            stored = sum(os.path.getsize(archive._blob_path(*blob)) for blob in blobs if os.path.exists(archive._blob_path(*blob)))
+            raw = sum(row['size'] for row in rows)
+            print(f"{len(rows)} snapshots of {len({row['product_key'] for row in rows})} products, {len(blobs)} distinct pages; "
+                  f"{raw / 1e6:.1f} MB of HTML stored in {stored / 1e6:.1f} MB")
+            return 0
+        history = None
+        if args.history:
+            from price_history import PriceHistory
+            history = PriceHistory(args.history)
+        out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+        stats, started, count, failed = FieldStats(), time.monotonic(), 0, 0
+        try:
+            for row, data in replay(archive, store, since, latest_only=args.latest, field_stats=stats):
+                count += 1
+                failed += 'error' in data
+                out.write(json.dumps(dict(data, captured_at=row['captured_at']), ensure_ascii=False) + '\n')
+                if history:
+                    history.add(data, scraped_at=row['captured_at'])
+        finally:
+            if out is not sys.stdout:
+                out.close()
+            if history:
+                history.close()
+        elapsed = time.monotonic() - started
+        log(f"Replayed {count} snapshots in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f}/s), {failed} without product fields")
+        for line in stats.report():
+            log(line)
+        return 0 if count and not failed else 1
+    finally:
+        archive.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import time
+from ai_analysis import (AnalysisCache, AnalysisPipeline, StubModel, TokenBudget, TOKENS_PER_MINUTE, chunk_records,
+                         estimate_tokens, format_record)
+from price_records import normalize
+
+def records(count):
+    result = []
+    for n in range(count):
+        for store, url in (('Woolworths', 'https://www.woolworths.com.au/shop/productdetails/%d/sheets'),
+                           ('Coles', 'https://www.coles.com.au/product/sheets-%d')):
+            result.append(normalize({'store': store, 'name': f"{store} Laundry Sheets {n} Pack", 'price': f"{5 + n}.00",
+                                     'was_price': f"{10 + n}.00" if n % 2 else "Not applicable", 'cup_price': "$0.30 / 1EA",
+                                     'url': url % (1000 + n), 'promo_badge': "1/2 Price" if n % 2 else ""}))
+    return result
+
+def pipeline(model, cache=None):
+    # Small budgets so a handful of products takes the map-reduce path
+    return AnalysisPipeline(model, cache=cache, chunk_tokens=120, single_tokens=300, concurrency=2, log=lambda message: None)
+
+def run(pipeline, data):
+    pieces = []
+    return pipeline.run(data, pieces.append), ''.join(pieces)
+
+def test_chunks_are_split_by_store_and_stay_under_budget():
+    data = records(10)
+    chunks = chunk_records(data, 120)
+    assert [store for store, _ in chunks] == sorted(store for store, _ in chunks)
+    for store, blocks in chunks:
+        assert all(block.startswith(f"Store: {store}\n") for block in blocks)
+        assert len(blocks) == 1 or sum(estimate_tokens(block) for block in blocks) <= 120
+    assert sorted(block for _, blocks in chunks for block in blocks) == sorted(format_record(record) for record in data)
+
+def test_small_datasets_go_out_as_one_prompt():
+    model = StubModel()
+    answer, streamed = run(pipeline(model), records(1))
+    assert model.calls == 1
+    assert answer == streamed
+    assert "2 products from Coles, Woolworths, 0 summaries" in answer
+
+def test_large_datasets_are_summarised_then_reduced():
+    model = StubModel()
+    data = records(10)
+    answer, streamed = run(pipeline(model), data)
+    chunks = len(chunk_records(data, 120))
+    assert chunks > 2
+    assert model.calls == chunks + 1
+    assert answer == streamed
+    # The reduce prompt carries one summary per chunk and no raw products
+    assert f"0 products, {chunks} summaries." in answer
+
+def test_cached_answers_are_reused(tmp_path):
+    data = records(10)
+    first = StubModel()
+    answer, _ = run(pipeline(first, AnalysisCache(str(tmp_path))), data)
+    second = StubModel()
+    again, streamed = run(pipeline(second, AnalysisCache(str(tmp_path))), data)
+    assert second.calls == 0
+    assert again == streamed == answer
+
+def test_only_changed_chunks_are_summarised_again(tmp_path):
+    data = records(10)
+    run(pipeline(StubModel(), AnalysisCache(str(tmp_path))), data)
+    data[-1] = data[-1]._replace(price_text="99.00")
+    model = StubModel()
+    run(pipeline(model, AnalysisCache(str(tmp_path))), data)
+    # Only the chunk holding the changed product goes out; the stub's summary of it
+    # comes back the same, so the reduce prompt is unchanged and served from the cache
+    assert model.calls == 1
+
+def test_token_budget_is_on_by_default():
+    assert AnalysisPipeline(StubModel()).budget.tokens_per_minute == TOKENS_PER_MINUTE > 0
+
+def test_token_budget_holds_prompts_back_until_they_fit():
+    budget = TokenBudget(100, window=0.2)
+    budget.acquire(60)
+    started = time.monotonic()
+    budget.acquire(60)
+    assert time.monotonic() - started >= 0.15
@@ -0,0 +1,69 @@
+import time
+from scraper_core import BrowserService, SessionHooks
+
+class FakeBrowser:
+    # How long the health check takes, like a round trip to a real browser
+    check_seconds = 0.0
+
+    def is_connected(self):
+        time.sleep(self.check_seconds)
+        return True
+
+class FakePage:
+    def is_closed(self):
+        return False
+
+class FakePlaywright:
+    def stop(self):
+        pass
+
+class Client:
+    """One scraper's side of the service: records the sessions it opened, closed and saved"""
+
+    def __init__(self):
+        self.opened, self.closed, self.saved, self.lines = [], [], [], []
+        self.hooks = SessionHooks(self.open_session, self.close_session, self.save_state, self.lines.append)
+
+    def open_session(self, playwright, worker_id):
+        session = (FakeBrowser(), object(), FakePage())
+        self.opened.append(session)
+        return session
+
+    def close_session(self, browser, context, page):
+        self.closed.append(page)
+
+    def save_state(self, context):
+        self.saved.append(context)
+
+def page_for(service, client, config=('headless', True)):
+    worker = service.acquire(1, config, client.hooks)[0]
+    worker._playwright = worker._playwright or FakePlaywright()  # no real browser needed
+    return worker.submit(lambda worker: (worker.page(), worker.checkpoint())[0]).result(timeout=5)
+
+def test_each_scraper_gets_sessions_built_with_its_own_hooks():
+    service = BrowserService()
+    first, second = Client(), Client()
+    try:
+        page = page_for(service, first)
+        assert page_for(service, first) is page  # warm reuse for the same scraper
+        assert len(first.opened) == 1 and len(first.saved) == 2
+
+        other = page_for(service, second)
+        assert other is not page
+        assert first.closed == [page]  # the first scraper's session is closed with its own hooks
+        assert len(second.opened) == 1 and len(second.saved) == 1 and len(first.saved) == 2
+    finally:
+        service.shutdown()
+    assert second.closed == [other]
+
+def test_warm_starts_record_how_long_the_hand_out_took():
+    service, client = BrowserService(), Client()
+    try:
+        page_for(service, client)
+        FakeBrowser.check_seconds = 0.05
+        page_for(service, client)
+    finally:
+        FakeBrowser.check_seconds = 0.0
+        service.shutdown()
+    assert len(service.starts[False]) == 1
+    assert service.starts[True] and service.starts[True][0] >= 0.05
@@ -0,0 +1,74 @@
+import json
+import pytest
+from change_detection import ChangeDetector, JsonlSink, describe
+
+LISTING = 'https://www.coles.com.au/browse/household/laundry/laundry-sheets'
+URL = 'https://www.coles.com.au/product/sheets-%d'
+
+def result(n, price="8.00", was_price="Not applicable", promo_badge="", listing=None):
+    data = {'store': 'Coles', 'name': f"Sheets {n}", 'price': price, 'was_price': was_price,
+            'cup_price': "$0.32 per 1ea", 'url': URL % n, 'promo_badge': promo_badge}
+    if listing:
+        data['listing'] = listing
+    return data
+
+def quiet(message):
+    pass
+
+def detector_at(tmp_path, sinks=()):
+    detector = ChangeDetector(str(tmp_path / 'snapshot.json'), sinks=sinks, log=quiet)
+    detector.load()
+    return detector
+
+def run(tmp_path, results, sinks=()):
+    """One run against the snapshot on disk; returns (changes from observe, products gone from listings)"""
+    detector = detector_at(tmp_path, sinks)
+    detector.begin()
+    changes = [change for change in map(detector.observe, results) if change]
+    return changes, detector.finish()
+
+@pytest.mark.parametrize('before, after, kind, description', [
+    (result(1, "8.00"), result(1, "6.00"), 'price_down', "Price down $8.00 -> $6.00"),
+    (result(1, "8.00"), result(1, "9.00"), 'price_up', "Price up $8.00 -> $9.00"),
+    (result(1, "16.00"), result(1, "8.00", "16.00"), 'promo_started', "Promotion started: HALF PRICE!"),
+    (result(1, "8.00", "16.00"), result(1, "16.00"), 'promo_ended', "Promotion ended"),
+    (result(1, "12.00", "16.00"), result(1, "12.00", "15.00", "Special"), 'promo_changed', "Promotion changed: 20% OFF"),
+    (result(1, "8.00"), result(1, "Not found"), 'unavailable', "Unavailable"),
+    (result(1, "Not found"), result(1, "8.00"), 'back', "Available again at $8.00"),
+])
+def test_changes_are_classified(tmp_path, before, after, kind, description):
+    run(tmp_path, [before])
+    (change,), _ = run(tmp_path, [after])
+    assert change.kind == kind and describe(change) == description
+
+def test_first_run_only_sets_the_baseline(tmp_path):
+    assert run(tmp_path, [result(1), result(2)]) == ([], [])
+    assert run(tmp_path, [result(1), result(2)]) == ([], [])
+
+def test_errors_and_cached_results_never_read_as_a_change(tmp_path):
+    run(tmp_path, [result(1)])
+    changes, gone = run(tmp_path, [{'error': "Timeout", 'url': URL % 1}, dict(result(1, "1.00"), cached_at=1)])
+    assert changes == [] and gone == []
+
+def test_product_that_dropped_off_its_listing_is_unavailable(tmp_path):
+    run(tmp_path, [result(n, listing=LISTING) for n in (1, 2, 3)] + [result(4)])
+    changes, gone = run(tmp_path, [result(1, listing=LISTING), result(3, "7.00", listing=LISTING)])
+    assert [(c.kind, c.key) for c in changes] == [('price_down', 'coles:3')]
+    assert [(c.kind, c.key, c.old_price) for c in gone] == [('unavailable', 'coles:2', 8.0)]
+    # Product 4 was never on a listing, so not scraping it says nothing; product 2 is only reported once
+    assert run(tmp_path, [result(1, listing=LISTING), result(3, "7.00", listing=LISTING)]) == ([], [])
+    (back,), _ = run(tmp_path, [result(2, listing=LISTING)])
+    assert back.kind == 'back'
+
+def test_listing_that_was_not_scraped_this_run_loses_nothing(tmp_path):
+    run(tmp_path, [result(1, listing=LISTING)])
+    assert run(tmp_path, [result(9)]) == ([], [])
+
+def test_changes_go_out_to_the_sinks(tmp_path):
+    path = tmp_path / 'changes.jsonl'
+    run(tmp_path, [result(1), result(2)])
+    run(tmp_path, [result(1, "6.00"), result(2)], sinks=[JsonlSink(str(path))])
+    line, = path.read_text(encoding='utf-8').splitlines()
+    entry = json.loads(line)
+    assert (entry['kind'], entry['key'], entry['description']) == ('price_down', 'coles:1', "Price down $8.00 -> $6.00")
+    assert 'detected_at' in entry
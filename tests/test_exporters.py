@@ -0,0 +1,72 @@
+import csv
+import pytest
+from change_detection import Change
+from exporters import HEADERS, CHANGE_HEADERS, ColumnWidths, CsvExporter, write_changes_csv, write_csv, write_xlsx, export_columnar
+from price_records import normalize
+
+def record(name, price, was_price="Not applicable", promo_badge="", store='Coles', cup_price="$0.32 per 1ea"):
+    return normalize({'store': store, 'name': name, 'price': price, 'was_price': was_price, 'cup_price': cup_price,
+                      'url': f"https://www.coles.com.au/product/{name.lower().replace(' ', '-')}-1", 'promo_badge': promo_badge})
+
+RECORDS = [record("Magic Leaves", "8.00", "16.00", "1/2 Price"), record("Ecostore Sheets", "14.00"),
+           record("Gone Sheets", "Not found")]
+
+def rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+def test_csv_rows_follow_the_headers(tmp_path):
+    path = str(tmp_path / 'prices.csv')
+    assert write_csv(path, RECORDS) == 3
+    header, half_price, plain, missing = rows(path)
+    assert tuple(header) == HEADERS
+    assert half_price[:6] == ['Coles', 'Magic Leaves', '8.00', '16.00', '$0.32 per 1ea', 'HALF PRICE!']
+    assert plain[3:6] == ['Not applicable', '$0.32 per 1ea', '']
+    assert missing[2] == 'Not found'
+
+def test_live_csv_appends_without_a_second_header(tmp_path):
+    path = str(tmp_path / 'live.csv')
+    exporter = CsvExporter(path)
+    exporter.write(RECORDS[0])
+    assert len(rows(path)) == 2  # flushed row by row, readable mid-run
+    exporter.close()
+    exporter = CsvExporter(path, append=True)
+    exporter.write(RECORDS[1])
+    exporter.close()
+    assert [row[1] for row in rows(path)] == ['Product Name', 'Magic Leaves', 'Ecostore Sheets']
+
+def test_changes_csv(tmp_path):
+    path = str(tmp_path / 'changes.csv')
+    change = Change('price_down', 'coles:1', 'Coles', "Magic Leaves", "https://www.coles.com.au/product/magic-leaves-1",
+                    16.0, 8.0, "", "HALF PRICE!")
+    write_changes_csv(path, [change])
+    write_changes_csv(path, [change], append=True)
+    header, first, second = rows(path)
+    assert tuple(header) == CHANGE_HEADERS
+    assert first == second == ['Price down', 'Coles', 'Magic Leaves', '16.0', '8.0', '', 'HALF PRICE!', change.url]
+
+def test_column_widths_track_the_longest_value_up_to_the_cap():
+    widths = ColumnWidths(('A', 'Bee'), cap=10, padding=2)
+    widths.update(('four', None))
+    widths.update(('a much longer value', 'x'))
+    assert widths.widths() == [10, 5]
+
+def test_xlsx_streams_typed_prices_with_promotion_highlights(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    path = str(tmp_path / 'prices.xlsx')
+    assert write_xlsx(path, RECORDS) == 3
+    sheet = openpyxl.load_workbook(path)['Price Comparison']
+    values = [[cell.value for cell in row] for row in sheet.iter_rows()]
+    assert tuple(values[0]) == HEADERS
+    assert values[1][2:4] == [8.0, 16.0]  # numbers, not display strings
+    assert values[3][2] is None  # no price becomes an empty cell
+    assert sheet['A2'].fill.start_color.rgb.endswith('FFC7CE') and sheet['A3'].fill.fill_type is None
+    assert sheet.column_dimensions['B'].width == len("Ecostore Sheets") + 2
+
+def test_parquet_round_trips_the_typed_columns(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'prices.parquet')
+    assert export_columnar(path, RECORDS, batch_size=2) == 3
+    table = pq.read_table(path)
+    assert table.column('price').to_pylist() == [8.0, 14.0, None]
+    assert table.column('unit').to_pylist() == ['ea', 'ea', 'ea']
@@ -0,0 +1,61 @@
+import time
+import pytest
+from fixture_server import FixtureServer
+from scraper_core import HttpFastPath, StoreRateLimiter, product_key
+
+RETAILER_HOSTS = ('www.woolworths.com.au', 'www.coles.com.au')
+
+@pytest.fixture(scope='module')
+def server():
+    with FixtureServer() as server:
+        yield server
+
+@pytest.fixture
+def fast_path(server):
+    return HttpFastPath(host_map={host: server.base_url for host in RETAILER_HOSTS}, log=lambda message: None)
+
+def test_woolworths_product(fast_path):
+    url = 'https://www.woolworths.com.au/shop/productdetails/897214/dr-beckmann-laundry-detergent-sheets-universal'
+    assert fast_path.scrape(url) == {
+        'store': 'Woolworths', 'name': 'Dr Beckmann Laundry Detergent Sheets Universal 25 Pack', 'price': '7.50',
+        'was_price': '15.00', 'cup_price': '$0.30 / 1EA', 'url': url, 'promo_badge': '1/2 Price'}
+
+def test_woolworths_product_without_promotion(fast_path):
+    data = fast_path.scrape('https://www.woolworths.com.au/shop/productdetails/160209/restor-concentrated-laundry-detergent-sheets-fresh-linen')
+    assert (data['price'], data['was_price'], data['promo_badge']) == ('12.00', 'Not applicable', '')
+
+def test_coles_product(fast_path):
+    url = 'https://www.coles.com.au/product/dr.-beckmann-magic-leaves-laundry-detergent-sheets-universal-25-pack-5452994'
+    assert fast_path.scrape(url) == {
+        'store': 'Coles', 'name': 'Dr. Beckmann Magic Leaves Laundry Detergent Sheets Universal | 25 pack', 'price': '8.00',
+        'was_price': '16.00', 'cup_price': '$0.32 per 1ea', 'url': url, 'promo_badge': '1/2 Price'}
+    assert fast_path.hits == 1
+
+def test_coles_listing_follows_pagination(fast_path):
+    listing = 'https://www.coles.com.au/browse/household/laundry/laundry-sheets'
+    products = fast_path.scrape(listing)
+    assert [product_key(data['url']) for data in products] == ['coles:5452994', 'coles:8924623', 'coles:8415795', 'coles:1066354']
+    assert all(data['listing'] == listing and data['price'] for data in products)
+
+def test_woolworths_listing(fast_path):
+    products = fast_path.scrape('https://www.woolworths.com.au/shop/browse/laundry/laundry-sheets')
+    assert [(product_key(data['url']), data['price']) for data in products] == [('woolworths:160209', '12.00'), ('woolworths:897214', '7.50')]
+
+def test_challenge_page_falls_back_to_the_browser(fast_path):
+    assert fast_path.scrape('https://www.coles.com.au/product/challenge') is None
+    assert fast_path.challenged['Coles'] == 1 and fast_path.fallbacks == 1
+
+def test_missing_page_falls_back_to_the_browser(fast_path):
+    assert fast_path.scrape('https://www.coles.com.au/product/not-captured-1111') is None
+    assert fast_path.hits == 0
+
+def test_listing_pages_keep_the_store_gap(fast_path):
+    gap = 0.2
+    limiter = StoreRateLimiter({'Coles': (gap, gap)}, log=lambda message: None)
+    fast_path.pace = limiter.pace
+    fetch, requested = fast_path.fetch, []
+    fast_path.fetch = lambda url: requested.append(time.monotonic()) or fetch(url)
+    limiter.take('Coles')  # the pool claims the first page's slot when it hands the listing out
+    assert len(fast_path.scrape('https://www.coles.com.au/browse/household/laundry/laundry-sheets')) == 4
+    assert len(requested) >= 2
+    assert all(later - earlier >= gap for earlier, later in zip(requested, requested[1:]))
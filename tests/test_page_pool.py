@@ -0,0 +1,141 @@
+import threading
+import time
+from concurrent.futures import Future
+from scraper_core import PagePool, StoreRateLimiter
+from metrics import Metrics
+
+class FakeWorker:
+    """Stands in for a BrowserWorker: runs jobs on a thread of its own and hands out a dummy page"""
+
+    def __init__(self, worker_id=0):
+        self.worker_id = worker_id
+
+    def submit(self, job):
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(job(self))
+            except Exception as e:
+                future.set_exception(e)
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def page(self):
+        return object()
+
+    def healthy(self):
+        return True
+
+    def recycle(self):
+        pass
+
+    def checkpoint(self):
+        pass
+
+class FakeService:
+    def acquire(self, count, config=None, hooks=None):
+        return [FakeWorker(i) for i in range(count)]
+
+COLES = 'https://www.coles.com.au/product/thing-%d'
+WOOLWORTHS = 'https://www.woolworths.com.au/shop/productdetails/%d/thing'
+
+def make_pool(**options):
+    limiter = StoreRateLimiter({'Woolworths': (0, 0), 'Coles': (0, 0)}, log=lambda message: None)
+    return PagePool(FakeService(), limiter=limiter, metrics=Metrics(), log=lambda message: None, **options)
+
+def run_in_thread(pool, urls, scrape, timeout=5):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(pool.run(urls, scrape)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "page pool hung"
+    return results[0]
+
+def test_half_open_trial_failing_with_a_product_error_does_not_hang():
+    def scrape(page, url):
+        if url.endswith('-1'):
+            raise TimeoutError("Timeout 30000ms exceeded")  # trips the breaker
+        if url.endswith('-2'):
+            raise ValueError("could not parse the price")   # the trial: not the store's fault
+        return {'store': 'Coles', 'name': 'x', 'price': '1.00', 'url': url}
+
+    pool = make_pool(breaker_threshold=1, breaker_cooldown=0.05)
+    results = run_in_thread(pool, [COLES % n for n in (1, 2, 3)], scrape)
+    assert [r.get('kind') for r in results] == ['timeout', 'error', None]
+    assert pool.breakers['Coles'].state == 'closed'
+
+def test_retries_recover_flaky_urls():
+    tries = {}
+
+    def scrape(page, url):
+        tries[url] = tries.get(url, 0) + 1
+        if tries[url] == 1 and url.endswith('-1'):
+            raise TimeoutError("Timeout 30000ms exceeded")
+        return {'store': 'Coles', 'name': 'x', 'price': '1.00', 'url': url}
+
+    from retry_policy import RetryPolicy
+    pool = make_pool(retry=RetryPolicy(base_delay=0.01, jitter=0), breaker_threshold=5)
+    results = run_in_thread(pool, [COLES % n for n in (1, 2)], scrape)
+    assert all('error' not in r for r in results)
+    assert tries[COLES % 1] == 2
+
+def test_politeness_gap_holds_between_runs():
+    # A worker runs one pool per leased batch; the limiter it reuses must keep the gap across them
+    limiter = StoreRateLimiter({'Coles': (0.3, 0.3)}, log=lambda message: None)
+    pool = PagePool(FakeService(), limiter=limiter, metrics=Metrics(), log=lambda message: None)
+    scrape = lambda page, url: {'store': 'Coles', 'name': 'x', 'price': '1.00', 'url': url}
+    run_in_thread(pool, [COLES % 1], scrape)
+    started = time.monotonic()
+    run_in_thread(pool, [COLES % 2], scrape)
+    assert time.monotonic() - started >= 0.25
+
+def test_each_politeness_wait_is_logged_and_measured_once():
+    lines = []
+    limiter = StoreRateLimiter({'Woolworths': (0.3, 0.3)}, log=lambda message: None)
+    metrics = Metrics()
+    pool = PagePool(FakeService(), size=2, store_limits={'Woolworths': 2}, limiter=limiter, metrics=metrics, log=lines.append)
+
+    def scrape(page, url):
+        time.sleep(0.05)  # finishing a URL wakes the other worker in the middle of its wait
+        return {'store': 'Woolworths', 'name': 'x', 'price': '1.00', 'url': url}
+
+    run_in_thread(pool, [WOOLWORTHS % n for n in (1, 2, 3)], scrape)
+    waits = [line for line in lines if 'Waiting' in line]
+    assert len(waits) == 2  # one gap before each URL after the first
+    assert 0 < metrics.histogram('sleep', 'Woolworths').count <= 4  # one sample per worker per wait at most
+    assert 0.5 <= limiter.slept
+
+class FakeFastPath:
+    """Falls back to the browser for every URL; outcome is None when it never sent a request"""
+
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.requested = []
+
+    def scrape(self, url):
+        self.requested.append(time.monotonic())
+        return None
+
+    def last_outcome(self):
+        return self.outcome
+
+def test_browser_fallback_waits_out_the_gap_after_the_http_attempt():
+    fast_path, fetched = FakeFastPath('ok'), []
+    limiter = StoreRateLimiter({'Coles': (0.2, 0.2)}, log=lambda message: None)
+    pool = PagePool(FakeService(), limiter=limiter, fast_path=fast_path, metrics=Metrics(), log=lambda message: None)
+
+    def scrape(page, url):
+        fetched.append(time.monotonic())
+        return {'store': 'Coles', 'name': 'x', 'price': '1.00', 'url': url}
+
+    run_in_thread(pool, [COLES % 1], scrape)
+    assert fetched[0] - fast_path.requested[0] >= 0.2
+
+def test_browser_fallback_goes_straight_out_when_no_http_request_was_sent():
+    fast_path, fetched = FakeFastPath(None), []
+    limiter = StoreRateLimiter({'Coles': (5, 5)}, log=lambda message: None)
+    pool = PagePool(FakeService(), limiter=limiter, fast_path=fast_path, metrics=Metrics(), log=lambda message: None)
+    scrape = lambda page, url: fetched.append(url) or {'store': 'Coles', 'name': 'x', 'price': '1.00', 'url': url}
+    run_in_thread(pool, [COLES % 1], scrape)
+    assert fetched == [COLES % 1] and limiter.slept == 0
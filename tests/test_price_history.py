@@ -0,0 +1,68 @@
+from price_history import PriceHistory
+
+URL = 'https://www.coles.com.au/product/dr.-beckmann-magic-leaves-5452994'
+OTHER = 'https://www.woolworths.com.au/shop/productdetails/897214/dr-beckmann-laundry-detergent-sheets-universal'
+DAY = 86400
+
+def result(url, price, was_price="Not applicable", **extra):
+    return dict({'store': 'Coles' if 'coles' in url else 'Woolworths', 'name': "Laundry Sheets", 'price': price,
+                 'was_price': was_price, 'cup_price': "$0.32 per 1ea", 'url': url, 'promo_badge': ""}, **extra)
+
+def open_history(tmp_path, **options):
+    return PriceHistory(str(tmp_path / 'history.db'), **options)
+
+def test_latest_is_the_newest_row_whatever_the_write_order(tmp_path):
+    history = open_history(tmp_path)
+    history.add(result(URL, "8.00", "16.00"), scraped_at=2000)
+    history.add(result(URL, "16.00"), scraped_at=1000)  # a late write from an older run
+    history.flush()
+    latest = history.latest(URL)
+    assert (latest['product_key'], latest['price'], latest['was_price'], latest['scraped_at']) == ('coles:5452994', 8.0, 16.0, 2000)
+    assert history.latest('coles:5452994') == latest
+    assert history.latest(OTHER) is None
+
+def test_errors_and_cached_results_are_not_recorded(tmp_path):
+    history = open_history(tmp_path)
+    history.add({'error': "Timeout", 'url': URL})
+    history.add(result(URL, "8.00", cached_at=1000))
+    assert history.flush() == 0
+    assert history.latest(URL) is None
+
+def test_writes_are_batched(tmp_path):
+    history = open_history(tmp_path, batch_size=3, flush_interval=3600)
+    history.add(result(URL, "8.00"), scraped_at=1000)
+    history.add(result(URL, "9.00"), scraped_at=2000)
+    assert history.latest(URL) is None
+    history.add(result(OTHER, "7.50"), scraped_at=3000)  # the third row fills the batch
+    assert history.latest(URL)['price'] == 9.0
+
+def test_history_is_oldest_first_between_two_times(tmp_path):
+    history = open_history(tmp_path)
+    for day, price in enumerate(("16.00", "8.00", "12.00", "16.00")):
+        history.add(result(URL, price), scraped_at=(day + 1) * DAY)
+    history.add(result(OTHER, "7.50"), scraped_at=DAY)
+    history.flush()
+    assert [row['price'] for row in history.history(URL)] == [16.0, 8.0, 12.0, 16.0]
+    assert [row['scraped_at'] for row in history.history(URL, since=2 * DAY, until=3 * DAY)] == [2 * DAY, 3 * DAY]
+
+def test_lowest_price_within_the_window(tmp_path, monkeypatch):
+    now = 100 * DAY
+    monkeypatch.setattr('price_history.time.time', lambda: now)
+    history = open_history(tmp_path)
+    history.add(result(URL, "5.00"), scraped_at=now - 40 * DAY)  # cheaper, but outside 30 days
+    history.add(result(URL, "8.00"), scraped_at=now - 20 * DAY)
+    history.add(result(URL, "8.00"), scraped_at=now - 10 * DAY)
+    history.add(result(URL, "Not found"), scraped_at=now - 5 * DAY)
+    history.add(result(URL, "12.00"), scraped_at=now - DAY)
+    history.flush()
+    lowest = history.lowest(URL)
+    assert (lowest['price'], lowest['scraped_at']) == (8.0, now - 10 * DAY)  # the most recent time at that price
+    assert history.lowest(URL, days=60)['price'] == 5.0
+    assert history.lowest(OTHER) is None
+
+def test_latest_by_store(tmp_path):
+    history = open_history(tmp_path)
+    history.add(result(URL, "8.00"), scraped_at=1000)
+    history.add(result(OTHER, "7.50"), scraped_at=1000)
+    history.flush()
+    assert [row['url'] for row in history.latest_by_store('Woolworths')] == [OTHER]
@@ -0,0 +1,74 @@
+import pytest
+from price_records import calculate_discount, normalize, parse_price, parse_unit_price
+from price_analytics import best_value, discounts, store_spreads
+
+@pytest.mark.parametrize('text, expected', [
+    ("3.50", 3.5), ("$12", 12.0), ("1,299.00", 1299.0), (".99", 0.99), (4, 4.0),
+    ("Not found", None), ("Not applicable", None), ("", None), (None, None),
+])
+def test_parse_price(text, expected):
+    assert parse_price(text) == expected
+
+@pytest.mark.parametrize('text, price, unit', [
+    ("$0.42 / 1EA", 0.42, 'ea'),
+    ("$0.35 per 1ea", 0.35, 'ea'),
+    ("$1.20 per 100g", 12.0, 'kg'),
+    ("$3.50/1KG", 3.5, 'kg'),
+    ("$2.40 per 500mL", 4.8, 'L'),
+    ("$1.00 / 1L", 1.0, 'L'),
+    ("$0.60 per each", 0.6, 'ea'),
+    ("$5.00 per 2 sheets", 2.5, 'sheet'),  # units it doesn't know keep their own name
+])
+def test_unit_prices_are_converted_to_a_canonical_unit(text, price, unit):
+    parsed, canonical = parse_unit_price(text)
+    assert parsed == pytest.approx(price) and canonical == unit
+
+@pytest.mark.parametrize('text', ["Not found", "", None, "$1.00 per 0g"])
+def test_unparseable_unit_prices(text):
+    assert parse_unit_price(text) == (None, None)
+
+@pytest.mark.parametrize('price, was_price, badge, label', [
+    ("8.00", "16.00", "", "HALF PRICE!"),
+    ("7.50", "15.00", "1/2 Price", "HALF PRICE!"),
+    ("9.00", "12.00", "Special", "25% OFF"),
+    ("6.00", "10.00", "", "40% OFF!"),
+    ("8.00", "10.00", "", "20% OFF"),
+    ("9.50", "10.00", "", "Save $0.50"),
+    ("4.00", "Not applicable", "Special", "SPECIAL"),
+    ("4.00", "Not applicable", "", ""),
+    ("Not found", "Not applicable", "", ""),
+])
+def test_promotion_labels(price, was_price, badge, label):
+    assert calculate_discount(price, was_price, badge)[1] == label
+
+def result(store, name, price, cup_price, was_price="Not applicable", promo_badge=""):
+    return {'store': store, 'name': name, 'price': price, 'was_price': was_price, 'cup_price': cup_price,
+            'url': f"https://example.test/{store}/{name}", 'promo_badge': promo_badge}
+
+def test_normalize_keeps_the_display_strings_next_to_the_parsed_values():
+    record = normalize(result('Coles', "Magic Leaves", "8.00", "$0.32 per 1ea", "16.00", "1/2 Price"))
+    assert (record.price, record.was_price, record.unit_price, record.unit) == (8.0, 16.0, 0.32, 'ea')
+    assert (record.price_text, record.was_text, record.cup_price) == ("8.00", "16.00", "$0.32 per 1ea")
+    assert (record.discount, record.promotion) == (50.0, "HALF PRICE!")
+
+RECORDS = [normalize(data) for data in (
+    result('Coles', "Sheets 25", "8.00", "$0.32 per 1ea", "16.00"),
+    result('Coles', "Sheets 40", "14.00", "$0.35 per 1ea"),
+    result('Woolworths', "Sheets 30", "12.00", "$0.40 / 1EA"),
+    result('Woolworths', "Liquid 1L", "9.00", "$0.90 per 100mL"),
+    result('Woolworths', "Missing", "Not found", "Not found"),
+)]
+
+def test_discounts():
+    assert discounts(RECORDS) == [50.0, None, None, None, None]
+
+def test_best_value_per_unit():
+    best = best_value(RECORDS, top=2)
+    assert [r.name for r in best['ea']] == ["Sheets 25", "Sheets 40"]
+    assert [r.name for r in best['L']] == ["Liquid 1L"]
+
+def test_store_spreads_compare_the_cheapest_unit_price_in_each_store():
+    spread, = store_spreads(RECORDS)  # only 'ea' is carried by both stores
+    assert spread['group'] == 'ea' and spread['cheapest'] == 'Coles'
+    assert spread['prices'] == {'Coles': 0.32, 'Woolworths': 0.40}
+    assert spread['spread_pct'] == pytest.approx(25.0)
@@ -0,0 +1,58 @@
+from price_records import normalize
+from product_matching import ProductMatcher, name_tokens, url_slug
+
+def record(store, product_id, name, price="8.00"):
+    url = (f"https://www.woolworths.com.au/shop/productdetails/{product_id}/item" if store == 'Woolworths'
+           else f"https://www.coles.com.au/product/item-{product_id}")
+    return normalize({'store': store, 'name': name, 'price': price, 'was_price': "Not applicable",
+                      'cup_price': "$0.32 per 1ea", 'url': url, 'promo_badge': ""})
+
+CATALOGUE = [
+    record('Woolworths', 897214, "Dr Beckmann Laundry Detergent Sheets Universal 25 Pack"),
+    record('Woolworths', 160209, "Restor Concentrated Laundry Detergent Sheets Fresh Linen 30 Pack"),
+    record('Woolworths', 555001, "Ecostore Laundry Sheets Fragrance Free 20 Pack"),
+    record('Coles', 5452994, "Dr. Beckmann Magic Leaves Laundry Detergent Sheets Universal | 25 pack"),
+    record('Coles', 8924623, "Ecostore Laundry Detergent Sheets Fragrance Free | 40 pack"),
+    record('Coles', 1066354, "Restor Laundry Detergent Sheets Fresh Linen | 30 pack"),
+]
+
+def quiet(message):
+    pass
+
+def test_name_tokens_fold_plurals_and_pull_out_the_pack_size():
+    assert name_tokens("Ecostore Laundry Sheets Fragrance Free 20 Pack") == (['ecostore', 'laundry', 'sheet', 'fragrance', 'free'], (20.0, 'ea'))
+    assert name_tokens("Liquid 1.5L")[1] == (1500.0, 'ml')
+    assert url_slug("https://www.coles.com.au/product/dr.-beckmann-magic-leaves-5452994?pid=1") == "dr. beckmann magic leaves"
+
+def test_same_products_are_paired_across_stores(tmp_path):
+    matcher = ProductMatcher(str(tmp_path / 'matches.json'), log=quiet)
+    matcher.match(CATALOGUE)
+    assert matcher.partners('woolworths:897214') == {'Coles': 'coles:5452994'}
+    assert matcher.partners('woolworths:160209') == {'Coles': 'coles:1066354'}
+    # Same brand and range but a different pack size is a different product
+    assert matcher.group_of('woolworths:555001') is None and matcher.group_of('coles:8924623') is None
+    assert len(matcher) == 2
+
+def test_each_product_is_in_one_group_at_most(tmp_path):
+    matcher = ProductMatcher(str(tmp_path / 'matches.json'), log=quiet)
+    twin = record('Coles', 7777777, "Dr Beckmann Magic Leaves Laundry Sheets Universal 25 pack")
+    matcher.match(CATALOGUE + [twin])
+    grouped = [key for group in matcher.groups.values() for key in group['members'].values()]
+    assert len(grouped) == len(set(grouped))
+    assert matcher.group_of('woolworths:897214') is not None
+
+def test_groups_persist_and_known_products_are_not_matched_again(tmp_path):
+    path = str(tmp_path / 'matches.json')
+    matcher = ProductMatcher(path, log=quiet)
+    matcher.match(CATALOGUE)
+    matcher.save()
+    reloaded = ProductMatcher(path, log=quiet)
+    assert reloaded.load()
+    assert reloaded.partner_map() == matcher.partner_map()
+    assert reloaded.match(CATALOGUE) == []
+
+def test_comparisons_pair_up_this_runs_records(tmp_path):
+    matcher = ProductMatcher(str(tmp_path / 'matches.json'), log=quiet)
+    matcher.match(CATALOGUE)
+    (group_id, members), = matcher.comparisons(CATALOGUE[:1] + CATALOGUE[3:4] + CATALOGUE[1:2])
+    assert sorted(members) == ['Coles', 'Woolworths'] and members['Coles'].name.startswith("Dr. Beckmann")
@@ -0,0 +1,69 @@
+import time
+from scraper_core import StoreRateLimiter
+from work_queue import WorkQueue
+
+def quiet(message):
+    pass
+
+def test_shared_pace_spaces_requests_across_processes(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    first = StoreRateLimiter({'Coles': (5, 5)}, log=quiet, shared=queue)
+    second = StoreRateLimiter({'Coles': (5, 5)}, log=quiet, shared=WorkQueue(queue.path))
+    assert first.wait_time('Coles') == 0
+    assert first.take('Coles') == 0
+    # The other worker's own bucket is idle, but the fleet-wide slot is taken
+    assert second.buckets['Coles'].wait_time(time.monotonic()) == 0
+    assert 4 < second.wait_time('Coles') <= 5
+    assert second.take('Coles') > 4
+    assert second.buckets['Coles'].ready_at == 0  # a lost claim leaves its own bucket untouched
+
+def test_hold_pace_only_pushes_the_slot_later(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    queue.hold_pace('Woolworths', 10)
+    queue.hold_pace('Woolworths', 1)
+    assert 9 < queue.pace_wait('Woolworths') <= 10
+    assert queue.pace_wait('Coles') == 0
+
+def test_scraper_keeps_its_limiter_unless_the_delays_change():
+    from scraper_core import Scraper
+    scraper = Scraper(log=quiet)
+    limiter = scraper.rate_limiter
+    scraper.configure(headless=True, pool_size=2)
+    assert scraper.rate_limiter is limiter
+    scraper.configure(delays={'Coles': (1, 2)})
+    assert scraper.rate_limiter is not limiter and list(scraper.rate_limiter.buckets) == ['Coles']
+
+GAP = 0.2
+
+class FakeListingPage:
+    """Two pages of Coles listing tiles, noting when each page was requested"""
+
+    def __init__(self):
+        self.requested = []
+
+    def goto(self, url, **options):
+        self.requested.append(time.monotonic())
+
+    def wait_for_function(self, js, arg=None, timeout=None):
+        from scraper_core import MORE_TILES_JS, PlaywrightTimeoutError
+        if js == MORE_TILES_JS:
+            raise PlaywrightTimeoutError("no more tiles")
+        number = len(self.requested)
+        products = [{'url': f"https://www.coles.com.au/product/sheets-{number}{n}", 'name': "Sheets", 'price': "$4.00",
+                     'was_price': None, 'cup_price': "$0.10 per 1ea"} for n in range(2)]
+        return type('Handle', (), {'json_value': lambda handle: {'products': products, 'tiles': 2, 'next': number < 2}})()
+
+    def evaluate(self, script):
+        pass
+
+def test_browser_listing_pages_keep_the_store_gap():
+    from scraper_core import PagePool, Scraper
+    from metrics import Metrics
+    scraper = Scraper(log=quiet, delays={'Coles': (GAP, GAP)})
+    scraper.pool = PagePool(None, limiter=scraper.rate_limiter, metrics=Metrics(), log=quiet)
+    page = FakeListingPage()
+    scraper.rate_limiter.take('Coles')  # the pool claims the first page's slot when it hands the listing out
+    products = scraper.scrape_listing_page(page, 'https://www.coles.com.au/browse/household/laundry', 'Coles')
+    assert len(products) == 4
+    assert page.requested[1] - page.requested[0] >= GAP
+    assert scraper.rate_limiter.slept >= GAP * 0.9
@@ -0,0 +1,72 @@
+from datetime import datetime
+from price_history import PriceHistory
+from refresh_scheduler import RefreshScheduler, HOUR
+
+LISTING = 'https://www.coles.com.au/browse/household/laundry/laundry-sheets'
+PRODUCTS = ['https://www.coles.com.au/product/sheets-%d' % n for n in (101, 102)]
+SINGLE = 'https://www.woolworths.com.au/shop/productdetails/897214/dr-beckmann-laundry-detergent-sheets-universal'
+# Thursday midday, well clear of the Wednesday specials changeover
+NOW = datetime(2026, 10, 15, 12).timestamp()
+
+def product(url, listing=None):
+    data = {'store': 'Coles' if 'coles' in url else 'Woolworths', 'name': url.rsplit('/', 1)[-1], 'price': '4.00',
+            'was_price': 'Not applicable', 'cup_price': '$0.10 / 1EA', 'url': url, 'promo_badge': ''}
+    if listing:
+        data['listing'] = listing
+    return data
+
+def history_with(tmp_path, scraped_at):
+    history = PriceHistory(str(tmp_path / 'history.db'))
+    for url in PRODUCTS:
+        history.add(product(url, LISTING), scraped_at=scraped_at)
+    history.add(product(SINGLE), scraped_at=scraped_at)
+    history.flush()
+    return history
+
+def test_recently_scraped_listing_is_served_from_history(tmp_path):
+    history = history_with(tmp_path, NOW - HOUR)
+    due, cached = RefreshScheduler(history, jitter=0).plan([LISTING, SINGLE], now=NOW)
+    assert due == []
+    assert sorted(d['url'] for d in cached) == sorted(PRODUCTS + [SINGLE])
+    assert all(d['listing'] == LISTING for d in cached if d['url'] in PRODUCTS)
+
+def test_listing_comes_due_with_its_products(tmp_path):
+    history = history_with(tmp_path, NOW - HOUR)
+    scheduler = RefreshScheduler(history, fresh_ttl=6 * HOUR, jitter=0)
+    # Both were scraped an hour ago and have the minimum interval, so neither is due for five hours
+    assert abs(scheduler.next_run_in([LISTING, SINGLE], now=NOW) - 5 * HOUR) < 1
+    due, _ = scheduler.plan([LISTING, SINGLE], now=NOW + 6 * HOUR)
+    assert due == [LISTING, SINGLE]
+
+def test_unknown_listing_is_due(tmp_path):
+    history = history_with(tmp_path, NOW - HOUR)
+    other = 'https://www.coles.com.au/browse/household/laundry/detergent'
+    scheduler = RefreshScheduler(history, jitter=0)
+    assert scheduler.plan([other], now=NOW)[0] == [other]
+    assert scheduler.next_run_in([other], now=NOW) == 60
+
+def test_change_counters_are_kept_as_rows_are_written(tmp_path):
+    history = PriceHistory(str(tmp_path / 'history.db'))
+    for hours, price in ((0, '4.00'), (24, '4.00'), (48, '3.50'), (72, '4.00')):
+        history.add(dict(product(SINGLE), price=price), scraped_at=NOW + hours * HOUR)
+    history.flush()
+    latest = history.latest(SINGLE)
+    assert (latest['samples'], latest['changes']) == (4, 2)
+    assert (latest['first_seen'], latest['last_change']) == (NOW, NOW + 72 * HOUR)
+    # 72 hours with two changes: every 36 hours, so refresh every 18
+    assert RefreshScheduler(history).interval(latest) == 18 * HOUR
+
+def test_counters_are_backfilled_for_a_database_from_before_them(tmp_path):
+    path = str(tmp_path / 'history.db')
+    history = PriceHistory(path)
+    for hours, price in ((0, '4.00'), (24, '3.00'), (48, '3.00')):
+        history.add(dict(product(SINGLE), price=price), scraped_at=NOW + hours * HOUR)
+    history.close()
+    import sqlite3
+    conn = sqlite3.connect(path)
+    for column in ('samples', 'changes', 'first_seen', 'last_change'):
+        conn.execute(f"ALTER TABLE latest_prices DROP COLUMN {column}")
+    conn.commit()
+    conn.close()
+    latest = PriceHistory(path).latest(SINGLE)
+    assert (latest['samples'], latest['changes'], latest['first_seen'], latest['last_change']) == (3, 1, NOW, NOW + 24 * HOUR)
@@ -0,0 +1,82 @@
+import itertools
+from change_detection import Change
+from price_records import normalize
+from results_view import ResultsModel
+
+PRICE, OTHER_STORE, CHANGE = 2, 6, 7
+PRODUCT_IDS = itertools.count(100)
+
+def record(store, name, price, was_price="Not applicable", product_id=None):
+    product_id = product_id or next(PRODUCT_IDS)
+    url = (f"https://www.coles.com.au/product/item-{product_id}" if store == 'Coles'
+           else f"https://www.woolworths.com.au/shop/productdetails/{product_id}/item")
+    return normalize({'store': store, 'name': name, 'price': price, 'was_price': was_price,
+                      'cup_price': "$0.30 / 1EA", 'url': url, 'promo_badge': ""})
+
+def model_with(*records):
+    model = ResultsModel()
+    for rec in records:
+        model.add(rec)
+    return model
+
+def shown(model, column=1):
+    return [model.values[model.row_at(position)][column] for position in range(len(model.view))]
+
+def test_sorting_by_price_puts_missing_prices_last_both_ways():
+    model = model_with(record('Coles', "B", "8.00"), record('Coles', "Missing", "Not found"), record('Coles', "A", "4.00"),
+                       record('Woolworths', "C", "12.00"))
+    model.sort(PRICE)
+    assert shown(model) == ["A", "B", "C", "Missing"]
+    model.sort(PRICE, descending=True)
+    assert shown(model) == ["C", "B", "A", "Missing"]
+
+def test_rows_streamed_in_after_sorting_land_in_place():
+    model = model_with(record('Coles', "B", "8.00"), record('Coles', "D", "16.00"))
+    model.sort(PRICE)
+    model.add(record('Coles', "A", "4.00"))
+    model.add(record('Coles', "C", "12.00"))
+    assert shown(model) == ["A", "B", "C", "D"]
+    assert model.position_of(2) == 0
+
+def test_filter_matches_any_column_case_insensitively():
+    model = model_with(record('Coles', "Magic Leaves", "8.00", "16.00"), record('Woolworths', "Restor Sheets", "12.00"),
+                       record('Coles', "Ecostore Sheets", "14.00"))
+    model.set_filter("SHEETS")
+    assert shown(model) == ["Restor Sheets", "Ecostore Sheets"]
+    model.set_filter("sheets coles")  # nothing has both
+    assert shown(model) == []
+    model.set_filter("half price")  # the promotion column
+    assert shown(model) == ["Magic Leaves"]
+    model.set_filter("")
+    assert len(model.view) == 3
+
+def test_filter_and_sort_combine():
+    model = model_with(record('Coles', "Sheets 40", "14.00"), record('Woolworths', "Liquid", "9.00"),
+                       record('Coles', "Sheets 25", "8.00"))
+    model.sort(PRICE, descending=True)
+    model.set_filter("sheets")
+    assert shown(model) == ["Sheets 40", "Sheets 25"]
+    model.add(record('Woolworths', "Sheets 30", "12.00"))
+    model.add(record('Woolworths', "Powder", "20.00"))
+    assert shown(model) == ["Sheets 40", "Sheets 30", "Sheets 25"]
+
+def test_changes_only_view():
+    model = ResultsModel()
+    rec = record('Coles', "Magic Leaves", "8.00", "16.00")
+    model.add(record('Coles', "Steady", "4.00"))
+    model.add(rec, Change('price_down', 'coles:1', 'Coles', rec.name, rec.url, 16.0, 8.0, "", "HALF PRICE!"))
+    model.set_changes_only(True)
+    assert shown(model) == ["Magic Leaves"] and shown(model, CHANGE) == ["Price down $16.00 -> $8.00"]
+    model.set_changes_only(False)
+    assert len(model.view) == 2
+
+def test_matched_products_show_the_other_stores_price():
+    coles, woolworths = record('Coles', "Sheets", "8.00", product_id=1), record('Woolworths', "Sheets", "7.50", product_id=2)
+    model = ResultsModel()
+    model.set_partners({'coles:1': 'woolworths:2', 'woolworths:2': 'coles:1'})
+    model.add(coles)
+    model.add(woolworths)
+    assert model.values[0][OTHER_STORE] == "Woolworths $7.50 (+0.50)"
+    assert model.values[1][OTHER_STORE] == "Coles $8.00 (-0.50)"
+    model.sort(OTHER_STORE)
+    assert [model.row_at(position) for position in range(2)] == [1, 0]
@@ -0,0 +1,70 @@
+import pytest
+from retry_policy import RetryPolicy, CircuitBreaker
+
+def test_retry_counts_per_kind():
+    policy = RetryPolicy()
+    assert policy.should_retry('timeout', 1) and policy.should_retry('timeout', 2)
+    assert not policy.should_retry('timeout', 3)
+    assert policy.should_retry('blocked', 1) and not policy.should_retry('blocked', 2)
+    assert not policy.should_retry('error', 1)
+
+def test_delay_backs_off_and_is_capped():
+    policy = RetryPolicy(base_delay=10, factor=2, max_delay=50, jitter=0)
+    assert [policy.delay('timeout', attempt) for attempt in (1, 2, 3, 4)] == [10, 20, 40, 50]
+    assert policy.delay('blocked', 1) == 40  # blocked stores cool off four times longer
+
+def trip(breaker, now=0.0, kind='timeout'):
+    events = [breaker.record(kind, now) for _ in range(breaker.threshold)]
+    return events[-1]
+
+def test_opens_after_threshold_failures_in_a_row():
+    breaker = CircuitBreaker(threshold=3, cooldown=10)
+    assert breaker.record('timeout', 0) is None
+    assert breaker.record('ok', 0) is None  # a success resets the count
+    assert trip(breaker) == 'tripped'
+    assert breaker.state == 'open' and breaker.wait_time(4) == 6
+
+def test_non_tripping_failures_never_open_a_closed_breaker():
+    breaker = CircuitBreaker(threshold=2)
+    for _ in range(5):
+        assert breaker.record('error', 0) is None
+    assert breaker.state == 'closed'
+
+def test_half_open_trial_success_closes():
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    trip(breaker)
+    breaker.take(5)
+    assert breaker.state == 'open'  # still pausing
+    breaker.take(10)
+    assert breaker.state == 'half_open'
+    assert breaker.record('ok', 11) == 'closed'
+    assert breaker.state == 'closed'
+
+def test_half_open_trial_failure_reopens_with_longer_pause():
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    trip(breaker)
+    breaker.take(10)
+    assert breaker.record('timeout', 12) == 'tripped'
+    assert breaker.state == 'open' and breaker.wait_time(12) == 20
+
+@pytest.mark.parametrize('kind', ['error', 'deferred'])
+def test_half_open_trial_with_non_tripping_failure_settles(kind):
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    trip(breaker)
+    breaker.take(10)
+    assert breaker.record(kind, 11) == 'closed'
+    assert breaker.state == 'closed' and breaker.wait_time(11) == 0
+
+def test_stragglers_while_open_do_not_count():
+    breaker = CircuitBreaker(threshold=1, cooldown=10, max_trips=2)
+    trip(breaker)
+    assert breaker.record('timeout', 1) is None
+    assert breaker.trips == 1
+
+def test_gives_up_after_max_trips():
+    breaker = CircuitBreaker(threshold=1, cooldown=1, max_trips=2)
+    assert trip(breaker) == 'tripped'
+    breaker.take(1)
+    assert breaker.record('timeout', 1) == 'gave_up'
+    assert breaker.state == 'gave_up'
+    assert breaker.record('timeout', 2) is None
@@ -0,0 +1,54 @@
+from run_journal import RunJournal, read_journal, resume_plan
+
+URLS = ['https://www.coles.com.au/product/sheets-%d' % n for n in range(1, 5)]
+LISTING = 'https://www.coles.com.au/browse/household/laundry/laundry-sheets'
+
+def result(url, **extra):
+    return dict({'store': 'Coles', 'name': "Sheets", 'price': "4.00", 'was_price': "Not applicable",
+                 'cup_price': "$0.10 per 1ea", 'url': url, 'promo_badge': ""}, **extra)
+
+def crashed_journal(path):
+    """A run that died halfway through writing its fourth line"""
+    journal = RunJournal(path).start(URLS)
+    journal.record(result(URLS[0]))
+    journal.record({'error': "Timeout 30000ms exceeded", 'url': URLS[1], 'kind': 'timeout'})
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "result", "at": 1, "data": {"store": "Coles", "url": "%s", "pri' % URLS[2])
+
+def test_resume_plan_skips_a_torn_last_line(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    crashed_journal(path)
+    done, remaining = resume_plan(path)
+    assert [data['url'] for data in done] == [URLS[0]]
+    assert 'cached_at' in done[0]  # replayed results say when they were scraped
+    assert remaining == URLS[1:]  # the failed URL, the torn one and the one never started
+
+def test_resuming_after_a_torn_line_keeps_later_results(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    crashed_journal(path)
+    journal = RunJournal(path).resume()
+    journal.record(result(URLS[1]))  # the retry of the earlier failure succeeds
+    journal.record(result(URLS[2]))
+    journal.finish()
+    urls, results, finished = read_journal(path)
+    assert urls == URLS and finished
+    done, remaining = resume_plan(path)
+    assert [data['url'] for data in done] == URLS[:3]
+    assert remaining == URLS[3:]
+
+def test_listing_is_done_once_its_products_are_journaled(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    journal = RunJournal(path).start([LISTING, URLS[0]])
+    journal.record(result(URLS[2], listing=LISTING))
+    journal.record(result(URLS[3], listing=LISTING))
+    journal.close()
+    done, remaining = resume_plan(path)
+    assert [data['url'] for data in done] == URLS[2:]
+    assert remaining == [URLS[0]]
+
+def test_no_journal_means_nothing_to_resume(tmp_path):
+    assert resume_plan(str(tmp_path / 'missing.jsonl')) is None
+    torn = tmp_path / 'torn.jsonl'
+    torn.write_text('{"type": "run", "ur')  # crashed before the header was written out
+    assert resume_plan(str(torn)) is None
@@ -0,0 +1,62 @@
+import os
+import pytest
+from snapshot_archive import SnapshotArchive, extract_snapshot, replay
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+COLES_URL = 'https://www.coles.com.au/product/dr.-beckmann-magic-leaves-5452994'
+WOOLWORTHS_URL = 'https://www.woolworths.com.au/shop/productdetails/897214/dr-beckmann-laundry-detergent-sheets-universal'
+LISTING_URL = 'https://www.coles.com.au/browse/household/laundry/laundry-sheets'
+
+def fixture(*parts):
+    with open(os.path.join(FIXTURES, *parts), encoding='utf-8') as f:
+        return f.read()
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = SnapshotArchive(str(tmp_path / 'snapshots'), codec='gzip', log=lambda message: None)
+    yield archive
+    archive.close()
+
+def test_replay_extracts_products_from_archived_pages(archive):
+    archive.add(COLES_URL, fixture('coles', '5452994.html'), captured_at=1000)
+    archive.add(WOOLWORTHS_URL, fixture('woolworths', '897214.html'), captured_at=1001)
+    archive.flush()
+    results = [data for _, data in replay(archive)]
+    assert results[0] == {'store': 'Coles', 'name': "Dr. Beckmann Magic Leaves Laundry Detergent Sheets Universal | 25 pack",
+                          'price': "8.00", 'was_price': "16.00", 'cup_price': "$0.32 per 1ea", 'url': COLES_URL, 'promo_badge': "1/2 Price"}
+    assert (results[1]['name'], results[1]['price'], results[1]['was_price']) == (
+        "Dr Beckmann Laundry Detergent Sheets Universal 25 Pack", "7.50", "15.00")
+
+def test_replay_turns_an_archived_listing_into_its_products(archive):
+    archive.add(LISTING_URL, fixture('coles', 'listing-laundry-sheets-1.html'))
+    archive.flush()
+    results = [data for _, data in replay(archive)]
+    assert len(results) >= 2
+    assert all('error' not in data and data['listing'] == LISTING_URL and data['price'] for data in results)
+    assert results[0]['url'].startswith('https://www.coles.com.au/product/')
+
+def test_unchanged_pages_are_stored_once(archive):
+    html = fixture('coles', '5452994.html')
+    for captured_at in (1000, 2000, 3000):
+        archive.add(COLES_URL, html, captured_at=captured_at)
+    archive.flush()
+    assert (archive.stored, archive.deduped) == (1, 2)
+    assert [row['captured_at'] for row in archive.snapshots(latest_only=True)] == [3000]
+    assert len(archive.snapshots(since=1500, until=2500)) == 1
+
+def test_embedded_json_is_the_fallback_when_the_selectors_miss():
+    html = fixture('coles', '5452994.html').replace('data-testid=', 'data-test-id=')  # a redesign the selectors miss
+    data = extract_snapshot(COLES_URL, html)
+    assert (data['name'], data['price']) == ("Dr. Beckmann Magic Leaves Laundry Detergent Sheets Universal | 25 pack", "8.00")
+
+def test_challenge_page_replays_as_an_error():
+    data = extract_snapshot('https://www.coles.com.au/product/challenge', fixture('coles', 'challenge.html'))
+    assert 'error' in data
+
+def test_missing_blob_replays_as_an_error(archive):
+    archive.add(COLES_URL, fixture('coles', '5452994.html'))
+    archive.flush()
+    row, = archive.snapshots()
+    os.remove(archive._blob_path(row['digest'], row['codec']))
+    (_, data), = replay(archive)
+    assert data['error'].startswith("Snapshot missing")
@@ -0,0 +1,73 @@
+from url_catalogue import UrlCatalogue, load_url_file
+
+COLES = 'https://www.coles.com.au/product/sheets-%d'
+WOOLWORTHS = 'https://www.woolworths.com.au/shop/productdetails/%d/sheets'
+
+def quiet(message):
+    pass
+
+def catalogue_at(tmp_path, **options):
+    return UrlCatalogue(str(tmp_path / 'urls.txt'), log=quiet, **options)
+
+def lines(catalogue):
+    with open(catalogue.path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+def test_same_product_is_only_catalogued_once(tmp_path):
+    catalogue = catalogue_at(tmp_path)
+    added, duplicates, invalid = catalogue.add_many([COLES % 1, (COLES % 1) + '?pid=search', WOOLWORTHS % 2,
+                                                     'https://example.com/product/1'])
+    assert (added, duplicates, invalid) == ([COLES % 1, WOOLWORTHS % 2], 1, 1)
+    assert 'http://www.coles.com.au/product/other-slug-1' in catalogue
+    assert catalogue.get((COLES % 1) + '?pid=search') == COLES % 1
+
+def test_removal_appends_a_tombstone_that_replays_on_load(tmp_path):
+    catalogue = catalogue_at(tmp_path)
+    catalogue.add_many([COLES % 1, COLES % 2, COLES % 3])
+    assert catalogue.remove((COLES % 2) + '?from=list')
+    assert not catalogue.remove(COLES % 9)
+    assert lines(catalogue) == [COLES % 1, COLES % 2, COLES % 3, '-' + COLES % 2]
+    reloaded = catalogue_at(tmp_path)
+    reloaded.load()
+    assert reloaded.urls() == [COLES % 1, COLES % 3]
+    assert reloaded.garbage == 2  # the removed line and its tombstone
+
+def test_re_adding_a_removed_product_appends_it_again(tmp_path):
+    catalogue = catalogue_at(tmp_path)
+    catalogue.add_many([COLES % 1, COLES % 2])
+    catalogue.remove(COLES % 1)
+    assert catalogue.add(COLES % 1)
+    assert load_url_file(catalogue.path) == [COLES % 2, COLES % 1]
+
+def test_load_compacts_once_garbage_outweighs_live_entries(tmp_path):
+    catalogue = catalogue_at(tmp_path, compact_min=4)
+    catalogue.add_many([COLES % n for n in range(1, 6)])
+    for n in (1, 2):
+        catalogue.remove(COLES % n)
+    catalogue_at(tmp_path, compact_min=4).load()  # 4 garbage lines against 3 live entries
+    assert lines(catalogue) == [COLES % n for n in (3, 4, 5)]
+
+def test_load_leaves_a_file_with_little_garbage_alone(tmp_path):
+    catalogue = catalogue_at(tmp_path, compact_min=4)
+    catalogue.add_many([COLES % n for n in range(1, 6)])
+    catalogue.remove(COLES % 1)
+    reloaded = catalogue_at(tmp_path, compact_min=4)
+    reloaded.load()
+    assert len(lines(catalogue)) == 6 and reloaded.garbage == 2
+
+def test_append_does_not_glue_onto_a_hand_edited_last_line(tmp_path):
+    path = tmp_path / 'urls.txt'
+    path.write_text('# my list\n' + COLES % 1, encoding='utf-8')
+    catalogue = catalogue_at(tmp_path)
+    catalogue.load()
+    catalogue.add(COLES % 2)
+    assert load_url_file(str(path)) == [COLES % 1, COLES % 2]
+
+def test_import_streams_in_chunks(tmp_path):
+    source = tmp_path / 'import.txt'
+    source.write_text('\n'.join([COLES % n for n in range(1, 8)] + [COLES % 1, '-' + COLES % 2]), encoding='utf-8')
+    catalogue = catalogue_at(tmp_path)
+    chunks = []
+    assert catalogue.import_file(str(source), chunk_size=3, on_chunk=chunks.append) == (7, 1, 0)
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert len(catalogue) == 7
@@ -0,0 +1,84 @@
+import pytest
+from work_queue import WorkQueue
+
+COLES = 'https://www.coles.com.au/product/sheets-%d'
+WOOLWORTHS = 'https://www.woolworths.com.au/shop/productdetails/%d/sheets'
+
+@pytest.fixture
+def clock(monkeypatch):
+    """The queue's wall clock, moved on by hand"""
+    now = [1000000.0]
+    monkeypatch.setattr('work_queue.time.time', lambda: now[0])
+    return now
+
+def queue_at(tmp_path, **options):
+    return WorkQueue(str(tmp_path / 'queue.db'), **options)
+
+def result(url):
+    return {'store': 'Coles', 'name': "Sheets", 'price': "4.00", 'url': url}
+
+def test_expired_lease_goes_back_to_another_worker(tmp_path, clock):
+    queue = queue_at(tmp_path, lease_seconds=60)
+    run = queue.create_run([COLES % 1, COLES % 2])
+    assert [url for _, url in queue.lease(run, 'dead', 1)] == [COLES % 1]
+    (alive_job, url), = queue.lease(run, 'alive', 1)
+    assert url == COLES % 2
+    clock[0] += 50
+    queue.renew('alive', [alive_job])
+    clock[0] += 11
+    (job_id, url), = queue.lease(run, 'alive', 5)
+    assert url == COLES % 1
+    assert queue.complete(job_id, 'alive', result(url))
+    assert queue.progress(run) == {'pending': 0, 'leased': 1, 'done': 1, 'failed': 0}
+
+def test_renewed_lease_does_not_expire(tmp_path, clock):
+    queue = queue_at(tmp_path, lease_seconds=60)
+    run = queue.create_run([COLES % 1])
+    (job_id, _), = queue.lease(run, 'slow', 1)
+    clock[0] += 50
+    assert queue.renew('slow', [job_id]) == 1
+    assert queue.renew('someone-else', [job_id]) == 0
+    clock[0] += 50
+    assert queue.lease(run, 'other', 1) == []
+
+def test_job_fails_after_max_attempts_of_expired_leases(tmp_path, clock):
+    queue = queue_at(tmp_path, lease_seconds=60, max_attempts=2)
+    run = queue.create_run([COLES % 1])
+    for worker in ('first', 'second'):
+        assert queue.lease(run, worker, 1)
+        clock[0] += 61
+    assert queue.finished(run)
+    (position, data), = queue.take_results(run)
+    assert position == 0 and data == {'error': "Lease expired 2 times without a result", 'url': COLES % 1}
+    assert queue.take_results(run) == []  # each result is handed over once
+
+def test_released_leases_are_requeued_without_using_up_an_attempt(tmp_path, clock):
+    queue = queue_at(tmp_path, max_attempts=1)
+    run = queue.create_run([COLES % 1])
+    assert queue.lease(run, 'stopping', 1)
+    queue.release('stopping')
+    (job_id, url), = queue.lease(run, 'next', 1)
+    assert queue.complete(job_id, 'next', result(url))
+    assert queue.finished(run) and queue.results(run) == [result(COLES % 1)]
+
+def test_late_result_from_a_lapsed_lease_still_counts(tmp_path, clock):
+    queue = queue_at(tmp_path, lease_seconds=60)
+    run = queue.create_run([COLES % 1])
+    (job_id, url), = queue.lease(run, 'slow', 1)
+    clock[0] += 61
+    queue.finished(run)  # the coordinator notices the lapsed lease and requeues the URL
+    assert queue.progress(run)['pending'] == 1
+    assert queue.complete(job_id, 'slow', result(url))
+    assert queue.lease(run, 'other', 1) == []
+
+def test_store_caps_hold_across_workers(tmp_path, clock):
+    queue = queue_at(tmp_path)
+    run = queue.create_run([COLES % 1, COLES % 2, WOOLWORTHS % 3], store_caps={'Coles': 1})
+    assert [url for _, url in queue.lease(run, 'first', 5)] == [COLES % 1, WOOLWORTHS % 3]
+    assert queue.lease(run, 'second', 5) == []
+
+def test_a_new_run_supersedes_the_open_one(tmp_path, clock):
+    queue = queue_at(tmp_path)
+    queue.create_run([COLES % 1])
+    latest = queue.create_run([COLES % 2])
+    assert queue.open_run() == latest
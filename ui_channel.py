@@ -0,0 +1,102 @@
+"""Hand UI updates from worker threads to the Tk main loop.
+
+Tk widgets may only be touched from the thread running mainloop(). Worker
+threads post small events onto a queue instead, and the main loop drains them
+in batches on a fixed timer, so a fast scrape costs one redraw per frame rather
+than one per result or log line.
+"""
+import queue
+import traceback
+from collections import deque
+import tkinter as tk
+
+FRAME_MS = 50  # drain 20 times a second
+MAX_EVENTS_PER_FRAME = 2000
+LOG_LINES = 5000
+
+class UiChannel:
+    """Thread-safe queue of (kind, payload) events applied on the Tk main loop"""
+
+    def __init__(self, root, handlers, frame_ms=FRAME_MS, max_events=MAX_EVENTS_PER_FRAME):
+        self.root = root
+        self.handlers = handlers  # kind -> function taking the list of payloads drained this frame
+        self.frame_ms = frame_ms
+        self.max_events = max_events
+        self._events = queue.SimpleQueue()
+        self._after_id = None
+
+    def post(self, kind, payload=None):
+        """Queue an event; safe to call from any thread"""
+        self._events.put((kind, payload))
+
+    def call(self, fn, *args):
+        """Run fn(*args) on the main loop, in order with the other events"""
+        self.post('call', (fn, args))
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.frame_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        try:
+            self.drain()
+        finally:
+            self._after_id = self.root.after(self.frame_ms, self._tick)
+
+    def drain(self):
+        """Apply up to max_events queued events, handing each run of same-kind events to its handler at once"""
+        kind, batch = None, []
+        for _ in range(self.max_events):
+            try:
+                next_kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if next_kind != kind and batch:
+                self._dispatch(kind, batch)
+                batch = []
+            kind = next_kind
+            batch.append(payload)
+        if batch:
+            self._dispatch(kind, batch)
+
+    def _dispatch(self, kind, batch):
+        try:
+            if kind == 'call':
+                for fn, args in batch:
+                    fn(*args)
+            else:
+                self.handlers[kind](batch)
+        except Exception:
+            traceback.print_exc()
+
+class LogBuffer:
+    """Bounded ring buffer of log lines mirrored into a Text widget"""
+
+    def __init__(self, widget, max_lines=LOG_LINES):
+        self.widget = widget
+        self.max_lines = max_lines
+        self.lines = deque(maxlen=max_lines)
+
+    def extend(self, lines):
+        self.lines.extend(lines)
+        # Only follow the output if the user hasn't scrolled up to read something
+        follow = self.widget.yview()[1] >= 0.999
+        if len(lines) >= self.max_lines:
+            self.widget.delete('1.0', tk.END)
+            self.widget.insert(tk.END, '\n'.join(self.lines) + '\n')
+        else:
+            self.widget.insert(tk.END, '\n'.join(lines) + '\n')
+            # Multi-line messages count per widget line, so trim on what the widget holds
+            shown = int(self.widget.index('end-1c').split('.')[0]) - 1
+            if shown > self.max_lines:
+                self.widget.delete('1.0', f"{shown - self.max_lines + 1}.0")
+        if follow:
+            self.widget.see(tk.END)
+
+    def text(self):
+        return '\n'.join(self.lines)
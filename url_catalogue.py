@@ -0,0 +1,171 @@
+"""Catalogue of product URLs to scrape, deduplicated by product.
+
+Every URL is keyed by product_key() ('woolworths:897214', 'coles:5452994'), so
+the same product pasted with a different slug, query string or scheme is only
+stored once, and lookups are a dict hit however long the list gets. Category,
+search and specials listing URLs are catalogued the same way, keyed by their
+path and query.
+
+The list is persisted to a plain text file, one URL per line, which the CLI can
+read too. Changes are appended instead of rewriting the file: an added URL is a
+new line and a removed one is a '-' line (a tombstone). Loading replays the file
+in order, and once tombstones and duplicates outweigh the live entries the file
+is compacted back to a clean list.
+"""
+import os
+import threading
+from scraper_core import is_supported_url, product_key
+
+URLS_FILE = 'scraper_urls.txt'
+TOMBSTONE = '-'
+IMPORT_CHUNK = 5000
+
+def iter_url_lines(path):
+    """Stream the non-blank, non-comment lines of a URL file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+class UrlCatalogue:
+    """Ordered, deduplicated URL list with an append-only backing file"""
+
+    def __init__(self, path=URLS_FILE, compact_ratio=1.0, compact_min=100, log=print):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self.log = log
+        self.entries = {}  # product key -> URL, in insertion order
+        self.garbage = 0   # file lines that no longer contribute a live entry
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, url):
+        return product_key(url) in self.entries
+
+    def urls(self):
+        with self._lock:
+            return list(self.entries.values())
+
+    def get(self, url):
+        """The catalogued URL for the same product as url, or None"""
+        return self.entries.get(product_key(url))
+
+    def load(self, compact=True):
+        """Replay the backing file; returns False if it doesn't exist yet"""
+        with self._lock:
+            self.entries, self.garbage = {}, 0
+            if not os.path.exists(self.path):
+                return False
+            for line in iter_url_lines(self.path):
+                if line.startswith(TOMBSTONE):
+                    removed = self.entries.pop(product_key(line[1:].strip()), None)
+                    self.garbage += 2 if removed else 1
+                elif not is_supported_url(line):
+                    self.garbage += 1
+                elif self.entries.setdefault(product_key(line), line) is not line:
+                    self.garbage += 1
+        if compact and self.garbage >= max(self.compact_min, self.compact_ratio * len(self.entries)):
+            self.compact()
+        return True
+
+    def add(self, url):
+        """Add one URL; returns False if it is unsupported or its product is already listed"""
+        return bool(self.add_many([url])[0])
+
+    def add_many(self, urls):
+        """Add URLs in one append; returns (added URLs, duplicate count, unsupported count)"""
+        added, duplicates, invalid = [], 0, 0
+        with self._lock:
+            for url in urls:
+                url = url.strip()
+                if not is_supported_url(url):
+                    invalid += 1
+                    continue
+                key = product_key(url)
+                if key in self.entries:
+                    duplicates += 1
+                    continue
+                self.entries[key] = url
+                added.append(url)
+            self._append(added)
+        return added, duplicates, invalid
+
+    def remove(self, url):
+        """Remove the product a URL points at; returns False if it wasn't listed"""
+        with self._lock:
+            removed = self.entries.pop(product_key(url), None)
+            if removed is None:
+                return False
+            self._append([TOMBSTONE + removed])
+            self.garbage += 2
+            return True
+
+    def clear(self):
+        with self._lock:
+            self.entries = {}
+        self.compact()
+
+    def compact(self):
+        """Rewrite the backing file as just the live URLs"""
+        with self._lock:
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for url in self.entries.values():
+                    f.write(url + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            if self.garbage:
+                self.log(f"Compacted {self.path}: dropped {self.garbage} stale lines")
+            self.garbage = 0
+
+    def import_file(self, path, chunk_size=IMPORT_CHUNK, on_chunk=None):
+        """Stream a URL file into the catalogue in chunks; returns (added, duplicates, unsupported) totals.
+
+        on_chunk(added_urls) is called after each chunk is committed, so a GUI can
+        show progress while this runs on a background thread.
+        """
+        totals = [0, 0, 0]
+        chunk = []
+
+        def commit():
+            added, duplicates, invalid = self.add_many(chunk)
+            totals[0] += len(added)
+            totals[1] += duplicates
+            totals[2] += invalid
+            chunk.clear()
+            if on_chunk and added:
+                on_chunk(added)
+
+        for line in iter_url_lines(path):
+            if line.startswith(TOMBSTONE):
+                continue
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                commit()
+        if chunk:
+            commit()
+        return tuple(totals)
+
+    def _append(self, lines):
+        if not lines:
+            return
+        text = '\n'.join(lines) + '\n'
+        with open(self.path, 'ab+') as f:
+            # Don't glue the first line onto a hand-edited file without a trailing newline
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b'\n':
+                    text = '\n' + text
+            f.write(text.encode('utf-8'))
+
+def load_url_file(path):
+    """Read the live, deduplicated URLs from a URL file without modifying it"""
+    catalogue = UrlCatalogue(path)
+    catalogue.load(compact=False)
+    return catalogue.urls()
@@ -0,0 +1,227 @@
+"""Shared work queue for spreading one URL list over several scraper processes.
+
+A coordinator puts a run's URLs into a SQLite file; any number of workers, each
+with its own browser, lease a few URLs at a time, scrape them and write the
+results back. A lease that isn't completed or renewed in time (the worker died
+or hung) expires and the URL goes back to pending for another worker, up to
+max_attempts. The coordinator streams finished results in the order they land
+and knows the run is over when nothing is pending or leased.
+
+Workers on other machines need the queue file on storage they all share. The
+queue uses SQLite's rollback journal rather than WAL for that reason, with
+short transactions and a generous busy timeout. Anything offering the same
+methods (create_run, lease, renew, complete, release, ...) can replace it.
+
+The queue also keeps each store's next free request time (pace_wait,
+claim_pace, hold_pace), so the politeness delay holds across the whole fleet
+and not just within each worker.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from scraper_core import detect_store
+
+QUEUE_FILE = 'work_queue.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    store_caps TEXT,
+    status TEXT NOT NULL DEFAULT 'open'
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    store TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    emitted INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_run_state ON jobs (run_id, state, position);
+CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs (owner, state);
+CREATE TABLE IF NOT EXISTS store_pace (
+    store TEXT PRIMARY KEY,
+    ready_at REAL NOT NULL
+);
+"""
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class WorkQueue:
+    """Lease-based URL queue in a SQLite file"""
+
+    def __init__(self, path=QUEUE_FILE, lease_seconds=600, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Results arrive on the scraper's browser threads, so the connection is shared behind a lock
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the database write lock up front, so two workers can't lease the same row
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).rowcount
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def create_run(self, urls, store_caps=None):
+        """Queue a new run and return its id; store_caps limits how many URLs per store are leased at once fleet-wide"""
+        run_id = uuid.uuid4().hex
+        with self._transaction():
+            self.conn.execute("UPDATE runs SET status = 'superseded' WHERE status = 'open'")
+            self.conn.execute("INSERT INTO runs (run_id, created_at, store_caps) VALUES (?, ?, ?)",
+                              (run_id, time.time(), json.dumps(store_caps or {})))
+            self.conn.executemany("INSERT INTO jobs (run_id, position, url, store) VALUES (?, ?, ?, ?)",
+                                  [(run_id, i, url, detect_store(url)) for i, url in enumerate(urls)])
+        return run_id
+
+    def open_run(self):
+        """Id of the run workers should be working on, or None"""
+        rows = self._query("SELECT run_id FROM runs WHERE status = 'open' ORDER BY created_at DESC LIMIT 1")
+        return rows[0]['run_id'] if rows else None
+
+    def lease(self, run_id, worker_id, count=1):
+        """Lease up to count pending URLs as [(job id, url)], respecting the run's per-store caps"""
+        now = time.time()
+        with self._transaction():
+            self._expire(run_id, now)
+            caps = json.loads(self.conn.execute("SELECT store_caps FROM runs WHERE run_id = ?", (run_id,)).fetchone()['store_caps'] or '{}')
+            leased = dict(self.conn.execute(
+                "SELECT store, COUNT(*) FROM jobs WHERE run_id = ? AND state = 'leased' GROUP BY store", (run_id,)).fetchall())
+            jobs = []
+            for row in self.conn.execute(
+                    "SELECT id, url, store FROM jobs WHERE run_id = ? AND state = 'pending' ORDER BY position", (run_id,)):
+                cap = caps.get(row['store'])
+                if cap is not None and leased.get(row['store'], 0) >= cap:
+                    continue
+                leased[row['store']] = leased.get(row['store'], 0) + 1
+                jobs.append((row['id'], row['url']))
+                if len(jobs) >= count:
+                    break
+            self.conn.executemany(
+                "UPDATE jobs SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(worker_id, now + self.lease_seconds, job_id) for job_id, _ in jobs])
+        return jobs
+
+    def _expire(self, run_id, now):
+        # Leases past their deadline belong to a dead or stuck worker: retry them, or give up after max_attempts
+        expired = self.conn.execute(
+            "SELECT id, url, attempts FROM jobs WHERE run_id = ? AND state = 'leased' AND lease_expires < ?", (run_id, now)).fetchall()
+        for row in expired:
+            if row['attempts'] >= self.max_attempts:
+                error = {'error': f"Lease expired {row['attempts']} times without a result", 'url': row['url']}
+                self.conn.execute("UPDATE jobs SET state = 'failed', owner = NULL, result = ?, finished_at = ? WHERE id = ?",
+                                  (json.dumps(error), now, row['id']))
+            else:
+                self.conn.execute("UPDATE jobs SET state = 'pending', owner = NULL, lease_expires = NULL WHERE id = ?", (row['id'],))
+
+    def renew(self, worker_id, job_ids):
+        """Extend this worker's leases on the given jobs; returns how many it still held"""
+        if not job_ids:
+            return 0
+        with self._lock:
+            cursor = self.conn.executemany(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                [(time.time() + self.lease_seconds, job_id, worker_id) for job_id in job_ids])
+            return cursor.rowcount
+
+    def complete(self, job_id, worker_id, data):
+        """Store a job's result; a worker whose lease was taken over still counts if it finishes first"""
+        return self._execute(
+            "UPDATE jobs SET state = 'done', owner = ?, result = ?, finished_at = ? WHERE id = ? AND state IN ('leased', 'pending')",
+            (worker_id, json.dumps(data, ensure_ascii=False), time.time(), job_id)) == 1
+
+    def release(self, worker_id):
+        """Hand a worker's unfinished leases back to the queue (on a clean shutdown)"""
+        self._execute(
+            "UPDATE jobs SET state = 'pending', owner = NULL, lease_expires = NULL, attempts = MAX(attempts - 1, 0) "
+            "WHERE owner = ? AND state = 'leased'", (worker_id,))
+
+    def progress(self, run_id):
+        """Job counts by state for a run"""
+        counts = dict.fromkeys(('pending', 'leased', 'done', 'failed'), 0)
+        counts.update(self._query("SELECT state, COUNT(*) FROM jobs WHERE run_id = ? GROUP BY state", (run_id,)))
+        return counts
+
+    def finished(self, run_id):
+        """True once nothing in the run is pending or leased (expiring stale leases first)"""
+        with self._transaction():
+            self._expire(run_id, time.time())
+        counts = self.progress(run_id)
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+    def take_results(self, run_id):
+        """Results finished since the last call, as [(position, data)]"""
+        with self._transaction():
+            rows = self.conn.execute(
+                "SELECT id, position, result FROM jobs WHERE run_id = ? AND state IN ('done', 'failed') AND emitted = 0 ORDER BY finished_at",
+                (run_id,)).fetchall()
+            self.conn.executemany("UPDATE jobs SET emitted = 1 WHERE id = ?", [(row['id'],) for row in rows])
+        return [(row['position'], json.loads(row['result'])) for row in rows]
+
+    def results(self, run_id):
+        """Every finished result of a run in input order"""
+        rows = self._query(
+            "SELECT result FROM jobs WHERE run_id = ? AND result IS NOT NULL ORDER BY position", (run_id,))
+        return [json.loads(row['result']) for row in rows]
+
+    def pace_wait(self, store):
+        """Seconds until any worker may send the store its next request"""
+        rows = self._query("SELECT ready_at FROM store_pace WHERE store = ?", (store,))
+        return max(0.0, rows[0]['ready_at'] - time.time()) if rows else 0.0
+
+    def claim_pace(self, store, gap):
+        """Take the store's next request slot and hold the following one gap seconds off.
+
+        Returns 0.0 once claimed, or the seconds left if the slot isn't free yet.
+        """
+        now = time.time()
+        with self._transaction():
+            row = self.conn.execute("SELECT ready_at FROM store_pace WHERE store = ?", (store,)).fetchone()
+            if row and row['ready_at'] > now:
+                return row['ready_at'] - now
+            self.conn.execute("INSERT INTO store_pace (store, ready_at) VALUES (?, ?) "
+                              "ON CONFLICT (store) DO UPDATE SET ready_at = excluded.ready_at", (store, now + gap))
+        return 0.0
+
+    def hold_pace(self, store, gap):
+        """Keep the store's next slot at least gap seconds from now (the gap runs from the end of a request)"""
+        self._execute("INSERT INTO store_pace (store, ready_at) VALUES (?, ?) "
+                      "ON CONFLICT (store) DO UPDATE SET ready_at = MAX(ready_at, excluded.ready_at)", (store, time.time() + gap))
+
+    def close_run(self, run_id):
+        self._execute("UPDATE runs SET status = 'finished' WHERE run_id = ?", (run_id,))